@@ -23,6 +23,7 @@ insert, query, remove_data, move_to, find_data, find_collection, print_collectio
 (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL) -> 面板字符数据
 (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.TIME_SERIES) -> 时间序列字符数据
 (DataClassification.UNSTRUCTURED, ) -> 对象形式存储数据
+(DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL, DataStorageCategory.COLUMNAR) -> 面板数值数据(列式存储，依赖pyarrow)
 """
 from database.db import Database
-from database.const import DataClassification, DataFormatCategory, DataValueCategory
+from database.const import DataClassification, DataFormatCategory, DataValueCategory, DataStorageCategory
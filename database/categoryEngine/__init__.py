@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/7
+
+字典编码(分类)存储引擎，用于存储字符型面板数据(例如行业分类、ST标记)
+数据文件中保存一份字符串字典以及以整数编码表示的二维数据
+"""
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/7
+"""
+from os.path import dirname
+
+from database.utils import submodule_initialization, set_logger
+from database.const import DataFormatCategory, NaS, FilledStatus, REL_PATH_SEP, ENCODING
+
+SUBMODULE_NAME = 'categorydb'
+# 设置日志选项
+DB_CONFIG = submodule_initialization(SUBMODULE_NAME, dirname(__file__))
+
+LOGGER_NAME = set_logger(DB_CONFIG['log'])
+
+# 文件后缀
+SUFFIX = '.h5cat'
+
+# 数据文件格式版本
+FORMAT_VERSION = 1
+
+# NaS在字典中的编码，字典的第一个元素固定为NaS，数据集中未写入的位置(默认填充值)也表示NaS
+NAS_CODE = 0
+
+# 时间轴、代码轴以及字典数据集的分块长度
+AXIS_CHUNK_SIZE = 1024
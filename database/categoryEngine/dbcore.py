@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/7
+
+字典编码存储引擎核心实现
+
+数据文件为HDF5格式，每个数据对应一个文件，包含以下数据集:
+time: int64，时间轴(datetime64[ns])
+symbol: 变长字符串，代码轴
+category: 变长字符串，字符串字典，第一个元素固定为NaS，只会在末尾追加，保证已有的编码不变
+code: 二维整数，数据在字典中的编码，列数(列容量)可以大于代码数量，未写入的位置为NAS_CODE
+"""
+import logging
+from os import sep, makedirs, remove
+from os.path import join, exists, dirname
+from shutil import move
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from database.utils import DBEngine
+from database.categoryEngine.const import (LOGGER_NAME, DB_CONFIG, SUFFIX, REL_PATH_SEP, NaS,
+                                           DataFormatCategory, FilledStatus, FORMAT_VERSION,
+                                           NAS_CODE, AXIS_CHUNK_SIZE)
+from database.jsonEngine.dbcore import JSONEngine
+from database.jsonEngine.const import METADATA_FILENAME as JSON_METADATA_FILENAME
+
+# 获取当前日志句柄
+logger = logging.getLogger(LOGGER_NAME)
+
+# 变长字符串类型
+STR_DTYPE = h5py.string_dtype(encoding='utf-8')
+
+
+def encode_values(values, categories):
+    '''
+    将字符串数据编码为字典中的位置，字典中不存在的字符串追加到字典末尾
+
+    Parameter
+    ---------
+    values: np.ndarray
+        元素为字符串或者缺失值的数组，缺失值编码为NAS_CODE
+    categories: pandas.Index
+        已有的字典
+
+    Return
+    ------
+    codes: np.ndarray
+        shape与values相同
+    new_categories: pandas.Index
+        需要追加到字典末尾的字符串
+    '''
+    flat = values.ravel()
+    uniques = pd.Index(pd.unique(flat))
+    uniques = uniques[~pd.isnull(uniques)]
+    if not all(isinstance(u, str) for u in uniques):
+        raise TypeError('Only string data is supported!')
+    new_categories = uniques[~uniques.isin(categories)]
+    codes = categories.append(new_categories).get_indexer(flat)
+    codes[codes < 0] = NAS_CODE   # 缺失值
+    return codes.reshape(values.shape), new_categories
+
+
+class CategoryEngine(DBEngine):
+    '''
+    字典编码存储引擎，仅支持字符型面板数据
+    提供以下接口:
+    query: 类方法，依据给定的参数，从数据文件中查询相应的数据，数据的每一列为pandas.Categorical
+    insert: 类方法，依据给定的参数，向数据文件中插入数据
+    remove_data: 类方法，将数据库中给定的数据删除
+    move_to: 类方法，将给定的数据移动到其他给定的位置
+
+    Parameter
+    ---------
+    params: database.db.ParamsParser
+
+    Notes
+    -----
+    之前由JSONEngine存储的字符型面板数据(数据文件夹存在且没有对应的字典编码数据文件)的所有操作都交由JSONEngine完成，
+    可以使用database.categoryEngine.tools.convert_database将其转换为字典编码存储
+    '''
+    concurrent_query = True
+
+    def __init__(self, params):
+        self._params = params
+        self._parse_path()
+
+    def _parse_path(self):
+        '''
+        将相对路径解析为绝对路径
+        '''
+        params = self._params
+        rel_path = params.rel_path.replace(REL_PATH_SEP, sep) + SUFFIX
+        params.set_absolute_path(join(params.main_path, rel_path))
+
+    @classmethod
+    def _get_legacy_engine(cls, params):
+        '''
+        判断给定的数据是否仍由JSONEngine存储
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        out: JSONEngine or None
+            若数据由JSONEngine存储，返回JSONEngine，否则返回None
+        '''
+        json_path = join(params.main_path, params.rel_path.replace(REL_PATH_SEP, sep))
+        category_path = json_path + SUFFIX
+        if exists(join(json_path, JSON_METADATA_FILENAME)) and not exists(category_path):
+            return JSONEngine
+        return None
+
+    @classmethod
+    def insert(cls, data, params):
+        '''
+        将给定的数据插入到数据文件中，数据文件中已经存在的时间(最新时间及之前)的数据会被忽略，
+        新增的代码按照升序排列在已有代码之后
+
+        Parameter
+        ---------
+        data: pandas.DataFrame
+            index为时间，columns为代码，数据为字符串，缺失值会以NaS存储
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        result: boolean
+        '''
+        legacy_engine = cls._get_legacy_engine(params)
+        if legacy_engine is not None:
+            return legacy_engine.insert(data, params)
+        if not isinstance(data, pd.DataFrame):
+            raise TypeError('pandas.DataFrame expected, while {} is provided!'.format(type(data)))
+        obj = cls(params)
+        if not exists(obj._params.absolute_path):
+            obj._create_datafile()
+        with h5py.File(obj._params.absolute_path, 'r+') as store:
+            return obj._insert_df(store, data)
+
+    @classmethod
+    def query(cls, params):
+        '''
+        从数据文件中查询给定的数据
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+            start_time属性必须为非空，若end_time属性为None，则视作查询时点数据，反之则为查询时间区间的数据；
+            若symbols属性不为None，则结果按照给定代码排列，不存在的代码对应的数据为NaS
+
+        Return
+        ------
+        out: pandas.DataFrame(PANEL) or pandas.Series(CROSS_SECTION) or None
+            所有的列(或者横截面数据)均为pandas.Categorical，且使用相同的分类(即数据文件中的字典)，
+            没有请求到数据时返回None
+        '''
+        legacy_engine = cls._get_legacy_engine(params)
+        if legacy_engine is not None:
+            return legacy_engine.query(params)
+        if params.start_time is None:
+            raise ValueError('start_time property cannot be None!')
+        obj = cls(params)
+        with h5py.File(obj._params.absolute_path, 'r') as store:
+            time_index = pd.DatetimeIndex(store['time'][...].view('M8[ns]'))
+            if params.end_time is None:
+                start_idx = time_index.searchsorted(params.start_time, side='left')
+                if start_idx >= len(time_index) or time_index[start_idx] != params.start_time:
+                    return None
+                end_idx = start_idx + 1
+            else:
+                start_idx = time_index.searchsorted(params.start_time, side='left')
+                end_idx = time_index.searchsorted(params.end_time, side='right')
+                if start_idx >= end_idx:
+                    return None
+            symbols = store['symbol'].asstr()[...].tolist()
+            categories = store['category'].asstr()[...]
+            codes = store['code'][start_idx: end_idx, :len(symbols)]
+        if params.symbols is not None:
+            positions = pd.Index(symbols).get_indexer(params.symbols)
+            codes = np.where(positions >= 0, codes[:, positions], NAS_CODE)
+            symbols = params.symbols
+        dtype = pd.CategoricalDtype(categories)
+        if params.end_time is None:
+            return pd.Series(pd.Categorical.from_codes(codes[0], dtype=dtype), index=symbols,
+                             name=time_index[start_idx])
+        out = pd.DataFrame({i: pd.Categorical.from_codes(codes[:, i], dtype=dtype)
+                            for i in range(codes.shape[1])}, index=time_index[start_idx: end_idx])
+        out.columns = symbols
+        return out
+
+    @classmethod
+    def remove_data(cls, params):
+        '''
+        将给定的数据删除
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        result: boolean
+        '''
+        legacy_engine = cls._get_legacy_engine(params)
+        if legacy_engine is not None:
+            return legacy_engine.remove_data(params)
+        try:
+            obj = cls(params)
+            remove(obj._params.absolute_path)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        return True
+
+    @classmethod
+    def move_to(cls, src_params, dest_params):
+        '''
+        将给定的数据移动到其他给定的位置
+
+        Parameter
+        ---------
+        src_params: database.db.ParamsParser
+            原数据文件相关设定参数
+        dest_params: database.db.ParamsParser
+            目标数据文件相关设定参数
+        '''
+        legacy_engine = cls._get_legacy_engine(src_params)
+        if legacy_engine is not None:
+            return legacy_engine.move_to(src_params, dest_params)
+        dest_obj = cls(dest_params)
+        if exists(dest_obj._params.absolute_path):
+            raise ValueError('Cannot move to an existing position!')
+        src_obj = cls(src_params)
+        try:
+            if not exists(dirname(dest_obj._params.absolute_path)):
+                makedirs(dirname(dest_obj._params.absolute_path))
+            move(src_obj._params.absolute_path, dest_obj._params.absolute_path)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        return True
+
+    def _create_datafile(self, col_size=None):
+        '''
+        创建并初始化数据文件
+
+        Parameter
+        ---------
+        col_size: int, default None
+            初始的列容量，None表示使用配置文件中的initial_col_size
+        '''
+        if col_size is None:
+            col_size = DB_CONFIG['initial_col_size']
+        path = self._params.absolute_path
+        if not exists(dirname(path)):
+            makedirs(dirname(path))
+        code_layout = {'chunks': (max(DB_CONFIG['chunk_row_size'], 1), col_size)}
+        if DB_CONFIG['compression'] is not None:
+            code_layout['compression'] = DB_CONFIG['compression']
+            if DB_CONFIG['compression_opts'] is not None:
+                code_layout['compression_opts'] = DB_CONFIG['compression_opts']
+        with h5py.File(path, 'w-') as store:
+            store.attrs['format version'] = FORMAT_VERSION
+            store.attrs['data category'] = DataFormatCategory.PANEL.name
+            store.attrs['filled status'] = FilledStatus.EMPTY.name
+            store.create_dataset('time', shape=(0, ), maxshape=(None, ), dtype='int64',
+                                 chunks=(AXIS_CHUNK_SIZE, ))
+            store.create_dataset('symbol', shape=(0, ), maxshape=(None, ), dtype=STR_DTYPE,
+                                 chunks=(AXIS_CHUNK_SIZE, ))
+            store.create_dataset('category', data=[NaS], maxshape=(None, ), dtype=STR_DTYPE,
+                                 chunks=(AXIS_CHUNK_SIZE, ))
+            store.create_dataset('code', shape=(0, col_size), maxshape=(None, None),
+                                 dtype=DB_CONFIG['code_dtype'], fillvalue=NAS_CODE, **code_layout)
+
+    def _insert_df(self, store, data):
+        '''
+        向打开的数据文件中插入数据
+
+        Parameter
+        ---------
+        store: h5py.File
+        data: pandas.DataFrame
+
+        Return
+        ------
+        result: boolean
+
+        Notes
+        -----
+        时间轴最后写入，若写入过程中断，已经写入的代码、字典以及编码数据在下次插入时会被覆盖或者不影响读取
+        '''
+        data = data.copy()
+        data.index = pd.to_datetime(data.index)
+        data = data.sort_index()
+        time_dset = store['time']
+        length = len(time_dset)
+        if length > 0:
+            latest_time = pd.Timestamp(time_dset[length - 1])
+            data = data.loc[data.index > latest_time]
+        if len(data) == 0:
+            return False
+        # 代码轴
+        symbol_dset = store['symbol']
+        symbols = symbol_dset.asstr()[...].tolist()
+        new_symbols = sorted(set(data.columns).difference(symbols))
+        symbols = symbols + new_symbols
+        code_dset = store['code']
+        if len(symbols) > code_dset.shape[1]:
+            target_colsize = code_dset.shape[1]
+            while target_colsize < len(symbols):
+                target_colsize += DB_CONFIG['col_size_increase_step']
+            code_dset.resize(target_colsize, axis=1)
+        if new_symbols:
+            symbol_dset.resize((len(symbols), ))
+            symbol_dset[-len(new_symbols):] = new_symbols
+        # 字典编码
+        category_dset = store['category']
+        codes, new_categories = encode_values(data.reindex(columns=symbols).astype(object).values,
+                                              pd.Index(category_dset.asstr()[...]))
+        if len(new_categories) > 0:
+            category_num = len(category_dset) + len(new_categories)
+            if category_num - 1 > np.iinfo(code_dset.dtype).max:
+                raise ValueError('Too many categories({}) for code type {}!'.format(category_num, code_dset.dtype))
+            category_dset.resize((category_num, ))
+            category_dset[-len(new_categories):] = new_categories.tolist()
+        code_dset.resize(length + len(data), axis=0)
+        code_dset[length:, :len(symbols)] = codes
+        time_dset.resize((length + len(data), ))
+        time_dset[length:] = data.index.values.astype('M8[ns]').view('int64')
+        store.attrs['filled status'] = FilledStatus.FILLED.name
+        logger.debug('[Operation=CategoryEngine._insert_df, Info=\"Insert {n} rows into {p}(new symbols={s}, new categories={c}).\"]'.
+                     format(n=len(data), p=self._params.absolute_path, s=len(new_symbols), c=len(new_categories)))
+        return True
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/7
+
+字典编码引擎的插入、查询测试，以及JSON数据的转换测试
+"""
+from tempfile import mkdtemp
+from os import walk
+from os.path import join, getsize
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from database.categoryEngine.dbcore import CategoryEngine
+from database.categoryEngine.tools import convert_database
+from database.jsonEngine.dbcore import JSONEngine
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory, NaS
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL)
+dates = pd.date_range('2008-01-01', periods=2500, freq='B')
+symbols = ['{:06d}'.format(i) for i in range(4000)]
+industries = np.array(['IND{:02d}'.format(i) for i in range(30)] + [NaS], dtype=object)
+sample_data = pd.DataFrame(np.random.choice(industries, (len(dates), len(symbols))),
+                           index=dates, columns=symbols)
+sample_data.iloc[5, 3] = None
+expected = sample_data.fillna(NaS)
+expected.iloc[:1250, 3000:] = NaS
+
+
+def insert(engine, rel_path):
+    engine.insert(sample_data.iloc[:1250, :3000], ParamsParser.from_dict(db_path, {'rel_path': rel_path,
+                                                                                   'store_fmt': store_fmt}))
+    # 新增代码
+    engine.insert(sample_data.iloc[1200:], ParamsParser.from_dict(db_path, {'rel_path': rel_path,
+                                                                            'store_fmt': store_fmt}))
+
+
+def query(rel_path, start_time, end_time=None, symbols=None):
+    return CategoryEngine.query(ParamsParser.from_dict(db_path, {'rel_path': rel_path, 'store_fmt': store_fmt,
+                                                                 'start_time': start_time, 'end_time': end_time,
+                                                                 'symbols': symbols}))
+
+
+def folder_size(path):
+    return sum(getsize(join(d, fn)) for d, _, fns in walk(path) for fn in fns)
+
+
+if __name__ == '__main__':
+    insert(CategoryEngine, 'category_test')
+    stime = time()
+    data = query('category_test', dates[0], dates[-1])
+    print('query: {:.3f}s'.format(time() - stime))
+    print(data.astype(object).equals(expected), isinstance(data.dtypes.iloc[0], pd.CategoricalDtype))
+    print(query('category_test', dates[100], dates[1300]).astype(object).equals(expected.iloc[100: 1301]))
+    print(query('category_test', dates[10]).astype(object).equals(expected.iloc[10]))
+    print(query('category_test', '2030-01-01') is None)
+    sub = query('category_test', dates[1300], dates[1400], ['003500', '999999', '000001'])
+    print(sub.astype(object).equals(expected.reindex(columns=['003500', '999999', '000001']).
+                                    iloc[1300: 1401].fillna(NaS)))
+    print((data == 'IND01').values.sum() == (expected == 'IND01').values.sum())
+    print('memory(MB): category {:.1f}, object {:.1f}'.format(data.memory_usage(deep=True).sum() / 2 ** 20,
+                                                             expected.memory_usage(deep=True).sum() / 2 ** 20))
+
+    # JSON数据的读取和转换
+    insert(JSONEngine, 'json_test')
+    json_size = folder_size(join(db_path, 'json_test'))
+    print(query('json_test', dates[0], dates[-1]).equals(expected))
+    print(convert_database(db_path))
+    print(query('json_test', dates[0], dates[-1]).astype(object).equals(expected))
+    # 转换后保持JSON数据的代码顺序
+    reversed_data = sample_data.iloc[:100, ::-1]
+    JSONEngine.insert(reversed_data, ParamsParser.from_dict(db_path, {'rel_path': 'json_order', 'store_fmt': store_fmt}))
+    json_columns = list(query('json_order', dates[0], dates[99]).columns)
+    print(convert_database(db_path) == ['json_order'])
+    print(list(query('json_order', dates[0], dates[99]).columns) == json_columns == list(reversed_data.columns))
+    print('disk(MB): category {:.1f}, json {:.1f}'.format(getsize(join(db_path, 'json_test.h5cat')) / 2 ** 20,
+                                                         json_size / 2 ** 20))
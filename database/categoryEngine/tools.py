@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/7
+
+字典编码数据文件维护工具
+convert_from_json: 将由JSONEngine存储的字符型面板数据转换为字典编码存储
+convert_database: 将给定数据库中所有由JSONEngine存储的字符型面板数据转换为字典编码存储
+"""
+import json
+import logging
+from os import walk, remove, sep
+from os.path import join, relpath
+from shutil import rmtree
+
+import h5py
+
+from database.categoryEngine.const import LOGGER_NAME, REL_PATH_SEP, ENCODING, DataFormatCategory
+from database.categoryEngine.dbcore import CategoryEngine
+from database.jsonEngine.dbcore import JSONEngine
+from database.jsonEngine.const import METADATA_FILENAME as JSON_METADATA_FILENAME
+from database.const import DataClassification, DataValueCategory
+from database.db import ParamsParser
+
+# 获取当前日志句柄
+logger = logging.getLogger(LOGGER_NAME)
+
+STORE_FMT = (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL)
+
+
+def convert_from_json(db_path, rel_path):
+    '''
+    将由JSONEngine存储的字符型面板数据转换为字典编码存储，转换完成后删除原JSON数据
+
+    Parameter
+    ---------
+    db_path: string
+        数据库的绝对路径
+    rel_path: string
+        数据的相对路径
+
+    Return
+    ------
+    result: boolean
+        若数据被转换，返回True，若数据不是由JSONEngine存储，返回False
+    '''
+    params = ParamsParser.from_dict(db_path, {'rel_path': rel_path, 'store_fmt': STORE_FMT})
+    if CategoryEngine._get_legacy_engine(params) is None:
+        return False
+    json_obj = JSONEngine(params)
+    json_obj._load_metadata()
+    metadata = json_obj._properties
+    data = JSONEngine.query(ParamsParser.from_dict(db_path, {'rel_path': rel_path,
+                                                             'store_fmt': STORE_FMT,
+                                                             'start_time': metadata['start time'],
+                                                             'end_time': metadata['end time']}))
+    symbols = list(data.columns)
+    obj = CategoryEngine(ParamsParser.from_dict(db_path, {'rel_path': rel_path, 'store_fmt': STORE_FMT}))
+    obj._create_datafile(len(symbols))
+    try:
+        with h5py.File(obj._params.absolute_path, 'r+') as store:
+            # 先写入代码轴，保持原数据的代码顺序(_insert_df会将新增的代码排序)
+            store['symbol'].resize((len(symbols), ))
+            store['symbol'][:] = symbols
+            obj._insert_df(store, data)
+    except Exception:
+        remove(obj._params.absolute_path)
+        raise
+    rmtree(json_obj._params.absolute_path)
+    logger.info('[Operation=convert_from_json, Info=\"Convert data(rel_path={}) to category format.\"]'.
+                format(rel_path))
+    return True
+
+
+def convert_database(db_path):
+    '''
+    将给定数据库中所有由JSONEngine存储的字符型面板数据转换为字典编码存储
+
+    Parameter
+    ---------
+    db_path: string
+        数据库的绝对路径
+
+    Return
+    ------
+    out: list
+        被转换的数据的相对路径
+    '''
+    rel_paths = []
+    for dir_path, _, file_names in walk(db_path):
+        if JSON_METADATA_FILENAME not in file_names:
+            continue
+        with open(join(dir_path, JSON_METADATA_FILENAME), 'r', encoding=ENCODING) as f:
+            if json.load(f)['data category'] != DataFormatCategory.PANEL.name:
+                continue
+        rel_paths.append(relpath(dir_path, db_path).replace(sep, REL_PATH_SEP))
+    return [p for p in sorted(rel_paths) if convert_from_json(db_path, p)]
@@ -48,3 +48,8 @@ class DataValueCategory(enum.Enum):
 class DataClassification(enum.Enum):
     STRUCTURED = enum.auto()
     UNSTRUCTURED = enum.auto()
+
+# 数据存储方式分类: 列式存储(按时间分区的Parquet或者Arrow IPC文件)，为可选的第四级分类，仅对数值型面板数据有效，
+# 未设置时使用默认的存储方式
+class DataStorageCategory(enum.Enum):
+    COLUMNAR = enum.auto()
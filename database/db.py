@@ -11,28 +11,43 @@ DataNode: 数据文件结构树类
 import enum
 import os.path as os_path
 # from os import remove as os_remove
-from os import sep, makedirs
+from os import sep, makedirs, fsync, stat, remove as os_remove
 # import warnings
 import json
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 import logging
 
+import pandas as pd
 from pandas import to_datetime
 from numpy import dtype as np_dtype
 
-from database.const import (DataClassification, DataValueCategory, DataFormatCategory,
+from database.const import (DataClassification, DataValueCategory, DataFormatCategory, DataStorageCategory,
                             ENCODING, CONFIG_PATH, REL_PATH_SEP)
 from database.hdf5Engine.dbcore import HDF5Engine
 from database.jsonEngine.dbcore import JSONEngine
 from database.pickleEngine.dbcore import PickleEngine
+from database.categoryEngine.dbcore import CategoryEngine
+from database.parquetEngine.dbcore import ParquetEngine
+from database.parquetEngine.const import DB_CONFIG as PARQUET_CONFIG, SUFFIX as PARQUET_SUFFIX
+from database.hdf5Engine.const import SUFFIX as HDF5_SUFFIX
 from database.jsonEngine.const import SUFFIX as JSON_SUFFIX
 from qrtutils import parse_config
-from database.utils import set_db_logger
+from database.utils import set_db_logger, dump_json_atomically
+from database.lock import FileLock
 # ----------------------------------------------------------------------------------------------
 # 全局预处理
 # 设置日志
 logger = logging.getLogger(set_db_logger())
 
+# 锁文件所在的文件夹(位于数据库主文件夹下)以及数据树元数据锁的名称
+LOCK_FOLDER = '#locks'
+METADATA_LOCK_NAME = '#metadata'
+
+# 当前进程中已经完成注册检查的数据库，格式为{db_name: main_path}，避免每次初始化数据库对象时都读写$metadata.json
+_REGISTERED_DBS = {}
+
 # ----------------------------------------------------------------------------------------------
 # 函数
 
@@ -51,10 +66,10 @@ def strs2StoreFormat(t):
     ------
     out: StoreFormat
     '''
-    if len(t) > 3:
+    if len(t) > 4:
         raise NotImplementedError
     fmt = []
-    formater = [DataClassification, DataValueCategory, DataFormatCategory]
+    formater = [DataClassification, DataValueCategory, DataFormatCategory, DataStorageCategory]
     for fmter, desc in zip(formater, t):
         fmt.append(fmter[desc])
     return StoreFormat.from_iterable(fmt)
@@ -74,7 +89,8 @@ class StoreFormat(object):
 
     Notes
     -----
-    目前只支持三层分类，第一层为DataClassfication，第二层为DataValueCategory，第三层为DataFormatCategory
+    目前只支持三层分类，第一层为DataClassfication，第二层为DataValueCategory，第三层为DataFormatCategory，
+    数值型面板数据可以添加可选的第四层DataStorageCategory，用于指定存储方式
     '''
 
     def __init__(self):
@@ -82,6 +98,7 @@ class StoreFormat(object):
                       DataClassification.UNSTRUCTURED: [None],
                       DataValueCategory.CHAR: [DataFormatCategory.PANEL, DataFormatCategory.TIME_SERIES],
                       DataValueCategory.NUMERIC: [DataFormatCategory.PANEL, DataFormatCategory.TIME_SERIES],
+                      DataFormatCategory.PANEL: [DataStorageCategory.COLUMNAR],
                       None: [None]}
         self._data = None
 
@@ -189,8 +206,9 @@ class ParamsParser(object):
         self._start_time = None
         self._end_time = None
         self._engine_map_rule = {(DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL): HDF5Engine,
+                                 (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL, DataStorageCategory.COLUMNAR): ParquetEngine,
                                  (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES): HDF5Engine,
-                                 (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL): JSONEngine,
+                                 (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL): CategoryEngine,
                                  (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.TIME_SERIES): JSONEngine,
                                  (DataClassification.UNSTRUCTURED, ): PickleEngine}
         # 参数组合校验字典，键为(start_time is None, end_time is None)，值为对应的存储类型
@@ -202,6 +220,8 @@ class ParamsParser(object):
         self._rel_path = None
         self._absolute_path = None
         self._dtype = None
+        self._symbols = None
+        self._storage_opts = None
 
     @classmethod
     def from_dict(cls, db_path, params):
@@ -214,7 +234,8 @@ class ParamsParser(object):
             数据库的绝对路径
         params: dict
             字典类型的参数，参数域包含['rel_path'(必须)(string), 'start_time'(datetime),
-            'end_time'(datetime), 'store_fmt'(StoreFormat), 'dtype'(numpy.dtype)]
+            'end_time'(datetime), 'store_fmt'(StoreFormat), 'dtype'(numpy.dtype), 'symbols'(iterable),
+            'storage_opts'(dict)]
 
         Return
         ------
@@ -235,15 +256,30 @@ class ParamsParser(object):
         obj._dtype = params.get('dtype', None)
         if obj._dtype is not None:
             obj._dtype = np_dtype(obj._dtype)
+        obj._symbols = params.get('symbols', None)
+        if obj._symbols is not None:
+            obj._symbols = list(obj._symbols)
+        obj._storage_opts = params.get('storage_opts', None)
         if not obj.store_fmt.validate():
             raise ValueError("Invalid parameter group!")
         return obj
 
     def get_engine(self):
         '''
-        获取对应的数据库引擎
+        获取对应的数据库引擎，配置文件中parquetdb.columnar_data下的数值型面板数据使用ParquetEngine，
+        但已经以HDF5格式存储的数据(HDF5数据文件存在且不存在列式存储的数据)仍然使用HDF5Engine
         '''
-        return self._engine_map_rule[self._store_fmt.data]
+        engine = self._engine_map_rule.get(self._store_fmt.data, None)
+        if engine is None:
+            raise ValueError('Unsupported store format({})!'.format(self._store_fmt.to_strtuple()))
+        if engine is HDF5Engine and self._store_fmt.data[-1] == DataFormatCategory.PANEL:
+            for rel_path in PARQUET_CONFIG['columnar_data']:
+                if self._rel_path == rel_path or self._rel_path.startswith(rel_path + REL_PATH_SEP):
+                    data_path = os_path.join(self._main_path, self._rel_path.replace(REL_PATH_SEP, sep))
+                    if os_path.exists(data_path + HDF5_SUFFIX) and not os_path.exists(data_path + PARQUET_SUFFIX):
+                        return HDF5Engine
+                    return ParquetEngine
+        return engine
 
     def set_absolute_path(self, abs_path):
         '''
@@ -286,18 +322,31 @@ class ParamsParser(object):
     def dtype(self):
         return self._dtype
 
+    @property
+    def symbols(self):
+        return self._symbols
+
+    @property
+    def storage_opts(self):
+        return self._storage_opts
+
 
 class Database(object):
     '''
     主数据库接口类，用于处理与外界的交互
     目前支持以下方法:
     query: 获取请求的数据
+    query_many: 同时获取多个请求的数据
     insert: 将数据存储到本地
     remove_data: 将给定路径的数据删除
     move_to: 将给定的数据移动到其他位置
     find_collection: 查找给定名称的数据集
     find_data: 查找给定名称的数据
     print_collections: 打印当前数据库下数据组织结构
+    batch: 批量修改数据的上下文管理器，期间数据树的变更仅记录在日志中，结束后一次性写入元数据文件
+
+    多个进程可以同时读写同一数据库: 请求数据时持有该数据的共享锁，插入、删除或者移动数据时持有该数据的排他锁，
+    修改数据树时持有元数据的排他锁，并先重新加载其他进程写入的变更，锁的设置参见配置文件中的lock_enabled和lock_timeout
 
     Parameter
     ---------
@@ -310,6 +359,13 @@ class Database(object):
         self._main_path = db_path
         self._data_tree_root = None
         self._db_name = self._main_path.split(sep)[-1]
+        self._batch_depth = 0   # batch的嵌套层数
+        self._journal_size = 0  # 日志中尚未写入元数据文件的记录数量
+        self._meta_signature = None     # 最近一次读写元数据时元数据文件和日志的状态标识
+        config = parse_config(CONFIG_PATH)
+        self._journal_limit = config['metadata_journal_limit']
+        self._lock_enabled = config['lock_enabled']
+        self._lock_timeout = config['lock_timeout']
         if not self._check_duplicate_db():
             raise ValueError('Database({}) already exists!'.format(self._db_name))
         self._load_meta()
@@ -317,7 +373,7 @@ class Database(object):
     def _check_duplicate_db(self):
         '''
         检查是否有数据库出现重名现象，如果没有，则再检查该数据库是否注册，若没有则直接注册
-        仅在数据库对象初始化时检查
+        仅在数据库对象初始化时检查，同一进程中每个数据库仅检查一次
         存储文件的格式为{db_name: main_path}
 
         Parameter
@@ -325,27 +381,28 @@ class Database(object):
         result: boolean
             True表示没有重复，False表示重复
         '''
+        if self._db_name in _REGISTERED_DBS:
+            return _REGISTERED_DBS[self._db_name] == self._main_path
         metadata_path = parse_config(CONFIG_PATH)['database_metadata_path']
         metadata_path = os_path.join(metadata_path, '$metadata.json')
-        if not os_path.exists(metadata_path):   # 存储所有数据库信息的文件不存在，则创建，然后存储
-            if not os_path.exists(os_path.dirname(metadata_path)):
-                makedirs(os_path.dirname(metadata_path))
-            metadata = {self._db_name: self._main_path}
-            with open(metadata_path, 'w', encoding=ENCODING) as f:
-                json.dump(metadata, f)
-            return True
-        with open(metadata_path, 'r', encoding=ENCODING) as f:
-            metadata = json.load(f)
-        if self._db_name not in metadata:   # 当前数据库未注册
-            metadata[self._db_name] = self._main_path
-            with open(metadata_path, 'w', encoding=ENCODING) as f:
-                json.dump(metadata, f)
-        else:
-            if metadata[self._db_name] != self._main_path:
+        lock = FileLock(metadata_path + '.lock') if self._lock_enabled else None
+        with nullcontext() if lock is None else lock.acquire(False, self._lock_timeout):
+            if not os_path.exists(metadata_path):   # 存储所有数据库信息的文件不存在，则创建，然后存储
+                if not os_path.exists(os_path.dirname(metadata_path)):
+                    makedirs(os_path.dirname(metadata_path))
+                metadata = {}
+            else:
+                with open(metadata_path, 'r', encoding=ENCODING) as f:
+                    metadata = json.load(f)
+            if self._db_name not in metadata:   # 当前数据库未注册
+                metadata[self._db_name] = self._main_path
+                dump_json_atomically(metadata, metadata_path)
+            elif metadata[self._db_name] != self._main_path:
                 return False
+        _REGISTERED_DBS[self._db_name] = self._main_path
         return True
 
-    def query(self, rel_path, store_fmt, start_time=None, end_time=None):
+    def query(self, rel_path, store_fmt, start_time=None, end_time=None, symbols=None):
         '''
         查询数据接口
 
@@ -361,6 +418,9 @@ class Database(object):
             非结构化数据不需要设置该参数以及end_time参数
         end_time: datetime like
             数据结束时间(可选)
+        symbols: iterable, default None
+            需要请求的代码(可选)，仅面板数据支持该参数，结果数据的列(或者横截面数据的index)按照给定的代码顺序排列，
+            数据库中不存在的代码对应的数据为缺失值，None表示请求所有代码的数据
 
         Return
         ------
@@ -371,11 +431,116 @@ class Database(object):
         >>> db = Database(r'some_path')
         >>> db.query('data1.data11.data112', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL), '2017-01-01', '2018-01-01')
         >>> db.query('data2.data21', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES), '2017-01-01', '2018-01-01')
+        >>> db.query('data1.data11.data112', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL), '2017-01-01', '2018-01-01', symbols=['000001', '600000'])
+        '''
+        params = self._parse_query_params(rel_path, store_fmt, start_time, end_time, symbols)
+        return self._locked_query(params)
+
+    def query_many(self, requests, start_time=None, end_time=None, max_workers=None, stack=False):
+        '''
+        同时请求多个数据，所有请求先按照数据引擎分组，支持并发请求的引擎(参见database.utils.DBEngine.concurrent_query)
+        的请求在线程池中并发执行，其他引擎的请求在调用线程中依次执行
+
+        Parameter
+        ---------
+        requests: iterable
+            元素为(rel_path, store_fmt)，参数的含义与query相同，rel_path不能重复
+        start_time: datetime like, default None
+            数据开始时间，含义与query相同，所有请求共用
+        end_time: datetime like, default None
+            数据结束时间，含义与query相同，所有请求共用
+        max_workers: int, default None
+            线程池的最大线程数，None表示使用配置文件中的query_max_workers
+        stack: boolean, default False
+            是否将结果合成为一个pandas.DataFrame，仅结构化数据有效，要求所有数据的shape相同
+
+        Return
+        ------
+        out: dict, pandas.DataFrame or None
+            stack为False时，返回{rel_path: data}，顺序与requests相同
+            stack为True时，若请求的是横截面数据，index为rel_path；若请求的是时间区间的数据，index为多重索引，
+            0级是时间，1级是rel_path；若至少有一个数据没有查询到，返回None
+
+        Example
+        -------
+        >>> db = Database(r'some_path')
+        >>> fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+        >>> db.query_many([('data1.close', fmt), ('data1.open', fmt)], '2017-01-01', '2018-01-01')
+        '''
+        requests = list(requests)
+        rel_paths = [r[0] for r in requests]
+        if len(set(rel_paths)) != len(rel_paths):
+            raise ValueError('Duplicate rel_path in parameter "requests"!')
+        # 先完成所有参数的校验，避免部分请求执行后才发现参数错误
+        engine_group = {}
+        for rel_path, store_fmt in requests:
+            params = self._parse_query_params(rel_path, store_fmt, start_time, end_time)
+            engine_group.setdefault(params.get_engine(), []).append(params)
+        if max_workers is None:
+            max_workers = parse_config(CONFIG_PATH)['query_max_workers']
+        out = {}
+        concurrent_params = [p for e in engine_group if e.concurrent_query for p in engine_group[e]]
+        with ThreadPoolExecutor(max_workers=max(min(max_workers, len(concurrent_params)), 1)) as executor:
+            futures = {p.rel_path: executor.submit(self._locked_query, p) for p in concurrent_params}
+            for engine, params_group in engine_group.items():
+                if not engine.concurrent_query:
+                    for params in params_group:
+                        out[params.rel_path] = self._locked_query(params)
+            for rel_path, future in futures.items():
+                out[rel_path] = future.result()
+        logger.debug('[Operation=query_many, Info=\"Query {n} data(engines={e}, workers={w}).\"]'.
+                     format(n=len(requests), e=[e.__name__ for e in engine_group], w=max_workers))
+        out = {rel_path: out[rel_path] for rel_path in rel_paths}
+        if stack:
+            return self._stack_data(out, end_time is None)
+        return out
+
+    @staticmethod
+    def _stack_data(datas, is_cross_section):
+        '''
+        将多个结构化数据合成为一个pandas.DataFrame
+
+        Parameter
+        ---------
+        datas: dict
+            {name: data}形式
+        is_cross_section: boolean
+            数据是否为横截面数据
+
+        Return
+        ------
+        out: pandas.DataFrame or None
+            若数据中至少有一个为None，返回None
+        '''
+        if any(d is None for d in datas.values()):
+            return None
+        data_shapes = [d.shape for d in datas.values()]
+        if not all(s == data_shapes[0] for s in data_shapes):
+            raise ValueError('Input data should have the same shape!')
+        if is_cross_section:
+            out = pd.concat(list(datas.values()), axis=1)
+            out.columns = list(datas.keys())
+            return out.T
+        stacked = []
+        for name, d in datas.items():
+            d = d.copy()
+            d.index = pd.MultiIndex.from_product([d.index, [name]])
+            stacked.append(d)
+        return pd.concat(stacked, axis=0).sort_index(level=[0, 1])
+
+    def _parse_query_params(self, rel_path, store_fmt, start_time, end_time, symbols=None):
+        '''
+        将请求参数解析为ParamsParser对象，并对参数组合进行校验，参数含义参见query
+
+        Return
+        ------
+        params: ParamsParser
         '''
         params = ParamsParser.from_dict(self._main_path, {'rel_path': rel_path,
                                                           'store_fmt': store_fmt,
                                                           'start_time': start_time,
-                                                          'end_time': end_time})
+                                                          'end_time': end_time,
+                                                          'symbols': symbols})
         # 时间参数校验规则，键为(start_time is None, end_time is None)，值为对应的数据结构分类
         validation_rule = {(True, True): DataClassification.UNSTRUCTURED,
                            (False, False): DataClassification.STRUCTURED,
@@ -385,11 +550,27 @@ class Database(object):
         vclassification = validation_rule[time_flag]
         if vclassification is None or vclassification != params.store_fmt[0]:
             raise ValueError('Invalid parameter group in database query!')
-        engine = params.get_engine()
-        data = engine.query(params)
-        return data
+        if symbols is not None and (params.store_fmt.level < 3 or
+                                    params.store_fmt[2] != DataFormatCategory.PANEL):
+            raise ValueError('Parameter "symbols" is only valid for panel data!')
+        return params
 
-    def insert(self, data, rel_path, store_fmt, dtype=None):
+    def _locked_query(self, params):
+        '''
+        持有数据的共享锁，通过对应的数据引擎请求数据
+
+        Parameter
+        ---------
+        params: ParamsParser
+
+        Return
+        ------
+        out: pandas.Series, pandas.DataFrame or object
+        '''
+        with self._acquire_lock(params.rel_path, shared=True):
+            return params.get_engine().query(params)
+
+    def insert(self, data, rel_path, store_fmt, dtype=None, storage_opts=None):
         '''
         存储数据接口
 
@@ -403,6 +584,11 @@ class Database(object):
             数据存储格式分类，详情见模块文档
         dtype: numpy.dtype like, default None
             数据存储类型，目前仅数值型数据需要提供该参数
+        storage_opts: dict, default None
+            数据文件的存储布局选项，仅在首次插入数据(创建数据文件)时有效，目前仅数值型数据支持该参数，
+            可设置的选项有chunk_row_size(每个数据块包含的行数)、compression(压缩方式，支持gzip和lzf)、
+            compression_opts(压缩等级)、shuffle(是否启用shuffle过滤器)，未设置的选项使用配置文件中的默认值
+
         Return
         ------
         issuccess: boolean
@@ -413,17 +599,19 @@ class Database(object):
         >>> db = Database(r'some_path')
         >>> db.insert(data1, 'data1.data11.data112', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL), 'float64')
         >>> db.insert(data2, 'data2.data21', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES), 'int32')
+        >>> db.insert(data1, 'data1.data11.data112', (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL), 'float64', storage_opts={'compression': 'gzip', 'shuffle': True})
         '''
         params = ParamsParser.from_dict(self._main_path, {'rel_path': rel_path,
                                                           'store_fmt': store_fmt,
-                                                          'dtype': dtype})
+                                                          'dtype': dtype,
+                                                          'storage_opts': storage_opts})
         engine = params.get_engine()
-        issuccess = engine.insert(data, params)
-        if issuccess:   # 数据成功插入，修改检查元数据是否需要修改，并采取相应操作
-            if self._data_tree_root.has_offspring(rel_path) is None:
-                self._data_tree_root.add_offspring(rel_path, params.store_fmt)
-                self._dump_meta()
-        else:
+        with self._acquire_lock(rel_path):
+            issuccess = engine.insert(data, params)
+            if issuccess:   # 数据成功插入，若数据树中(包括其他进程添加的)没有该数据，则添加
+                self._commit_change({'op': 'add', 'rel_path': rel_path,
+                                     'store_fmt': list(params.store_fmt.to_strtuple())})
+        if not issuccess:
             logger.warn('[Operation=Database.insert, Info=\"Inserting data failed!(db={db_name}, rel_path={rel_path})\"]'.
                         format(db_name=self._db_name, rel_path=rel_path))
         return issuccess
@@ -451,14 +639,11 @@ class Database(object):
         params = ParamsParser.from_dict(self._main_path, {'rel_path': rel_path,
                                                           'store_fmt': store_fmt})
         engine = params.get_engine()
-        issuccess = engine.remove_data(params)
-        if issuccess:
-            node = self._data_tree_root.has_offspring(rel_path)
-            if node is None:
-                raise ValueError('Node does not exist!')
-            node.parent.delete_child(node.node_name)
-            self._dump_meta()
-        else:
+        with self._acquire_lock(rel_path):
+            issuccess = engine.remove_data(params)
+            if issuccess:
+                self._commit_change({'op': 'remove', 'rel_path': rel_path})
+        if not issuccess:
             logger.warn('[Operation=Database.remove_data, Info=\"Removing data failed!(db={db_name}, rel_path={rel_path})\"]'.
                         format(db_name=self._db_name, rel_path=rel_path))
         return issuccess
@@ -492,27 +677,39 @@ class Database(object):
                         format(source_rel_path))
             return False
         engine = src_params.get_engine()
-        issuccess = engine.move_to(src_params, dest_params)
-        if issuccess:
-            # 更新元数据
-            node = self._data_tree_root.has_offspring(source_rel_path)
-            if node is None:
-                raise ValueError('Node does not exist!(rel_path=\"{}\"'.format(source_rel_path))
-            node.parent.delete_child(node.node_name)
-            rel_path_split = dest_rel_path.split(REL_PATH_SEP)
-            node.change_nodename(rel_path_split[-1])
-            new_parent_path = REL_PATH_SEP.join(rel_path_split[:-1])
-            new_parent_node = self._data_tree_root.has_offspring(new_parent_path)
-            if new_parent_node is None:
-                self._data_tree_root.add_offspring(new_parent_path)
-                new_parent_node = self._data_tree_root.has_offspring(new_parent_path)
-            new_parent_node.add_child(node)
-            self._dump_meta()
-        else:
+        # 按照固定的顺序获取两个数据的锁，避免死锁
+        first_path, second_path = sorted([source_rel_path, dest_rel_path])
+        with self._acquire_lock(first_path), self._acquire_lock(second_path):
+            issuccess = engine.move_to(src_params, dest_params)
+            if issuccess:
+                # 更新元数据
+                self._commit_change({'op': 'move', 'rel_path': source_rel_path, 'dest_rel_path': dest_rel_path})
+        if not issuccess:
             logger.warn('[Operation=Database.move_to, Info=\"Moving data failed!(db={db_name}, src_path={rel_path}, dest_path={dest_path})\"]'.
                         format(db_name=self._db_name, rel_path=source_rel_path, dest_path=dest_rel_path))
         return issuccess
 
+    @contextmanager
+    def batch(self):
+        '''
+        批量修改数据的上下文管理器，期间插入新数据、删除或者移动数据对数据树的变更仅追加到日志文件中，
+        在退出(最外层的)上下文时再一次性将数据树写入元数据文件，可以嵌套使用
+
+        Example
+        -------
+        >>> db = Database(r'some_path')
+        >>> with db.batch():
+        ...     for rel_path, data in datas.items():
+        ...         db.insert(data, rel_path, store_fmt, 'float64')
+        '''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._journal_size > 0:
+                self._checkpoint()
+
     def list_alldata(self):
         '''
         返回所有数据的相对路径
@@ -522,21 +719,11 @@ class Database(object):
         out: list
             元素为每个数据的相对路径
         '''
-        out = []
-
-        def get_all(node):
-            if node.is_leaf:
-                out.append(self._trans_node_relpath(node.rel_path))
-            else:
-                for child in node.children:
-                    get_all(child)
-        get_all(self._data_tree_root)
-        return out
+        return [rel_path for rel_path, _ in self._data_tree_root.index.leaves()]
 
     def find_data(self, name):
         '''
-        查找给定名称的数据
-        内部查询采用BFS算法
+        查找给定名称的数据，通过数据树的索引查找
 
         Parameter
         ---------
@@ -553,14 +740,14 @@ class Database(object):
         >>> db = Database(r'some_path')
         >>> db.find_data('data112') # data structure: data1.data11.data112
         '''
-        nodes = self._find(name, self._data_tree_root, self._precisely_match, True)
+        nodes = self._data_tree_root.index.find(name, True)
         out = [{'rel_path': self._trans_node_relpath(n.rel_path), 'store_fmt': n.store_fmt}
                for n in nodes]
         return out
 
     def find_collection(self, name):
         '''
-        查找给定名称的数据集合，内部查询采用BFS算法
+        查找给定名称的数据集合，通过数据树的索引查找，若某个数据集合的上级数据集合也符合条件，则只返回上级数据集合
 
         Parameter
         ---------
@@ -577,9 +764,12 @@ class Database(object):
         >>> db = Database(r'some_path')
         >>> db.find_collection('data11') # data structure: data1.data11.data112
         '''
-        nodes = self._find(name, self._data_tree_root, self._precisely_match, False)
+        nodes = self._find_collection_nodes(name)
 
         def get_leaf_nodes(node):
+            if node.is_root:    # 整个数据库，直接使用索引中的叶子节点
+                return [{'rel_path': rel_path, 'store_fmt': n.store_fmt}
+                        for rel_path, n in self._data_tree_root.index.leaves()]
             queue = deque()
             queue.append(node)
             result = []
@@ -613,11 +803,18 @@ class Database(object):
         if name is None:
             tobe_printed = [self._data_tree_root]
         else:
-            tobe_printed = self._find(name, self._data_tree_root, self._precisely_match, False)
+            tobe_printed = self._find_collection_nodes(name)
         for root in tobe_printed:
             root.print_node('')
             print('\n')
 
+    @property
+    def metadata_version(self):
+        '''
+        数据树的版本号，每次数据树发生变化(添加、删除或者移动数据)后增加，可以用于判断基于数据树的缓存是否过期
+        '''
+        return self._data_tree_root.index.version
+
     def _get_metadata_filename(self):
         '''
         解析数据库的主路径，获取存储的元数据的名称，目前假设主路径(无论是文件型数据引擎还是商用数据库型数据引擎)
@@ -629,10 +826,101 @@ class Database(object):
         '''
         return os_path.join(self._main_path, '#metadata' + JSON_SUFFIX)
 
+    def _get_journal_filename(self):
+        '''
+        获取数据树变更日志的文件名，日志与元数据文件在同一文件夹下，每行为一条JSON格式的变更记录
+
+        Return
+        ------
+        fn: string
+        '''
+        return os_path.join(self._main_path, '#metadata.journal')
+
+    def _get_lock(self, name):
+        '''
+        获取给定名称的锁，锁文件位于数据库主文件夹下的LOCK_FOLDER中
+
+        Parameter
+        ---------
+        name: string
+            数据的相对路径，或者METADATA_LOCK_NAME
+
+        Return
+        ------
+        out: database.lock.FileLock
+        '''
+        return FileLock(os_path.join(self._main_path, LOCK_FOLDER, name + '.lock'))
+
+    def _acquire_lock(self, name, shared=False):
+        '''
+        获取给定名称的锁，未启用锁时不做任何操作
+
+        Parameter
+        ---------
+        name: string
+            数据的相对路径，或者METADATA_LOCK_NAME
+        shared: boolean, default False
+            是否为共享锁
+
+        Return
+        ------
+        out: context manager
+            退出时释放锁，等待超时引发database.lock.LockTimeoutError
+        '''
+        if not self._lock_enabled:
+            return nullcontext()
+        return self._get_lock(name).acquire(shared, self._lock_timeout)
+
+    def _get_meta_signature(self):
+        '''
+        获取元数据文件和日志文件的状态标识，用于判断其他进程是否修改了数据树
+
+        Return
+        ------
+        out: tuple
+        '''
+        out = []
+        for path in (self._get_metadata_filename(), self._get_journal_filename()):
+            try:
+                st = stat(path)
+                out.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
     def _load_meta(self):
         '''
-        加载该数据库的元数据，转化为数据文件树，若无法找到元数据文件，则直接建立根节点
+        持有元数据的共享锁，加载该数据库的元数据，若日志中的记录数量达到上限，则将其写入元数据文件
         '''
+        with self._acquire_lock(METADATA_LOCK_NAME, shared=True):
+            self._read_meta()
+        if self._journal_size >= self._journal_limit:
+            self._checkpoint()
+
+    def _refresh_meta(self):
+        '''
+        若其他进程修改了数据树(元数据文件或者日志发生变化)，则重新加载元数据，需要在持有元数据的锁时调用
+        '''
+        if self._get_meta_signature() != self._meta_signature:
+            logger.debug('[Operation=Database._refresh_meta, Info="Reload metadata modified by other process(db={})."]'.
+                         format(self._db_name))
+            self._read_meta()
+
+    def _checkpoint(self):
+        '''
+        持有元数据的排他锁，将数据树(包括其他进程写入的变更)写入元数据文件
+        '''
+        with self._acquire_lock(METADATA_LOCK_NAME):
+            self._refresh_meta()
+            self._dump_meta()
+
+    def _read_meta(self):
+        '''
+        加载该数据库的元数据，转化为数据文件树，若无法找到元数据文件，则直接建立根节点，
+        然后重放日志中尚未写入元数据文件的变更，需要在持有元数据的锁时调用
+        '''
+        version = 0 if self._data_tree_root is None else self._data_tree_root.index.version + 1
+        signature = self._get_meta_signature()
         metadata_path = self._get_metadata_filename()
         try:
             with open(metadata_path, 'r', encoding=ENCODING) as f:
@@ -640,68 +928,132 @@ class Database(object):
             self._data_tree_root = DataNode.init_from_meta(meta_data)
         except FileNotFoundError:
             self._data_tree_root = DataNode(self._db_name)
+        self._data_tree_root.enable_index(version)
+        try:
+            with open(self._get_journal_filename(), 'r', encoding=ENCODING) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        for line in lines:
+            try:
+                change = json.loads(line)
+            except ValueError:  # 写入过程中断的记录
+                logger.warning('[Operation=Database._load_meta, Info=\"Skip broken journal record(db={db_name}, record={r})!\"]'.
+                               format(db_name=self._db_name, r=line.strip()))
+                continue
+            self._apply_change(change, strict=False)
+        self._journal_size = len(lines)
+        self._meta_signature = signature
 
-    def _find(self, name, node, match_func, leaf_node):
+    def _apply_change(self, change, strict=True):
         '''
-        具体实现数据或者数据集合名查找的函数
-        采用BFS算法遍历查找
+        将一条变更记录应用到数据树上
 
         Parameter
         ---------
-        name: string
-            数据或者数据集合的名称
-        node: DataNode
-            查找的起始节点
-        match_func: callable
-            判断两个名字是否相匹配的函数，格式签名为match_func(name, node_name)->boolean
-        leaf_node: boolean
-            True表示查找叶子结点
+        change: dict
+            变更记录，有以下三种形式:
+            {'op': 'add', 'rel_path': rel_path, 'store_fmt': [str, ...]}
+            {'op': 'remove', 'rel_path': rel_path}
+            {'op': 'move', 'rel_path': source_rel_path, 'dest_rel_path': dest_rel_path}
+        strict: boolean, default True
+            变更与当前数据树不一致(例如删除不存在的节点)时，True表示引发ValueError，False表示忽略该变更，
+            重放日志时日志中的变更可能已经写入元数据文件，因此需要设置为False
 
         Return
         ------
-        result: list
-            DataNode列表，若未查找到，则为空列表
+        result: boolean
+            数据树是否发生变化
         '''
-        result = []
-        if not node.is_leaf:
-            if not leaf_node:   # 查找中间节点
-                if match_func(name, node.node_name):
-                    result.append(node)
-                    return result
-            for child in node.children:
-                tmp_res = self._find(name, child, match_func, leaf_node)
-                result += tmp_res
-            return result
-        else:
-            if leaf_node:
-                if match_func(name, node.node_name):
-                    result.append(node)
-            return result
+        root = self._data_tree_root
+        node = root.has_offspring(change['rel_path'])
+        if change['op'] == 'add':
+            if node is not None:
+                if strict:
+                    raise ValueError('Node already exists!(rel_path=\"{}\")'.format(change['rel_path']))
+                return False
+            root.add_offspring(change['rel_path'], strs2StoreFormat(change['store_fmt']))
+            return True
+        if node is None:
+            if strict:
+                raise ValueError('Node does not exist!(rel_path=\"{}\")'.format(change['rel_path']))
+            return False
+        if change['op'] == 'remove':
+            node.parent.delete_child(node.node_name)
+            return True
+        if change['op'] == 'move':
+            dest_rel_path = change['dest_rel_path']
+            if not strict and root.has_offspring(dest_rel_path) is not None:
+                return False
+            node.parent.delete_child(node.node_name)
+            rel_path_split = dest_rel_path.split(REL_PATH_SEP)
+            node.change_nodename(rel_path_split[-1])
+            new_parent_path = REL_PATH_SEP.join(rel_path_split[:-1])
+            new_parent_node = root.has_offspring(new_parent_path)
+            if new_parent_node is None:
+                root.add_offspring(new_parent_path)
+                new_parent_node = root.has_offspring(new_parent_path)
+            new_parent_node.add_child(node)
+            return True
+        raise ValueError('Unsupported change operation({})!'.format(change['op']))
 
-    @staticmethod
-    def _precisely_match(name, node_name):
+    def _commit_change(self, change):
         '''
-        精确查找函数，即只有两个字符串相等才行
+        持有元数据的排他锁，先重新加载其他进程写入的变更，然后将变更记录追加到日志文件中，再修改数据树，
+        日志记录数量达到上限且不在batch中时，将数据树写入元数据文件
+
+        Parameter
+        ---------
+        change: dict
+            变更记录，参见_apply_change，添加已经存在的数据时不做任何操作
+        '''
+        with self._acquire_lock(METADATA_LOCK_NAME):
+            self._refresh_meta()
+            if change['op'] == 'add' and self._data_tree_root.has_offspring(change['rel_path']) is not None:
+                return
+            with open(self._get_journal_filename(), 'a', encoding=ENCODING) as f:
+                f.write(json.dumps(change) + '\n')
+                f.flush()
+                fsync(f.fileno())
+            self._journal_size += 1
+            self._meta_signature = self._get_meta_signature()
+            self._apply_change(change)
+            if self._batch_depth == 0 and self._journal_size >= self._journal_limit:
+                self._dump_meta()
+
+    def _find_collection_nodes(self, name):
+        '''
+        查找给定名称的数据集合节点，若某个节点的祖先节点也符合条件，则该节点不包含在结果中
 
         Parameter
         ---------
         name: string
-        node_name: string
+            数据集合的名称
 
         Return
         ------
-        result: boolean
+        result: list
+            DataNode列表，若未查找到，则为空列表
         '''
-        return name == node_name
+        root = self._data_tree_root
+        if root.node_name == name:
+            return [root]
+        nodes = root.index.find(name, False)
+        paths = [self._trans_node_relpath(n.rel_path) for n in nodes]
+        return [n for n, p in zip(nodes, paths)
+                if not any(p.startswith(other + REL_PATH_SEP) for other in paths)]
 
     def _dump_meta(self):
         '''
-        将更新后的结构写入到元数据中，仅在每次发生元数据更新后调用
+        将当前的数据树写入到元数据文件中(先写入临时文件再替换)，写入完成后清空日志，需要在持有元数据的排他锁时调用
         '''
         metadata = self._data_tree_root.to_dict()
-        metadata_path = self._get_metadata_filename()
-        with open(metadata_path, 'w', encoding=ENCODING) as f:
-            json.dump(metadata, f)
+        dump_json_atomically(metadata, self._get_metadata_filename())
+        journal_path = self._get_journal_filename()
+        if os_path.exists(journal_path):
+            os_remove(journal_path)
+        self._journal_size = 0
+        self._meta_signature = self._get_meta_signature()
 
     @staticmethod
     def _trans_node_relpath(node_rel_path):
@@ -719,6 +1071,119 @@ class Database(object):
         return node_rel_path[1:]
 
 
+class DataNodeIndex(object):
+    '''
+    数据文件结构树的索引，挂载在根节点上，节点的添加和删除(DataNode.add_child, DataNode.delete_child)会同步更新索引，
+    用于按照相对路径或者名称查找节点时避免遍历整个树
+
+    该类提供以下方法:
+    add_subtree: 将给定节点及其所有后代节点加入索引
+    remove_subtree: 将给定节点及其所有后代节点从索引中移除
+    get: 获取给定相对路径的节点
+    find: 获取给定名称的节点
+    leaves: 获取所有的叶子节点
+    version: 只读属性，每次索引变化后加1，可以用于判断基于数据树的缓存是否过期
+
+    Parameter
+    ---------
+    version: int, default 0
+        初始的版本号
+
+    Notes
+    -----
+    根节点不在索引中，索引中的相对路径不包含开头的分隔符
+    '''
+    def __init__(self, version=0):
+        self._nodes = {}     # {rel_path: DataNode}
+        self._names = {}     # {node_name: {rel_path: DataNode}}
+        self._version = version
+
+    def add_subtree(self, node):
+        '''
+        将给定节点及其所有后代节点加入索引
+
+        Parameter
+        ---------
+        node: DataNode
+            已经连接到根节点的节点
+        '''
+        stack = [(node, node.rel_path[1:])]
+        while stack:
+            current_node, rel_path = stack.pop()
+            self._nodes[rel_path] = current_node
+            self._names.setdefault(current_node.node_name, {})[rel_path] = current_node
+            stack.extend((child, rel_path + REL_PATH_SEP + child.node_name) for child in current_node.children)
+        self._version += 1
+
+    def remove_subtree(self, node):
+        '''
+        将给定节点及其所有后代节点从索引中移除
+
+        Parameter
+        ---------
+        node: DataNode
+            仍然连接在根节点上的节点
+        '''
+        stack = [(node, node.rel_path[1:])]
+        while stack:
+            current_node, rel_path = stack.pop()
+            self._nodes.pop(rel_path, None)
+            same_name_nodes = self._names.get(current_node.node_name, {})
+            same_name_nodes.pop(rel_path, None)
+            if not same_name_nodes:
+                self._names.pop(current_node.node_name, None)
+            stack.extend((child, rel_path + REL_PATH_SEP + child.node_name) for child in current_node.children)
+        self._version += 1
+
+    def get(self, rel_path):
+        '''
+        获取给定相对路径的节点
+
+        Parameter
+        ---------
+        rel_path: string
+            不包含开头分隔符的相对路径
+
+        Return
+        ------
+        node: DataNode or None
+        '''
+        return self._nodes.get(rel_path, None)
+
+    def find(self, name, leaf_node):
+        '''
+        获取给定名称的节点
+
+        Parameter
+        ---------
+        name: string
+            节点名称
+        leaf_node: boolean
+            True表示查找叶子节点，False表示查找中间节点(数据集合)
+
+        Return
+        ------
+        out: list
+            元素为DataNode
+        '''
+        return [n for n in self._names.get(name, {}).values() if n.is_leaf == leaf_node]
+
+    def leaves(self):
+        '''
+        获取所有的叶子节点
+
+        Return
+        ------
+        out: list
+            元素为(rel_path, DataNode)
+        '''
+        return [(p, n) for p, n in self._nodes.items() if n.is_leaf]
+
+    @property
+    def version(self):
+        return self._version
+
+
 class DataNode(object):
     '''
     文件结构树节点类，用于标识数据库中各个数据文件(夹)之间的包含关系，其中根节点的parent为None
@@ -736,6 +1201,7 @@ class DataNode(object):
         self._store_fmt = store_fmt
         self._children = {}
         self._parent = None
+        self._index = None    # 仅在调用enable_index后的根节点上非空
 
     @classmethod
     def init_from_meta(cls, meta_data):
@@ -786,6 +1252,9 @@ class DataNode(object):
                 'Current node({}) tries to overlap a child node!'.format(self._node_name))
         child._parent = self
         self._children[child.node_name] = child
+        index = self._get_index()
+        if index is not None:
+            index.add_subtree(child)
 
     def delete_child(self, child_name):
         '''
@@ -805,6 +1274,9 @@ class DataNode(object):
                         format(cn=self._node_name, cl=child_name))
             return False
         child = self._children[child_name]
+        index = self._get_index()
+        if index is not None:
+            index.remove_subtree(child)
         del self._children[child_name]
         child._parent = None
         if len(self._children) == 0 and not self.is_root:    # 表明当前中间节点没有任何子节点
@@ -870,6 +1342,8 @@ class DataNode(object):
         node: DataNode
             如果找到了该路径下的节点，则返回该节点，反之，返回None
         '''
+        if self._index is not None:     # 根节点直接通过索引查找
+            return self._index.get(rel_path)
         offsprings = rel_path.split(REL_PATH_SEP)
         child = self._children.get(offsprings[0], None)
         if child is None:   # 没有该后代
@@ -916,6 +1390,35 @@ class DataNode(object):
                 raise ValueError(
                     'Current node({}) tries to overlap an existing node!'.format(self._node_name))
 
+    def enable_index(self, version=0):
+        '''
+        在根节点上建立索引(DataNodeIndex)，之后该树中节点的添加和删除都会同步更新索引
+
+        Parameter
+        ---------
+        version: int, default 0
+            索引的初始版本号，重新加载数据树时使用大于原索引的版本号，保证版本号单调递增
+        '''
+        if not self.is_root:
+            raise ValueError('Only the root node({}) can enable the index!'.format(self._node_name))
+        self._index = DataNodeIndex(version)
+        for child in self.children:
+            self._index.add_subtree(child)
+
+    def _get_index(self):
+        '''
+        获取当前节点所在树的索引
+
+        Return
+        ------
+        index: DataNodeIndex or None
+            若根节点没有建立索引，返回None
+        '''
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        return node._index
+
     def change_nodename(self, new_name):
         '''
         改变节点的名字，对应修改母节点中的相关信息
@@ -972,6 +1475,10 @@ class DataNode(object):
     def is_root(self):
         return self._parent is None
 
+    @property
+    def index(self):
+        return self._index
+
     @property
     def rel_path(self):
         if self.is_root:    # 根节点为数据库名，没有相对路径
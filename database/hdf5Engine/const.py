@@ -20,3 +20,18 @@ LOGGER_NAME = set_logger(DB_CONFIG['log'])
 
 # 文件后缀
 SUFFIX = '.h5'
+# 快照文件后缀，快照文件与数据文件在同一文件夹下，参见database.hdf5Engine.tools.create_snapshot
+SNAPSHOT_SUFFIX = '.h5snap'
+
+# 数据文件格式版本
+# 1: 时间轴以字符串(DB_CONFIG['date_dtype'])形式存储
+# 2: 时间轴以int64(距1970-01-01的纳秒数，即datetime64[ns])形式存储
+LEGACY_FORMAT_VERSION = 1
+FORMAT_VERSION = 2
+
+# 数据集存储布局选项，默认值由配置文件设置，可以在插入数据时通过storage_opts参数对单个数据进行设置
+STORAGE_OPTION_KEYS = ('chunk_row_size', 'compression', 'compression_opts', 'shuffle')
+
+# 时间轴和代码轴数据集的分块长度，轴数据通常一次性全部读取，若由h5py自动推断分块(初始长度为1)，
+# 分块长度也为1，读取时需要访问大量的数据块
+AXIS_CHUNK_SIZE = 1024
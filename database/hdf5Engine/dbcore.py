@@ -9,7 +9,8 @@ Created on Thu Jan 11 14:53:33 2018
 """
 import abc
 import logging
-from os import remove, makedirs, sep
+import threading
+from os import remove, makedirs, sep, stat
 from os.path import exists, dirname, join
 import pdb
 
@@ -18,13 +19,268 @@ import h5py
 import numpy as np
 
 from database.hdf5Engine.const import (LOGGER_NAME, DB_CONFIG, DataFormatCategory,
-                                       FilledStatus, NaS, SUFFIX, REL_PATH_SEP)
+                                       FilledStatus, NaS, SUFFIX, REL_PATH_SEP,
+                                       FORMAT_VERSION, LEGACY_FORMAT_VERSION, STORAGE_OPTION_KEYS,
+                                       AXIS_CHUNK_SIZE, SNAPSHOT_SUFFIX)
 from database.hdf5Engine.exceptions import InvalidInputTypeError, UnsupportDataTypeError
+from database.hdf5Engine.filepool import FILE_POOL
 from database.utils import DBEngine
 
 # 获取当前日志句柄
 logger = logging.getLogger(LOGGER_NAME)
 
+# 快照文件数据集的内存映射缓存，格式为{snapshot_path: (snapshot_signature, source_signature, data)}
+_SNAPSHOT_MAPS = {}
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def parse_storage_opts(storage_opts=None):
+    '''
+    将给定的存储布局选项与配置文件中的默认选项合并
+
+    Parameter
+    ---------
+    storage_opts: dict, default None
+        存储布局选项，支持的选项为['chunk_row_size', 'compression', 'compression_opts', 'shuffle']，
+        未给定的选项使用配置文件中的默认值
+
+    Return
+    ------
+    out: dict
+    '''
+    out = {k: DB_CONFIG[k] for k in STORAGE_OPTION_KEYS}
+    if storage_opts is not None:
+        invalid_keys = set(storage_opts).difference(STORAGE_OPTION_KEYS)
+        if invalid_keys:
+            raise ValueError('Invalid storage options({}), valids are {}!'.format(sorted(invalid_keys),
+                                                                                 STORAGE_OPTION_KEYS))
+        out.update(storage_opts)
+    return out
+
+
+def get_dataset_layout(storage_opts, col_size=None):
+    '''
+    将存储布局选项转换为h5py.Group.create_dataset可以接受的关键字参数
+
+    Parameter
+    ---------
+    storage_opts: dict
+        完整的存储布局选项，参见parse_storage_opts
+    col_size: int, default None
+        数据集的列数，None表示一维数据集
+
+    Return
+    ------
+    out: dict
+        包含chunks以及压缩相关的参数
+    '''
+    row_size = max(int(storage_opts['chunk_row_size']), 1)
+    if col_size is None:
+        out = {'chunks': (row_size, )}
+    else:
+        out = {'chunks': (row_size, col_size)}
+    if storage_opts['compression'] is not None:
+        out['compression'] = storage_opts['compression']
+        if storage_opts['compression_opts'] is not None:
+            out['compression_opts'] = storage_opts['compression_opts']
+    if storage_opts['shuffle']:
+        out['shuffle'] = True
+    return out
+
+
+def get_storage_opts(dset):
+    '''
+    从已有的数据集中解析存储布局选项，与get_dataset_layout互为逆操作
+
+    Parameter
+    ---------
+    dset: h5py.Dataset
+
+    Return
+    ------
+    out: dict
+        完整的存储布局选项，参见parse_storage_opts
+    '''
+    out = parse_storage_opts()
+    if dset.chunks is not None:
+        out['chunk_row_size'] = dset.chunks[0]
+    out['compression'] = dset.compression
+    out['compression_opts'] = dset.compression_opts
+    out['shuffle'] = dset.shuffle
+    return out
+
+
+def _get_fillvalue(dtype):
+    '''
+    获取数据集的默认填充值，浮点型数据使用NaN，其他类型使用HDF5的默认值
+
+    Parameter
+    ---------
+    dtype: numpy.dtype or string
+
+    Return
+    ------
+    out: float or None
+    '''
+    return np.nan if np.dtype(dtype).kind == 'f' else None
+
+
+def coalesce_positions(positions):
+    '''
+    将列位置排序并合并为连续的区间
+
+    Parameter
+    ---------
+    positions: iterable
+        元素为非负整数的列位置，可以无序，可以重复
+
+    Return
+    ------
+    runs: list
+        元素为(start, stop)形式的元组，表示[start, stop)的连续区间，按照升序排列
+
+    Example
+    -------
+    >>> coalesce_positions([5, 1, 2, 3, 9, 8])
+    [(1, 4), (5, 6), (8, 10)]
+    '''
+    positions = np.unique(np.asarray(positions, dtype='int64'))
+    if len(positions) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(positions) > 1) + 1
+    starts = np.concatenate(([positions[0]], positions[breaks]))
+    stops = np.concatenate((positions[breaks - 1], [positions[-1]])) + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def read_column_runs(dset, start_idx, end_idx, runs):
+    '''
+    通过一次读取操作从二维数据集中读取给定行区间内若干列区间的数据，列区间的并集由HDF5的hyperslab选择实现，
+    避免逐列读取或者逐个区间读取导致的重复数据块访问
+
+    Parameter
+    ---------
+    dset: h5py.Dataset
+        二维数据集
+    start_idx: int
+        行区间的开始(包含)
+    end_idx: int
+        行区间的结束(不包含)
+    runs: list
+        列区间，元素为(start, stop)，要求按照升序排列且互不重叠，参见coalesce_positions
+
+    Return
+    ------
+    out: np.ndarray
+        shape为(end_idx - start_idx, 列区间长度的和)，列按照区间的顺序排列
+    '''
+    row_num = end_idx - start_idx
+    col_num = sum(stop - start for start, stop in runs)
+    out = np.empty((row_num, col_num), dtype=dset.dtype)
+    if row_num == 0 or col_num == 0:
+        return out
+    file_space = dset.id.get_space()
+    file_space.select_none()
+    for start, stop in runs:
+        file_space.select_hyperslab((start_idx, start), (row_num, stop - start), op=h5py.h5s.SELECT_OR)
+    mem_space = h5py.h5s.create_simple((row_num, col_num))
+    dset.id.read(mem_space, file_space, out)
+    return out
+
+
+
+def get_snapshot_path(file_path):
+    '''
+    获取数据文件对应的快照文件路径
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件路径
+
+    Return
+    ------
+    out: string
+    '''
+    if file_path.endswith(SUFFIX):
+        file_path = file_path[:-len(SUFFIX)]
+    return file_path + SNAPSHOT_SUFFIX
+
+
+def file_signature(path):
+    '''
+    获取文件的状态标识，用于判断快照文件是否与数据文件一致
+
+    Parameter
+    ---------
+    path: string
+
+    Return
+    ------
+    out: tuple
+        (修改时间, 文件大小)
+    '''
+    st = stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def map_snapshot(file_path):
+    '''
+    将数据文件对应的快照文件中的数据集映射到内存中，同一快照文件在进程中仅映射一次
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件路径
+
+    Return
+    ------
+    data: numpy.ndarray or None
+        只读的内存映射数组，若快照文件不存在或者数据文件在快照创建后被修改过，返回None
+
+    Notes
+    -----
+    快照中的数据集为连续存储且没有压缩，因此可以通过数据集在文件中的偏移量直接映射，多个进程映射同一快照文件时
+    共享操作系统的页缓存
+    '''
+    snapshot_path = get_snapshot_path(file_path)
+    try:
+        snapshot_signature = file_signature(snapshot_path)
+        source_signature = file_signature(file_path)
+    except FileNotFoundError:
+        return None
+    with _SNAPSHOT_LOCK:
+        item = _SNAPSHOT_MAPS.get(snapshot_path, None)
+        if item is None or item[0] != snapshot_signature:
+            with FILE_POOL.open(snapshot_path, 'r') as store:
+                dset = store['data']
+                recorded_signature = tuple(int(v) for v in store.attrs['source signature'])
+                mm = np.memmap(snapshot_path, mode='r', dtype=dset.dtype, offset=dset.id.get_offset(),
+                               shape=dset.shape)
+            item = (snapshot_signature, recorded_signature, mm.view(np.ndarray))
+            _SNAPSHOT_MAPS[snapshot_path] = item
+    if item[1] != source_signature:
+        logger.debug('[Operation=map_snapshot, Info=\"Snapshot is out of date(path={}).\"]'.format(snapshot_path))
+        return None
+    return item[2]
+
+
+def discard_snapshot(file_path):
+    '''
+    删除数据文件对应的快照文件(若存在)，并清除其内存映射缓存，数据文件被删除或者移动前调用
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件路径
+    '''
+    snapshot_path = get_snapshot_path(file_path)
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT_MAPS.pop(snapshot_path, None)
+    FILE_POOL.discard(snapshot_path)
+    if exists(snapshot_path):
+        remove(snapshot_path)
+
 
 class DataIndex(object, metaclass=abc.ABCMeta):
     '''
@@ -91,6 +347,7 @@ class TimeIndex(DataIndex):
         init_from_dataset(h5py.Dataset: date_dset)将使用h5py的Dataset对象作为参数传入
         init_from_index(pandas.Index: pd_index)将使用pandas.Index对象作为参数传入
         to_bytes()可以将pandas.Index(datetime)转换为二进制字符串数组(numpy.array)
+        to_int64()可以将pandas.Index(datetime)转换为int64数组(numpy.array)，用于新格式的数据文件
     该类还提供三个只读属性获取相关的元数据，包括:
         length: int，数据库中时间数据的长度
         start_time: datetime like，数据的开始时间
@@ -111,7 +368,8 @@ class TimeIndex(DataIndex):
         Parameter
         ---------
         date_dset: h5py.Dataset
-            数据集对象，具有length(int)、latest_data_time(string)、start_time(string)三个属性
+            数据集对象，具有length(int)、latest_data_time(string)、start_time(string)三个属性，
+            数据类型为字符串(旧格式)或者int64(新格式)
 
         Return
         ------
@@ -119,9 +377,12 @@ class TimeIndex(DataIndex):
             经过数据集数据初始化后的TimeIndex对象
         '''
         obj = cls()
-        dates = date_dset[...]
-        obj._data = pd.Index(pd.to_datetime([s.decode('utf-8') for s in dates]))
         obj._length = date_dset.attrs['length']
+        dates = date_dset[:obj._length]
+        if date_dset.dtype.kind == 'S':    # 旧格式，时间以字符串形式存储
+            obj._data = pd.Index(pd.to_datetime([s.decode('utf-8') for s in dates]))
+        else:   # 新格式，直接将int64数据视为datetime64[ns]，不需要逐个解析
+            obj._data = pd.DatetimeIndex(dates.view('M8[ns]'))
         obj._end_time = pd.to_datetime(date_dset.attrs['latest_data_time'])
         obj._start_time = pd.to_datetime(date_dset.attrs['start_time'])
         return obj
@@ -168,6 +429,33 @@ class TimeIndex(DataIndex):
         out = self._data.strftime(date_fmt).astype(dtype)
         return out
 
+    def to_int64(self):
+        '''
+        将索引数据对象转化为int64序列(距1970-01-01的纳秒数)
+
+        Return
+        ------
+        dates: np.array
+        '''
+        return pd.DatetimeIndex(self._data).values.astype('M8[ns]').view('i8')
+
+    def to_dataset_format(self, dset):
+        '''
+        按照数据集的存储类型将索引数据对象进行转换
+
+        Parameter
+        ---------
+        dset: h5py.Dataset
+            存储时间数据的数据集
+
+        Return
+        ------
+        dates: np.array
+        '''
+        if dset.dtype.kind == 'S':
+            return self.to_bytes(DB_CONFIG['date_dtype'], DB_CONFIG['db_time_format'])
+        return self.to_int64()
+
     @property
     def length(self):
         return self._length
@@ -504,11 +792,19 @@ class Reader(object):
     该类提供几个对外的接口:
     query: 根据给定的参数，从数据文件中请求给定的数据
     query_all: 根据给定的参数，从数据文件中请求文件中存储的所有数据
+
+    Notes
+    -----
+    时间轴数据在加载元数据时一并缓存到内存中，请求时间区间数据时，通过对时间轴二分查找确定数据所在的
+    行区间，仅从文件中读取对应的行，因此请求的耗时取决于请求的时间长度，而非文件中数据的总长度；
+    请求横截面数据时，同样先定位行号，然后仅读取该行的数据
     '''
-    def __init__(self, params):
+    def __init__(self, params, path=None):
         self.properties = None
         self._params = params
+        self._path = params.absolute_path if path is None else path
         self.symbols = None
+        self.time_index = None
         self._load_property()
 
     def _load_property(self):
@@ -521,58 +817,165 @@ class Reader(object):
             '''
             return t if t == NaS else pd.to_datetime(t)
         try:
-            store = h5py.File(self._params.absolute_path, 'r')
-            time_dset = store['time']
-            self.properties = {'time': {'length': store['time'].attrs['length'],
-                                     'latest_data_time': load_time(time_dset.attrs['latest_data_time']),
-                                     'start_time': load_time(time_dset.attrs['start_time'])},
-                            'filled status': FilledStatus[store.attrs['filled status']],
-                            'data category': DataFormatCategory[store.attrs['data category']],
-                            'column size': store.attrs['column size'],
-                            'data': {'dtype': np.dtype(store['data'].attrs['dtype'])}}
-            if self._params.store_fmt[2] == DataFormatCategory.PANEL: # 这里假设第三级存储格式为DataFromatCategory类型
-                self.properties.update({'symbol': {'length': store['symbol'].attrs['length']}})
-                self.symbols = SymbolIndex.init_from_dataset(store['symbol'])
+            with FILE_POOL.open(self._path, 'r') as store:
+                time_dset = store['time']
+                self.properties = {'time': {'length': store['time'].attrs['length'],
+                                         'latest_data_time': load_time(time_dset.attrs['latest_data_time']),
+                                         'start_time': load_time(time_dset.attrs['start_time'])},
+                                'filled status': FilledStatus[store.attrs['filled status']],
+                                'data category': DataFormatCategory[store.attrs['data category']],
+                                'column size': store.attrs['column size'],
+                                'format version': store.attrs.get('format version', LEGACY_FORMAT_VERSION),
+                                'data': {'dtype': np.dtype(store['data'].attrs['dtype'])}}
+                if self._params.store_fmt[2] == DataFormatCategory.PANEL: # 这里假设第三级存储格式为DataFromatCategory类型
+                    self.properties.update({'symbol': {'length': store['symbol'].attrs['length']}})
+                    self.symbols = SymbolIndex.init_from_dataset(store['symbol'])
+                if self.properties['filled status'] == FilledStatus.FILLED:
+                    self.time_index = TimeIndex.init_from_dataset(time_dset)
         except OSError:
             raise FileNotFoundError
-        except Exception as e:
-            store.close()
-            raise e
 
-    def query_all(self):
+    def _locate_range(self, start_time, end_time):
         '''
-        根据传入给本对象的相关参数，从数据文件中查询所有数据，并根据数据的分类返回恰当的格式，PANEL->pd.DataFrame，
-        TS->pd.Series
+        通过对时间轴进行二分查找，获取给定时间区间(包含边界)对应的数据行区间
+
+        Parameter
+        ---------
+        start_time: datetime like
+            区间开始时间
+        end_time: datetime like
+            区间结束时间
+
+        Return
+        ------
+        start_idx: int
+            区间开始的行号(包含)
+        end_idx: int
+            区间结束的行号(不包含)，若start_idx >= end_idx表示该区间内没有数据
+        '''
+        # 数据写入时保证了时间轴的升序排列，因此可以直接进行二分查找
+        time_data = self.time_index.data
+        start_idx = time_data.searchsorted(pd.to_datetime(start_time), side='left')
+        end_idx = time_data.searchsorted(pd.to_datetime(end_time), side='right')
+        return start_idx, end_idx
+
+    def _locate_time(self, date):
+        '''
+        通过对时间轴进行二分查找，获取给定时间点对应的数据行号
+
+        Parameter
+        ---------
+        date: datetime like
+
+        Return
+        ------
+        row_idx: int
+            数据所在的行号，若数据文件中没有该时间点的数据，则返回None
+        '''
+        date = pd.to_datetime(date)
+        time_data = self.time_index.data
+        row_idx = time_data.searchsorted(date, side='left')
+        if row_idx >= len(time_data) or time_data[row_idx] != date:
+            return None
+        return row_idx
+
+    def _query_row(self, row_idx):
+        '''
+        从数据文件中读取给定行的横截面数据，仅对面板数据有效，若参数中给定了代码(symbols)，则仅读取对应的列
+
+        Parameter
+        ---------
+        row_idx: int
+            数据行号
+
+        Return
+        ------
+        out: pd.Series
+            index为代码，name为该行数据对应的时间
+        '''
+        symbol_index = self.symbols
+        symbols = self._params.symbols
+        with FILE_POOL.open(self._path, 'r') as store:
+            if symbols is None:
+                value = store['data'][row_idx, :symbol_index.length]
+                return pd.Series(value, index=symbol_index.data, name=self.time_index.data[row_idx])
+            runs, columns = self._locate_symbols(symbols)
+            value = read_column_runs(store['data'], row_idx, row_idx + 1, runs)[0]
+        out = pd.Series(value, index=columns, name=self.time_index.data[row_idx])
+        return out.reindex(symbols)
+
+    def _locate_symbols(self, symbols):
+        '''
+        获取给定代码在数据文件中的列位置，并合并为连续的列区间
+
+        Parameter
+        ---------
+        symbols: list
+            代码列表，不在数据文件中的代码会被忽略
+
+        Return
+        ------
+        runs: list
+            列区间，参见coalesce_positions
+        columns: pd.Index
+            按照列区间读取后数据的列名
+        '''
+        positions = self.symbols.data.get_indexer(symbols)
+        positions = np.unique(positions[positions >= 0])
+        return coalesce_positions(positions), self.symbols.data[positions]
+
+    def _query_range(self, start_idx, end_idx):
+        '''
+        从数据文件中读取给定行区间的数据，仅读取对应的数据块，若参数中给定了代码(symbols)，则仅读取对应的列
+
+        Parameter
+        ---------
+        start_idx: int
+            区间开始的行号(包含)
+        end_idx: int
+            区间结束的行号(不包含)
 
         Return
         ------
         out: pd.DataFrame or pd.Series
-            数据文件中存储的所有数据，若没有填充任何数据，则返回None
         '''
-        try:
-            tmp_properties = self.properties
-            if tmp_properties['filled status'] == FilledStatus.EMPTY:
-                logger.warn("[Operation=Reader.query_all, Info=\"Query an empty data file(file_path = {}).\"]".
-                            format(self._params.absolute_path))
-                return None
-            store = h5py.File(self._params.absolute_path, 'r')
-            # 加载日期数据
-            date_dset = store['time']
+        tmp_properties = self.properties
+        date_index = self.time_index.data[start_idx: end_idx]
+        with FILE_POOL.open(self._path, 'r') as store:
+            data_dset = store['data']
             if tmp_properties['data category'] == DataFormatCategory.PANEL:
-                symbol_dset = store['symbol']
-                data_dset = store['data']
-                data = Data.init_from_datasets(data_dset, date_dset, symbol_dset)
-                out = data.data
+                symbols = self._params.symbols
+                if symbols is None:
+                    symbol_index = self.symbols
+                    value = data_dset[start_idx: end_idx, :symbol_index.length]
+                    out = pd.DataFrame(value, index=date_index, columns=symbol_index.data)
+                else:
+                    runs, columns = self._locate_symbols(symbols)
+                    value = read_column_runs(data_dset, start_idx, end_idx, runs)
+                    out = pd.DataFrame(value, index=date_index, columns=columns).reindex(columns=symbols)
             elif tmp_properties['data category'] == DataFormatCategory.TIME_SERIES:
-                data_dset = store['data']
-                data = Data.init_from_datasets(data_dset, date_dset)
-                out = data.data
+                value = data_dset[start_idx: end_idx]
+                out = pd.Series(value, index=date_index)
             else:
                 raise NotImplementedError
-        finally:
-            store.close()
         return out
 
+    def query_all(self):
+        '''
+        根据传入给本对象的相关参数，从数据文件中查询所有数据(时间轴)，并根据数据的分类返回恰当的格式，PANEL->pd.DataFrame，
+        TS->pd.Series
+
+        Return
+        ------
+        out: pd.DataFrame or pd.Series
+            数据文件中存储的所有数据，若没有填充任何数据，则返回None
+        '''
+        if self.properties['filled status'] == FilledStatus.EMPTY:
+            logger.warn("[Operation=Reader.query_all, Info=\"Query an empty data file(file_path = {}).\"]".
+                        format(self._path))
+            return None
+        return self._query_range(0, self.properties['time']['length'])
+
     def query(self):
         '''
         根据传入给本对象的相关参数，从数据文件中查询请求的数据，并根据数据的分类返回恰当的格式，PANEL->pd.DataFrame，
@@ -586,25 +989,78 @@ class Reader(object):
         params = self._params
         if (self.properties['data category'] == DataFormatCategory.PANEL and
             params.start_time is not None and params.end_time is None):  # 请求横截面数据
-            all_data = self.query_all()
-            try:
-                out = all_data.loc[params.start_time]
-            except KeyError:
+            if self.properties['filled status'] == FilledStatus.EMPTY:
                 return None
+            row_idx = self._locate_time(params.start_time)
+            if row_idx is None:
+                return None
+            out = self._query_row(row_idx)
         elif params.start_time is not None and params.end_time is not None:
-            all_data = self.query_all()
-            if all_data is not None:
-                mask = (all_data.index >= params.start_time) & (all_data.index <= params.end_time)
-                out = all_data.loc[mask]
-                if len(out) == 0:
-                    return None
-            else:
+            if self.properties['filled status'] == FilledStatus.EMPTY:
+                return None
+            start_idx, end_idx = self._locate_range(params.start_time, params.end_time)
+            if start_idx >= end_idx:
                 return None
+            out = self._query_range(start_idx, end_idx)
         else:
             raise NotImplementedError
         return out
 
 
+class SnapshotReader(Reader):
+    '''
+    快照读取器类，从快照文件的内存映射中读取数据，接口与Reader相同
+
+    Parameter
+    ---------
+    params: database.db.ParamsParser
+    data: numpy.ndarray
+        快照数据集的内存映射数组，参见map_snapshot
+
+    Notes
+    -----
+    请求全部代码时，返回的结果直接引用映射的内存而不复制，因此结果中的数据为只读，若需要修改，需要先调用copy
+    '''
+    def __init__(self, params, data):
+        self._data = data
+        super().__init__(params, get_snapshot_path(params.absolute_path))
+
+    def _query_row(self, row_idx):
+        '''
+        从快照中读取给定行的横截面数据，参见Reader._query_row
+        '''
+        symbols = self._params.symbols
+        name = self.time_index.data[row_idx]
+        row = self._data[row_idx]
+        if symbols is None:
+            return pd.Series(row, index=self.symbols.data, name=name)
+        positions = self.symbols.data.get_indexer(symbols)
+        positions = np.unique(positions[positions >= 0])
+        out = pd.Series(row[positions], index=self.symbols.data[positions], name=name)
+        return out.reindex(symbols)
+
+    def _query_range(self, start_idx, end_idx):
+        '''
+        从快照中读取给定行区间的数据，参见Reader._query_range
+        '''
+        date_index = self.time_index.data[start_idx: end_idx]
+        category = self.properties['data category']
+        if category == DataFormatCategory.PANEL:
+            symbols = self._params.symbols
+            if symbols is None:
+                return pd.DataFrame(self._data[start_idx: end_idx], index=date_index,
+                                    columns=self.symbols.data, copy=False)
+            positions = self.symbols.data.get_indexer(symbols)
+            positions = np.unique(positions[positions >= 0])
+            out = pd.DataFrame(self._data[start_idx: end_idx, positions], index=date_index,
+                               columns=self.symbols.data[positions])
+            return out.reindex(columns=symbols)
+        elif category == DataFormatCategory.TIME_SERIES:
+            return pd.Series(self._data[start_idx: end_idx], index=date_index)
+        else:
+            raise NotImplementedError
+
+
 class Writer(object):
     '''
     写入类，负责向文件中写入数据
@@ -627,25 +1083,33 @@ class Writer(object):
         if not exists(directory_path):
             makedirs(directory_path)
 
-    def _create_datafile(self, col_size=DB_CONFIG['initial_col_size']):
+    def _create_datafile(self, col_size=None):
         '''
         当数据文件不存在时，调用创建并初始化文件
 
         Parameter
         ---------
-        col_size: int
-            初始的列数，仅对面板数据(DataFormatCategory.PANEL)有效，默认值为配置文件的initial_col_size确定
+        col_size: int, default None
+            初始的列数，仅对面板数据(DataFormatCategory.PANEL)有效，None表示使用配置文件的initial_col_size
+
+        Notes
+        -----
+        数据集的分块和压缩方式由参数中的storage_opts与配置文件共同决定，参见parse_storage_opts
         '''
         params = self._params
         if str(params.dtype)[0].lower() not in DB_CONFIG['valid_type_header']:
             raise InvalidInputTypeError('Unsupported data type')
+        storage_opts = parse_storage_opts(params.storage_opts)
+        if col_size is None:
+            col_size = DB_CONFIG['initial_col_size']
 
         # 文件初始化
         self._mk_dirs()
         with h5py.File(params.absolute_path, 'w-') as store:
             # 时间数据初始化
-            store.create_dataset('time', shape=(1, ), maxshape=(None, ),
-                                 dtype=DB_CONFIG['date_dtype'])
+            store.attrs['format version'] = FORMAT_VERSION
+            store.create_dataset('time', shape=(1, ), maxshape=(None, ), dtype='int64',
+                                 chunks=(AXIS_CHUNK_SIZE, ))
             store['time'].attrs['length'] = 0
             store['time'].attrs['latest_data_time'] = NaS
             store['time'].attrs['start_time'] = NaS
@@ -654,17 +1118,19 @@ class Writer(object):
             store.attrs['data category'] = params.store_fmt[2].name
             if params.store_fmt[2] == DataFormatCategory.PANEL:   # 面板数据初始化
                 store.create_dataset('symbol', shape=(1, ), maxshape=(None, ),
-                                     dtype=DB_CONFIG['symbol_dtype'])
+                                     dtype=DB_CONFIG['symbol_dtype'], chunks=(AXIS_CHUNK_SIZE, ))
+                # 列方向不设上限，新增代码时直接在原文件上扩展列容量，参见Writer._resize_columns
                 store.create_dataset('data', shape=(1, col_size),
-                                     maxshape=(None, col_size), chunks=(1, col_size),
-                                     dtype=params.dtype)
+                                     maxshape=(None, None), dtype=params.dtype,
+                                     fillvalue=_get_fillvalue(params.dtype),
+                                     **get_dataset_layout(storage_opts, col_size))
                 store.attrs['column size'] = col_size
                 store['symbol'].attrs['length'] = 0
                 store['data'].attrs['dtype'] = str(params.dtype)
                 store['data'][...] = np.nan
             else:
                 store.create_dataset('data', shape=(1, ), maxshape=(None, ),
-                                     dtype=params.dtype)
+                                     dtype=params.dtype, **get_dataset_layout(storage_opts))
                 store.attrs['column size'] = 1
                 store['data'].attrs['dtype'] = str(params.dtype)
                 store['data'][...] = np.nan
@@ -729,15 +1195,14 @@ class Writer(object):
         data_arr, data_index, _ = data.decompose2dataset()
         start_index = reader.properties['time']['length']
         end_index = start_index + len(data)
-        with h5py.File(params.absolute_path, 'r+') as store:
+        with FILE_POOL.open(params.absolute_path, 'r+') as store:
             data_dset = store['data']
             time_dset = store['time']
             data_dset.resize((end_index,))
             data_dset[start_index: end_index] = data_arr
 
             time_dset.resize((end_index, ))
-            time_dset[start_index: end_index] = data_index.to_bytes(DB_CONFIG['date_dtype'],
-                                                                    DB_CONFIG['db_time_format'])
+            time_dset[start_index: end_index] = data_index.to_dataset_format(time_dset)
             # 更新元数据
             new_properties = {'time': {'length': end_index,
                                        'latest_data_time': data.end_time,
@@ -771,10 +1236,10 @@ class Writer(object):
         reader = self._reader
         reader_properties = reader.properties
         if len(data.symbol_index) > reader_properties['column size']:
-            import warnings
-            warnings.warn('Data column needs to be resized!', RuntimeWarning)
             target_colsize = self._get_target_size(len(data.symbol_index))
-            return self._reshape_insertdf(target_colsize, data)
+            self._resize_columns(target_colsize)
+            reader = self._reader
+            reader_properties = reader.properties
         if reader_properties['filled status'] == FilledStatus.FILLED: # 非第一次更新
             data.rearrange_symbol(reader.symbols.data.tolist()) # 对代码轴重新排列
             # 对数据进行切割
@@ -785,7 +1250,7 @@ class Writer(object):
         data_arr, data_index, data_symbol = data.decompose2dataset()
         start_index = reader_properties['time']['length']
         end_index = start_index + len(data)
-        with h5py.File(params.absolute_path, 'r+') as store:
+        with FILE_POOL.open(params.absolute_path, 'r+') as store:
             data_dset = store['data']
             time_dset = store['time']
             symbol_dset = store['symbol']
@@ -798,8 +1263,7 @@ class Writer(object):
             data_dset[start_index: end_index, :] = np.nan
             data_dset[start_index: end_index, :len(data.symbol_index)] = data_arr
             # 时间数据
-            time_dset[start_index: end_index] = data_index.to_bytes(DB_CONFIG['date_dtype'],
-                                                                    DB_CONFIG['db_time_format'])
+            time_dset[start_index: end_index] = data_index.to_dataset_format(time_dset)
             # 股票代码数据
             symbol_dset[...] = data_symbol.to_bytes(DB_CONFIG['symbol_dtype'])
             # 更新元数据
@@ -836,32 +1300,42 @@ class Writer(object):
             target_size += DB_CONFIG['col_size_increase_step']
         return target_size
 
-    def _reshape_insertdf(self, target_colsize, data):
+    def _resize_columns(self, target_colsize):
         '''
-        插入的数据列数超过了文件可容纳的列容量，需要对数据文件重新设置，然后将数据插入到文件中，
-        保持数据顺序等属性与原数据库中的数据一致
+        插入的数据列数超过了文件可容纳的列容量，在原文件上扩展数据集的列容量，已有的数据保持不变，
+        新增的列用NaN填充
 
         Parameter
         ---------
         target_colsize: int
             目标列数
-        data: Data
-            需要插入的数据
 
-        Return
-        ------
-        result: boolean
-            是否成功插入数据
-        '''
-        if self._reader.properties['filled status'] == FilledStatus.FILLED:
-            db_data = self._reader.query_all()
-            if db_data is not None:
-                db_data = Data.init_from_pd(db_data)
-                data.update(db_data)
-        remove(self._params.absolute_path)
-        self._create_datafile(target_colsize)
+        Notes
+        -----
+        旧版本创建的数据文件列方向的最大容量是固定的，无法直接扩展，此时先调用
+        database.hdf5Engine.tools.repack按照原文件的存储布局将数据写入新文件(写入完成后才替换原文件)，
+        重写后的文件即可直接扩展
+        '''
+        path = self._params.absolute_path
+        with FILE_POOL.open(path, 'r') as store:
+            growable = store['data'].maxshape[1] is None
+            storage_opts = get_storage_opts(store['data'])
+        if not growable:
+            from database.hdf5Engine.tools import repack
+            repack(path, storage_opts, target_colsize)
+        else:
+            with FILE_POOL.open(path, 'r+') as store:
+                data_dset = store['data']
+                old_colsize = data_dset.shape[1]
+                data_dset.resize(target_colsize, axis=1)
+                fillvalue = data_dset.fillvalue
+                if data_dset.dtype.kind == 'f' and not np.isnan(fillvalue):
+                    # 旧文件没有设置NaN为默认填充值，需要手动填充新增的列
+                    data_dset[:, old_colsize:] = np.nan
+                store.attrs['column size'] = target_colsize
+        logger.info('[Operation=Writer._resize_columns, Info=\"Resize column size(path={p}, target={t}, in place={i}).\"]'.
+                    format(p=path, t=target_colsize, i=growable))
         self._update_reader()
-        return self._insert_df(data.data)
 
     def _update_reader(self):
         '''
@@ -903,7 +1377,13 @@ class HDF5Engine(DBEngine):
     insert: 类方法，依据给定的参数，向数据文件中插入数据
     remove_data: 类方法，将数据库中给定的数据删除
     move_to: 类方法，将给定的数据移动到其他给定的位置
+    create_snapshot: 类方法，为给定的数据创建快照文件
+
+    数据文件的读模式句柄由FILE_POOL管理，可以在多个线程中同时请求数据；若数据存在最新的快照文件，
+    且配置中启用了snapshot_read，则直接从快照的内存映射中读取数据
     '''
+    concurrent_query = True
+
     def __init__(self, params):
         self._params = params
         self._parse_path()
@@ -918,7 +1398,8 @@ class HDF5Engine(DBEngine):
         Parameter
         ---------
         params: database.db.ParamsParser
-            其中，若end_time属性为None时，表示请求横截面数据，仅对面板类型数据有效
+            其中，若end_time属性为None时，表示请求横截面数据，仅对面板类型数据有效；若symbols属性不为None，
+            则仅读取给定代码的数据，结果按照给定代码的顺序排列，数据文件中不存在的代码对应的数据为NaN
 
         Return
         ------
@@ -937,7 +1418,7 @@ class HDF5Engine(DBEngine):
         ---------
         data: pandas.DataFrame or pandas.Series
         params: database.db.ParamsParser
-            相关参数设置
+            相关参数设置，其中storage_opts属性用于设置新建数据文件的分块和压缩方式，对已经存在的数据文件无效
 
         Return
         ------
@@ -962,6 +1443,8 @@ class HDF5Engine(DBEngine):
         '''
         try:
             obj = cls(params)
+            discard_snapshot(obj._params.absolute_path)
+            FILE_POOL.discard(obj._params.absolute_path)
             remove(obj._params.absolute_path)
         except Exception as e:
             logger.exception(e)
@@ -989,6 +1472,8 @@ class HDF5Engine(DBEngine):
         try:
             if not exists(dirname(dest_obj._params.absolute_path)):
                 makedirs(dirname(dest_obj._params.absolute_path))
+            discard_snapshot(src_obj._params.absolute_path)
+            FILE_POOL.discard(src_obj._params.absolute_path)
             move(src_obj._params.absolute_path, dest_obj._params.absolute_path)
         except Exception as e:
             logger.exception(e)
@@ -996,10 +1481,33 @@ class HDF5Engine(DBEngine):
         return True
 
 
+    @classmethod
+    def create_snapshot(cls, params):
+        '''
+        为给定的数据创建快照文件，参见database.hdf5Engine.tools.create_snapshot
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        result: boolean
+            是否创建了快照文件，数据文件中没有数据时不创建
+        '''
+        from database.hdf5Engine.tools import create_snapshot
+        obj = cls(params)
+        return create_snapshot(obj._params.absolute_path)
+
     def _load_reader(self):
         '''
-        加载Reader对象
+        加载Reader对象，若存在最新的快照文件，则加载SnapshotReader对象
         '''
+        if DB_CONFIG['snapshot_read']:
+            data = map_snapshot(self._params.absolute_path)
+            if data is not None:
+                self._reader = SnapshotReader(self._params, data)
+                return
         self._reader = Reader(self._params)
 
     def _load_writer(self):
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/3
+
+进程级的h5py文件句柄池，避免每次请求或者写入数据时重复打开文件和解析HDF5元数据
+"""
+import atexit
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from os import stat
+from os.path import abspath
+
+import h5py
+
+from database.hdf5Engine.const import LOGGER_NAME, DB_CONFIG
+
+# 获取当前日志句柄
+logger = logging.getLogger(LOGGER_NAME)
+
+# h5py 3.5及以上版本支持在打开文件时关闭HDF5自带的文件锁
+_SUPPORT_LOCKING_PARAM = tuple(h5py.version.version_tuple[:2]) >= (3, 5)
+
+
+class FilePool(object):
+    '''
+    文件句柄池，按照绝对路径缓存打开的h5py.File对象，超过最大数量时关闭最久未使用的句柄(LRU)
+
+    句柄的使用方式如下:
+    >>> with FILE_POOL.open(path, 'r') as store:
+    ...     data = store['data'][:]
+    open: 获取给定路径的文件句柄，句柄在使用期间不会被其他线程关闭
+    discard: 关闭并移除给定路径的句柄，若句柄正在被其他线程使用，则等待使用结束，数据文件被删除或者移动前必须调用
+    clear: 关闭所有的句柄
+    set_max_size: 修改池中最多可以打开的文件数量
+
+    Parameter
+    ---------
+    max_size: int
+        最多可以同时打开的文件数量
+
+    Notes
+    -----
+    1. 读模式('r')的句柄会一直缓存在池中，且关闭了HDF5的文件锁，避免长期持有的句柄阻塞其他进程的写入；
+    每次获取句柄时会检查文件的修改时间和大小，若文件被其他进程修改过，则重新打开
+    2. 写模式('r+')的句柄会替换池中同一文件的读模式句柄(HDF5不允许同一进程以不同模式打开同一文件)，
+    并在写入结束后刷新并关闭，避免长期持有写锁，写入期间持有池锁
+    3. 同一线程在使用某个文件的读模式句柄期间，不能再以写模式打开该文件或者调用discard，否则会导致死锁
+    '''
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._files = OrderedDict()    # {abs_path: (store, file_signature)}
+        self._lock = threading.RLock()
+        self._released = threading.Condition(self._lock)
+        self._users = defaultdict(int)    # {abs_path: 正在使用该句柄的次数}
+
+    @staticmethod
+    def _signature(path):
+        '''
+        获取文件的状态标识，用于判断文件在句柄打开后是否被修改
+
+        Parameter
+        ---------
+        path: string
+
+        Return
+        ------
+        out: tuple
+            (修改时间, 文件大小)
+        '''
+        st = stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def open(self, path, mode='r'):
+        '''
+        获取给定路径文件的句柄，仅支持'r'和'r+'两种模式
+
+        Parameter
+        ---------
+        path: string
+            文件路径
+        mode: string, default 'r'
+            文件打开模式
+
+        Return
+        ------
+        store: h5py.File
+
+        Notes
+        -----
+        文件不存在时会引发OSError(FileNotFoundError)
+        '''
+        if mode not in ('r', 'r+'):
+            raise ValueError('Unsupported file mode({}), valids are [r, r+]!'.format(mode))
+        path = abspath(path)
+        if mode == 'r':
+            # 读模式的句柄可以被多个线程同时使用，仅在获取和归还句柄时持有池锁
+            with self._lock:
+                store = self._get_reader(path)
+                self._users[path] += 1
+                self._evict()
+            try:
+                yield store
+            finally:
+                with self._lock:
+                    self._users[path] -= 1
+                    if self._users[path] == 0:
+                        del self._users[path]
+                    self._released.notify_all()
+        else:
+            with self._lock:
+                self.discard(path)    # 升级为写模式前需要关闭读模式的句柄
+                store = h5py.File(path, 'r+')
+                try:
+                    yield store
+                finally:
+                    store.close()
+
+    def _get_reader(self, path):
+        '''
+        从池中获取读模式的句柄，若不存在或者文件已经被修改，则重新打开
+
+        Parameter
+        ---------
+        path: string
+            文件绝对路径
+
+        Return
+        ------
+        store: h5py.File
+        '''
+        item = self._files.get(path, None)
+        signature = self._signature(path)
+        if item is not None:
+            store, cached_signature = item
+            if store.id.valid and cached_signature == signature:
+                self._files.move_to_end(path)
+                return store
+            self.discard(path)
+        if _SUPPORT_LOCKING_PARAM:
+            store = h5py.File(path, 'r', locking=False)
+        else:
+            store = h5py.File(path, 'r')
+        self._files[path] = (store, signature)
+        return store
+
+    def _evict(self):
+        '''
+        关闭最久未使用的句柄，直至句柄数量满足最大数量的限制，正在使用的句柄会在使用结束后再关闭
+        '''
+        idle_paths = [p for p in self._files if p not in self._users]
+        for path in idle_paths[:max(len(self._files) - self._max_size, 0)]:
+            store, _ = self._files.pop(path)
+            store.close()
+            logger.debug('[Operation=FilePool._evict, Info=\"Close file handle(path={}).\"]'.format(path))
+
+    def discard(self, path):
+        '''
+        关闭并从池中移除给定路径的句柄，若池中没有该路径的句柄，则不做任何操作
+
+        Parameter
+        ---------
+        path: string
+            文件路径
+        '''
+        path = abspath(path)
+        with self._lock:
+            self._released.wait_for(lambda: path not in self._users)
+            item = self._files.pop(path, None)
+            if item is not None:
+                item[0].close()
+
+    def clear(self):
+        '''
+        关闭池中所有的句柄
+        '''
+        with self._lock:
+            self._released.wait_for(lambda: not self._users)
+            while self._files:
+                _, (store, _) = self._files.popitem()
+                store.close()
+
+    def set_max_size(self, max_size):
+        '''
+        设置池中最多可以同时打开的文件数量
+
+        Parameter
+        ---------
+        max_size: int
+            必须为正整数
+        '''
+        if max_size < 1:
+            raise ValueError('Parameter \"max_size\" must be positive!')
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        return len(self._files)
+
+
+FILE_POOL = FilePool(DB_CONFIG['max_open_files'])
+atexit.register(FILE_POOL.clear)
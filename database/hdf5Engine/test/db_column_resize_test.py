@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/5
+
+面板数据列容量扩展测试，分别检查当前格式(原地扩展)和旧格式(列容量固定，先重写)的数据文件
+"""
+from tempfile import mkdtemp
+from os.path import join
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from database.hdf5Engine.dbcore import HDF5Engine
+from database.hdf5Engine.filepool import FILE_POOL
+from database.hdf5Engine.const import DB_CONFIG
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+DB_CONFIG['initial_col_size'] = 20
+DB_CONFIG['col_size_increase_step'] = 10
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+dates = pd.date_range('2010-01-01', periods=300, freq='B')
+sample_data = pd.DataFrame(np.random.rand(len(dates), 45), index=dates,
+                           columns=['{:06d}'.format(i) for i in range(45)])
+
+
+def resize_test(rel_path, make_legacy):
+    insert_params = {'rel_path': rel_path, 'store_fmt': store_fmt, 'dtype': 'float64'}
+    query_params = {'rel_path': rel_path, 'store_fmt': store_fmt,
+                    'start_time': dates[0], 'end_time': dates[-1]}
+    file_path = join(db_path, rel_path + '.h5')
+    HDF5Engine.insert(sample_data.iloc[:200, :15], ParamsParser.from_dict(db_path, insert_params))
+    if make_legacy:
+        # 改写为列容量固定的旧文件
+        FILE_POOL.discard(file_path)
+        with h5py.File(file_path, 'r+') as store:
+            values = store['data'][...]
+            attrs = dict(store['data'].attrs)
+            del store['data']
+            store.create_dataset('data', data=values, maxshape=(None, values.shape[1]))
+            store['data'].attrs.update(attrs)
+    HDF5Engine.insert(sample_data.iloc[150:], ParamsParser.from_dict(db_path, insert_params))
+    data = HDF5Engine.query(ParamsParser.from_dict(db_path, query_params))
+    expected = sample_data.copy()
+    expected.iloc[:200, 15:] = np.nan    # 已经存在的时间段的数据不会被更新
+    print(np.all(np.isclose(data.fillna(-1), expected.fillna(-1))))
+    with FILE_POOL.open(file_path, 'r') as store:
+        print(store['data'].maxshape == (None, None), store.attrs['column size'] == 50)
+
+
+if __name__ == '__main__':
+    resize_test('resize_test', False)
+    resize_test('legacy_resize_test', True)
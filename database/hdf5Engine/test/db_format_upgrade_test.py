@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/4
+
+数据文件格式升级测试，先将数据文件的时间轴改写为旧格式(字符串)，检查旧格式文件的读写以及升级后的读写
+"""
+from tempfile import mkdtemp
+from os.path import join, exists
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from database.hdf5Engine.dbcore import HDF5Engine
+from database.hdf5Engine.tools import upgrade_database
+from database.hdf5Engine.filepool import FILE_POOL
+from database.hdf5Engine.const import DB_CONFIG
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+dates = pd.date_range('2010-01-01', periods=300, freq='B')
+sample_data = pd.DataFrame(np.random.rand(len(dates), 50), index=dates,
+                           columns=['{:06d}'.format(i) for i in range(50)])
+insert_params = {'rel_path': 'format_test', 'store_fmt': store_fmt, 'dtype': 'float64'}
+query_params = {'rel_path': 'format_test', 'store_fmt': store_fmt,
+                'start_time': dates[0], 'end_time': dates[-1]}
+HDF5Engine.insert(sample_data.iloc[:200], ParamsParser.from_dict(db_path, insert_params))
+
+# 改写为旧格式
+FILE_POOL.discard(join(db_path, 'format_test.h5'))
+with h5py.File(join(db_path, 'format_test.h5'), 'r+') as store:
+    times = store['time'][...].view('M8[ns]')
+    attrs = dict(store['time'].attrs)
+    del store['time']
+    store.create_dataset('time', data=pd.DatetimeIndex(times).strftime('%Y%m%d').values.astype('S20'),
+                         maxshape=(None, ), dtype=DB_CONFIG['date_dtype'])
+    store['time'].attrs.update(attrs)
+    del store.attrs['format version']
+
+# 旧格式文件的读写
+HDF5Engine.insert(sample_data.iloc[150:250], ParamsParser.from_dict(db_path, insert_params))
+data = HDF5Engine.query(ParamsParser.from_dict(db_path, query_params))
+print(np.all(np.isclose(data, sample_data.iloc[:250])))
+
+# 升级后的读写，升级时通过临时文件重写，保持原有的存储布局
+with FILE_POOL.open(join(db_path, 'format_test.h5'), 'r') as store:
+    chunks = store['data'].chunks
+print(upgrade_database(db_path))
+with FILE_POOL.open(join(db_path, 'format_test.h5'), 'r') as store:
+    print(store['data'].chunks == chunks and store['time'].dtype == np.int64 and
+          store['time'].attrs['length'] == 250)
+print(not exists(join(db_path, 'format_test.h5.repack')))
+HDF5Engine.insert(sample_data.iloc[200:], ParamsParser.from_dict(db_path, insert_params))
+data = HDF5Engine.query(ParamsParser.from_dict(db_path, query_params))
+print(np.all(np.isclose(data, sample_data)) and np.all(data.index == sample_data.index))
+print(upgrade_database(db_path))
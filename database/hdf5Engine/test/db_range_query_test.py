@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/2
+
+区间请求测试，检查按行区间读取的结果与全量读取后筛选的结果一致
+"""
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from database.hdf5Engine.dbcore import HDF5Engine
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+dates = pd.date_range('2010-01-01', periods=500, freq='B')
+sample_data = pd.DataFrame(np.random.rand(len(dates), 100), index=dates,
+                           columns=['{:06d}'.format(i) for i in range(100)])
+HDF5Engine.insert(sample_data, ParamsParser.from_dict(db_path, {'rel_path': 'range_test',
+                                                                'store_fmt': store_fmt,
+                                                                'dtype': 'float64'}))
+
+for start_time, end_time in [('2010-03-01', '2010-04-01'), ('2000-01-01', '2030-01-01'),
+                             ('2010-01-01', '2010-01-01'), ('2011-05-07', '2011-05-08')]:
+    data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': 'range_test',
+                                                             'store_fmt': store_fmt,
+                                                             'start_time': start_time,
+                                                             'end_time': end_time}))
+    expected = sample_data.loc[start_time: end_time]
+    if len(expected) == 0:
+        print(data is None)
+    else:
+        print(np.all(data.index == expected.index) and np.all(np.isclose(data, expected)))
+
+# 横截面数据请求测试
+for date in [dates[0], dates[250], dates[-1], '2010-01-02', '2030-01-01']:
+    data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': 'range_test',
+                                                             'store_fmt': store_fmt,
+                                                             'start_time': date}))
+    if pd.to_datetime(date) not in sample_data.index:
+        print(data is None)
+    else:
+        expected = sample_data.loc[date]
+        print(data.name == expected.name and np.all(np.isclose(data, expected)))
+
+# 代码过滤请求测试
+symbols = ['000010', '000002', 'NOT_EXIST', '000003', '000099', '000050', '000051']
+expected = sample_data.reindex(columns=symbols).loc['2010-03-01': '2010-06-01']
+data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': 'range_test',
+                                                         'store_fmt': store_fmt,
+                                                         'start_time': '2010-03-01',
+                                                         'end_time': '2010-06-01',
+                                                         'symbols': symbols}))
+print(data.columns.tolist() == symbols and np.all(np.isclose(data.fillna(-1), expected.fillna(-1))))
+data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': 'range_test',
+                                                         'store_fmt': store_fmt,
+                                                         'start_time': dates[100],
+                                                         'symbols': symbols}))
+expected = sample_data.reindex(columns=symbols).loc[dates[100]]
+print(data.index.tolist() == symbols and np.all(np.isclose(data.fillna(-1), expected.fillna(-1))))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/10
+
+快照读取测试，检查从快照内存映射读取的结果与从数据文件读取的结果一致，且结果不复制映射的内存
+"""
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from database.hdf5Engine.dbcore import HDF5Engine, SnapshotReader, map_snapshot
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+db_path = mkdtemp()
+panel_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+ts_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES)
+dates = pd.date_range('2010-01-01', periods=500, freq='B')
+sample_data = pd.DataFrame(np.random.rand(len(dates), 100), index=dates,
+                           columns=['{:06d}'.format(i) for i in range(100)])
+sample_series = sample_data.iloc[:, 0]
+
+
+def params(rel_path, store_fmt, **kwargs):
+    kwargs.update({'rel_path': rel_path, 'store_fmt': store_fmt, 'dtype': 'float64'})
+    return ParamsParser.from_dict(db_path, kwargs)
+
+
+HDF5Engine.insert(sample_data, params('snapshot_panel', panel_fmt))
+HDF5Engine.insert(sample_series, params('snapshot_ts', ts_fmt))
+print(HDF5Engine.create_snapshot(params('snapshot_panel', panel_fmt)),
+      HDF5Engine.create_snapshot(params('snapshot_ts', ts_fmt)))
+
+engine = HDF5Engine(params('snapshot_panel', panel_fmt, start_time='2010-03-01', end_time='2010-06-01'))
+engine._load_reader()
+print(isinstance(engine._reader, SnapshotReader))
+
+# 区间数据，结果直接引用映射的内存
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time='2010-03-01', end_time='2010-06-01'))
+expected = sample_data.loc['2010-03-01': '2010-06-01']
+print(data.equals(expected), np.shares_memory(data.values, map_snapshot(engine._params.absolute_path)))
+# 横截面数据和部分代码
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time='2010-03-01'))
+print(data.equals(sample_data.loc['2010-03-01']))
+symbols = ['000010', '000003', 'not_exist']
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time='2010-03-01', symbols=symbols))
+print(data.equals(sample_data.loc['2010-03-01'].reindex(symbols)))
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time='2010-03-01', end_time='2010-06-01',
+                               symbols=symbols))
+print(data.equals(expected.reindex(columns=symbols)))
+data = HDF5Engine.query(params('snapshot_ts', ts_fmt, start_time='2010-03-01', end_time='2010-06-01'))
+print(data.equals(sample_series.loc['2010-03-01': '2010-06-01']))
+
+# 插入新数据后快照失效，直接读取数据文件
+new_dates = pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=10, freq='B')
+new_data = pd.DataFrame(np.random.rand(10, 101), index=new_dates, columns=list(sample_data.columns) + ['000100'])
+HDF5Engine.insert(new_data, params('snapshot_panel', panel_fmt))
+engine._load_reader()
+print(not isinstance(engine._reader, SnapshotReader))
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time=new_dates[0], end_time=new_dates[-1]))
+print(data.equals(new_data))
+HDF5Engine.create_snapshot(params('snapshot_panel', panel_fmt))
+data = HDF5Engine.query(params('snapshot_panel', panel_fmt, start_time=new_dates[0], end_time=new_dates[-1]))
+print(data.equals(new_data))
+
+# 删除数据时同时删除快照
+print(HDF5Engine.remove_data(params('snapshot_panel', panel_fmt)),
+      map_snapshot(engine._params.absolute_path) is None)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/5
+
+不同存储布局(分块和压缩)下数据文件的大小以及读取速度的对比
+"""
+from tempfile import mkdtemp
+from os.path import join, getsize
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from database.hdf5Engine.dbcore import HDF5Engine
+from database.hdf5Engine.tools import repack
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+dates = pd.date_range('2008-01-01', periods=2500, freq='B')
+symbol_num = 3000
+# 模拟价格数据: 随机游走，保留两位小数，并随机设置缺失值
+prices = np.round(10 * np.exp(np.cumsum(np.random.normal(0, 0.02, (len(dates), symbol_num)), axis=0)), 2)
+prices[np.random.rand(*prices.shape) < 0.1] = np.nan
+sample_data = pd.DataFrame(prices, index=dates, columns=['{:06d}'.format(i) for i in range(symbol_num)])
+
+layouts = {'row_chunk': {'chunk_row_size': 1},
+           'block_chunk': {'chunk_row_size': 64},
+           'block_chunk_gzip': {'chunk_row_size': 64, 'compression': 'gzip', 'shuffle': True},
+           'block_chunk_lzf': {'chunk_row_size': 64, 'compression': 'lzf', 'shuffle': True}}
+
+HDF5Engine.insert(sample_data, ParamsParser.from_dict(db_path, {'rel_path': 'origin',
+                                                                'store_fmt': store_fmt,
+                                                                'dtype': 'float64',
+                                                                'storage_opts': layouts['row_chunk']}))
+for name, opts in layouts.items():
+    stime = time()
+    HDF5Engine.insert(sample_data, ParamsParser.from_dict(db_path, {'rel_path': name,
+                                                                    'store_fmt': store_fmt,
+                                                                    'dtype': 'float64',
+                                                                    'storage_opts': opts}))
+    insert_time = time() - stime
+    stime = time()
+    data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': name,
+                                                             'store_fmt': store_fmt,
+                                                             'start_time': dates[0],
+                                                             'end_time': dates[-1]}))
+    range_time = time() - stime
+    stime = time()
+    for date in dates[::50]:
+        HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': name,
+                                                          'store_fmt': store_fmt,
+                                                          'start_time': date}))
+    cs_time = (time() - stime) / len(dates[::50])
+    print('{n}: size={s:.1f}MB, insert={it:.3f}s, range query={rt:.3f}s, cross section query={ct:.4f}s, same={eq}'.
+          format(n=name, s=getsize(join(db_path, name + '.h5')) / 2 ** 20, it=insert_time, rt=range_time,
+                 ct=cs_time, eq=np.all(np.isclose(data.fillna(0), sample_data.fillna(0)))))
+
+# 对已有的数据文件重新设置存储布局
+stime = time()
+repack(join(db_path, 'origin.h5'), layouts['block_chunk_gzip'])
+print('repack: {:.3f}s, size={:.1f}MB'.format(time() - stime, getsize(join(db_path, 'origin.h5')) / 2 ** 20))
+data = HDF5Engine.query(ParamsParser.from_dict(db_path, {'rel_path': 'origin',
+                                                         'store_fmt': store_fmt,
+                                                         'start_time': dates[0],
+                                                         'end_time': dates[-1]}))
+print(np.all(np.isclose(data.fillna(0), sample_data.fillna(0))))
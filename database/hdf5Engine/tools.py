@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/4
+
+HDF5数据文件维护工具
+upgrade_file_format: 将旧格式的数据文件升级为当前格式
+upgrade_database: 将给定文件夹下所有旧格式的数据文件升级为当前格式
+repack: 按照新的存储布局(分块、压缩)重写数据文件
+repack_database: 按照新的存储布局重写给定文件夹下所有的数据文件
+create_snapshot: 为数据文件创建连续存储的快照文件，用于内存映射读取
+snapshot_database: 为给定文件夹下所有的数据文件创建快照文件
+"""
+import logging
+from os import walk, remove, replace
+from os.path import join, exists
+
+import h5py
+import numpy as np
+
+from database.hdf5Engine.const import (LOGGER_NAME, SUFFIX, FORMAT_VERSION,
+                                       LEGACY_FORMAT_VERSION, AXIS_CHUNK_SIZE, DataFormatCategory)
+from database.hdf5Engine.dbcore import (TimeIndex, parse_storage_opts, get_storage_opts, get_dataset_layout,
+                                        _get_fillvalue, get_snapshot_path, file_signature)
+from database.hdf5Engine.filepool import FILE_POOL
+
+# 获取当前日志句柄
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def upgrade_file_format(file_path):
+    '''
+    将旧格式(时间轴以字符串形式存储)的数据文件升级为当前格式(时间轴以int64形式存储)，
+    升级通过repack完成(保持原有的存储布局)，升级过程中出错不会影响原文件
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的绝对路径
+
+    Return
+    ------
+    result: boolean
+        若文件被升级，返回True，若文件已经是当前格式，返回False
+    '''
+    FILE_POOL.discard(file_path)
+    with h5py.File(file_path, 'r') as store:
+        if store.attrs.get('format version', LEGACY_FORMAT_VERSION) >= FORMAT_VERSION:
+            return False
+        storage_opts = get_storage_opts(store['data'])
+    repack(file_path, storage_opts)
+    logger.info('[Operation=upgrade_file_format, Info=\"Upgrade data file(path={p}) to format version {v}.\"]'.
+                format(p=file_path, v=FORMAT_VERSION))
+    return True
+
+
+def _list_datafiles(db_path):
+    '''
+    列出给定文件夹下所有的数据文件
+
+    Parameter
+    ---------
+    db_path: string
+        文件夹的绝对路径
+
+    Return
+    ------
+    out: list
+        数据文件的绝对路径
+    '''
+    out = []
+    for dir_path, _, file_names in walk(db_path):
+        out.extend(join(dir_path, fn) for fn in file_names if fn.endswith(SUFFIX))
+    return sorted(out)
+
+
+def upgrade_database(db_path):
+    '''
+    将给定文件夹(通常为数据库的主文件夹)下所有的旧格式数据文件升级为当前格式
+
+    Parameter
+    ---------
+    db_path: string
+        文件夹的绝对路径
+
+    Return
+    ------
+    out: list
+        被升级的数据文件的路径
+    '''
+    return [fp for fp in _list_datafiles(db_path) if upgrade_file_format(fp)]
+
+
+def repack(file_path, storage_opts=None, col_size=None):
+    '''
+    按照给定的存储布局将数据文件重写，重写过程中先将数据写入到临时文件中，完成后再替换原文件，
+    旧格式的数据文件在重写后会升级为当前格式，面板数据的列容量在重写后可以直接扩展
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的绝对路径
+    storage_opts: dict, default None
+        新的存储布局选项，未设置的选项使用配置文件中的默认值，参见database.hdf5Engine.dbcore.parse_storage_opts
+    col_size: int, default None
+        新的列容量(仅对面板数据有效)，None表示与原文件相同，不能小于已经存储的代码数量
+    '''
+    storage_opts = parse_storage_opts(storage_opts)
+    tmp_path = file_path + '.repack'
+    FILE_POOL.discard(file_path)
+    try:
+        with h5py.File(file_path, 'r') as src, h5py.File(tmp_path, 'w') as dest:
+            for k, v in src.attrs.items():
+                dest.attrs[k] = v
+            dest.attrs['format version'] = FORMAT_VERSION
+            # 时间数据
+            src_time = src['time']
+            length = src_time.attrs['length']
+            dest.create_dataset('time', shape=(max(length, 1), ), maxshape=(None, ), dtype='int64',
+                                chunks=(AXIS_CHUNK_SIZE, ))
+            if length > 0:
+                dest['time'][:length] = TimeIndex.init_from_dataset(src_time).to_int64()
+            for k, v in src_time.attrs.items():
+                dest['time'].attrs[k] = v
+            # 主数据
+            src_data = src['data']
+            dtype = src_data.dtype
+            fillvalue = _get_fillvalue(dtype)
+            if DataFormatCategory[src.attrs['data category']] == DataFormatCategory.PANEL:
+                src_symbol = src['symbol']
+                symbol_length = src_symbol.attrs['length']
+                dest.create_dataset('symbol', data=src_symbol[...], maxshape=(None, ),
+                                    chunks=(AXIS_CHUNK_SIZE, ))
+                for k, v in src_symbol.attrs.items():
+                    dest['symbol'].attrs[k] = v
+                if col_size is None:
+                    col_size = src.attrs['column size']
+                if col_size < symbol_length:
+                    raise ValueError('Parameter \"col_size\"({c}) is less than the symbol length({s})!'.
+                                     format(c=col_size, s=symbol_length))
+                dest.create_dataset('data', shape=(max(length, 1), col_size), maxshape=(None, None),
+                                    dtype=dtype, fillvalue=fillvalue,
+                                    **get_dataset_layout(storage_opts, col_size))
+                dest.attrs['column size'] = col_size
+                # 按行分块复制，避免一次性加载全部数据
+                block_size = max(1, (64 * 2 ** 20) // (max(symbol_length, 1) * dtype.itemsize))
+                for start_idx in range(0, length, block_size):
+                    end_idx = min(start_idx + block_size, length)
+                    dest['data'][start_idx: end_idx, :symbol_length] = src_data[start_idx: end_idx, :symbol_length]
+            else:
+                dest.create_dataset('data', shape=(max(length, 1), ), maxshape=(None, ), dtype=dtype,
+                                    fillvalue=fillvalue, **get_dataset_layout(storage_opts))
+                if length > 0:
+                    dest['data'][:length] = src_data[:length]
+            for k, v in src_data.attrs.items():
+                dest['data'].attrs[k] = v
+        replace(tmp_path, file_path)
+    except Exception:
+        if exists(tmp_path):
+            remove(tmp_path)
+        raise
+    logger.info('[Operation=repack, Info=\"Repack data file(path={p}, storage_opts={o}).\"]'.
+                format(p=file_path, o=storage_opts))
+
+
+def repack_database(db_path, storage_opts=None):
+    '''
+    按照给定的存储布局将给定文件夹下所有的数据文件重写
+
+    Parameter
+    ---------
+    db_path: string
+        文件夹的绝对路径
+    storage_opts: dict, default None
+        新的存储布局选项，参见repack
+
+    Return
+    ------
+    out: list
+        被重写的数据文件的路径
+    '''
+    out = _list_datafiles(db_path)
+    for fp in out:
+        repack(fp, storage_opts)
+    return out
+
+
+def create_snapshot(file_path):
+    '''
+    为数据文件创建快照文件，快照中仅包含已经存储的数据(去除了预留的列)，数据集连续存储且不压缩，
+    可以直接进行内存映射，快照文件先写入临时文件，完成后再替换原有的快照文件
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的绝对路径
+
+    Return
+    ------
+    result: boolean
+        是否创建了快照文件，数据文件中没有数据时不创建
+
+    Notes
+    -----
+    快照中记录了创建时数据文件的状态标识(修改时间和文件大小)，数据文件在此之后被修改(例如插入了新的数据)，
+    快照即失效，请求时会直接读取数据文件，需要重新调用本函数更新快照
+    Windows系统下，正在被映射的快照文件不能被替换，需要在相关进程释放请求结果后再更新快照
+    '''
+    snapshot_path = get_snapshot_path(file_path)
+    tmp_path = snapshot_path + '.tmp'
+    signature = file_signature(file_path)
+    with FILE_POOL.open(file_path, 'r') as src:
+        src_time = src['time']
+        length = src_time.attrs['length']
+        if length == 0:
+            return False
+        try:
+            with h5py.File(tmp_path, 'w') as dest:
+                for k, v in src.attrs.items():
+                    dest.attrs[k] = v
+                dest.attrs['format version'] = FORMAT_VERSION
+                dest.attrs['source signature'] = np.array(signature, dtype='int64')
+                dest.create_dataset('time', data=TimeIndex.init_from_dataset(src_time).to_int64())
+                for k, v in src_time.attrs.items():
+                    dest['time'].attrs[k] = v
+                src_data = src['data']
+                if DataFormatCategory[src.attrs['data category']] == DataFormatCategory.PANEL:
+                    src_symbol = src['symbol']
+                    symbol_length = src_symbol.attrs['length']
+                    dest.create_dataset('symbol', data=src_symbol[...])
+                    for k, v in src_symbol.attrs.items():
+                        dest['symbol'].attrs[k] = v
+                    dest.attrs['column size'] = symbol_length
+                    dest_data = dest.create_dataset('data', shape=(length, symbol_length), dtype=src_data.dtype)
+                    block_size = max(1, (64 * 2 ** 20) // (max(symbol_length, 1) * src_data.dtype.itemsize))
+                    for start_idx in range(0, length, block_size):
+                        end_idx = min(start_idx + block_size, length)
+                        dest_data[start_idx: end_idx] = src_data[start_idx: end_idx, :symbol_length]
+                else:
+                    dest_data = dest.create_dataset('data', data=src_data[:length])
+                for k, v in src_data.attrs.items():
+                    dest_data.attrs[k] = v
+            FILE_POOL.discard(snapshot_path)
+            replace(tmp_path, snapshot_path)
+        except Exception:
+            if exists(tmp_path):
+                remove(tmp_path)
+            raise
+    logger.info('[Operation=create_snapshot, Info=\"Create snapshot(path={}).\"]'.format(snapshot_path))
+    return True
+
+
+def snapshot_database(db_path):
+    '''
+    为给定文件夹下所有的数据文件创建快照文件
+
+    Parameter
+    ---------
+    db_path: string
+        文件夹的绝对路径
+
+    Return
+    ------
+    out: list
+        创建了快照的数据文件的路径
+    '''
+    return [fp for fp in _list_datafiles(db_path) if create_snapshot(fp)]
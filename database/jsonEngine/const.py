@@ -15,6 +15,9 @@ LOGGER_NAME = set_logger(DB_CONFIG['log'])
 # 文件后缀
 SUFFIX = '.json'
 
+# 追加数据日志文件后缀，每行为[date, data]，数据先追加到日志中，日志达到一定大小后合并到对应的数据文件
+LOG_SUFFIX = '.jsonl'
+
 # 元数据文件名称
 METADATA_FILENAME = 'metadata.json'
 
@@ -5,20 +5,21 @@ JSON存储引擎核心实现部分
 import logging
 import json
 from copy import deepcopy
-from functools import reduce
-from os import sep, makedirs
-from os.path import join, exists
+from os import sep, makedirs, remove, listdir
+from os.path import join, exists, getsize
 from shutil import move, rmtree
 
+import numpy as np
 import pandas as pd
 
-from database.utils import DBEngine
+from database.utils import DBEngine, dump_json_atomically
 from database.jsonEngine.const import (LOGGER_NAME,
                                        DB_CONFIG,
                                        DataFormatCategory,
                                        FilledStatus,
                                        NaS,
                                        SUFFIX,
+                                       LOG_SUFFIX,
                                        METADATA_FILENAME,
                                        ENCODING,
                                        REL_PATH_SEP)
@@ -117,6 +118,175 @@ def date2filenamelist(start_time, end_time):
 
 
 
+def load_jsondata(json_data, symbols=None, has_null=True):
+    '''
+    将从数据文件中读取的JSON数据转换为pandas对象
+
+    Parameter
+    ---------
+    json_data: dict
+        面板数据的格式为{date: ['sample1', 'sample2', ...]}，时间序列数据的格式为{date: 'sample1', ...}
+    symbols: list, default None
+        面板数据的代码，None表示时间序列数据
+    has_null: boolean, default True
+        数据中是否可能包含缺失值(null或者NaN)，若确定不包含缺失值，可以设置为False以跳过缺失值的替换
+
+    Return
+    ------
+    out: pandas.DataFrame or pandas.Series
+        index为时间，按照文件中的顺序排列
+
+    Notes
+    -----
+    面板数据中的每一行数据按照位置与symbols对应，之前写入的文件中的行长度可能小于当前的代码数量(之后新增了代码)，
+    多余的位置以及缺失值都使用NaS填充
+    '''
+    index = pd.to_datetime(list(json_data.keys()), format=DB_CONFIG['db_time_format'])
+    if symbols is None:  # TIME SERIES数据
+        return pd.Series(list(json_data.values()), index=index)
+    rows = list(json_data.values())
+    values = np.empty((len(rows), len(symbols)), dtype=object)
+    if rows:
+        # 按照行长度分组，同一组的数据一次性写入二维数组
+        row_lengths = np.fromiter((len(r) for r in rows), dtype='int64', count=len(rows))
+        row_lengths = np.minimum(row_lengths, len(symbols))
+        for length in np.unique(row_lengths):
+            row_idx = np.flatnonzero(row_lengths == length)
+            if length > 0:
+                values[row_idx, :length] = [rows[i][:length] for i in row_idx]
+            if length < len(symbols):
+                values[row_idx, length:] = NaS
+        if has_null:
+            values[pd.isnull(values)] = NaS
+    return pd.DataFrame(values, index=index, columns=symbols, dtype=object)
+
+
+def _has_null(text):
+    '''
+    通过文本预先判断JSON数据中是否可能有缺失值，没有缺失值的数据不需要逐个元素检查
+    '''
+    return 'null' in text or 'NaN' in text
+
+
+def _parse_log(text, log_path):
+    '''
+    解析追加日志的文本，日志的每一行为[date, data]
+
+    Parameter
+    ---------
+    text: string
+        日志文件的文本
+    log_path: string
+        日志文件路径，仅用于记录日志
+
+    Return
+    ------
+    out: list
+        元素为[date, data]
+
+    Notes
+    -----
+    写入过程中断会导致日志中出现不完整的行，这些行会被忽略
+    '''
+    lines = [l for l in text.split('\n') if l]
+    try:
+        return json.loads('[' + ','.join(lines) + ']')
+    except ValueError:
+        out = []
+        for l in lines:
+            try:
+                out.append(json.loads(l))
+            except ValueError:
+                logger.warning('[Operation=_parse_log, Info=\"Ignore broken line in {}.\"]'.format(log_path))
+        return out
+
+
+def load_datafile(file_path):
+    '''
+    读取数据文件以及对应的追加日志中的数据
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的路径(包含后缀)，日志文件的路径由数据文件路径替换后缀得到
+
+    Return
+    ------
+    out: tuple or None
+        (json_data, has_null)，json_data格式与数据文件相同，has_null表示数据中是否可能有缺失值；
+        若数据文件以及日志文件都不存在，返回None
+    '''
+    log_path = file_path[:-len(SUFFIX)] + LOG_SUFFIX
+    if not exists(file_path) and not exists(log_path):
+        return None
+    json_data = {}
+    has_null = False
+    if exists(file_path):
+        with open(file_path, 'r', encoding=ENCODING) as f:
+            text = f.read()
+        has_null = _has_null(text)
+        json_data = json.loads(text)
+    if exists(log_path):
+        with open(log_path, 'r', encoding=ENCODING) as f:
+            text = f.read()
+        has_null = has_null or _has_null(text)
+        # 日志中的数据都在数据文件的数据之后，重复的日期以最后写入的为准
+        for date, row in _parse_log(text, log_path):
+            json_data[date] = row
+    return json_data, has_null
+
+
+def append_datafile(file_path, json_data):
+    '''
+    将数据追加到数据文件中，若数据文件不存在，直接写入数据文件，否则追加到日志文件中，
+    写入成本只与新增数据的数量有关，日志达到一定大小后与数据文件合并，参见compact_datafile
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的路径(包含后缀)
+    json_data: dict
+        需要追加的数据，格式与数据文件相同，要求所有数据的日期都在已有数据之后
+    '''
+    log_path = file_path[:-len(SUFFIX)] + LOG_SUFFIX
+    if not exists(file_path) and not exists(log_path):
+        dump_json_atomically(json_data, file_path)
+        return
+    with open(log_path, 'a+', encoding=ENCODING) as f:
+        if f.tell() > 0:     # 上次写入中断时，最后一行可能不完整，需要另起一行
+            f.seek(f.tell() - 1)
+            if f.read(1) != '\n':
+                f.write('\n')
+        f.write(''.join(json.dumps([date, json_data[date]]) + '\n' for date in sorted(json_data)))
+    base_size = getsize(file_path) if exists(file_path) else 0
+    if getsize(log_path) > max(DB_CONFIG['log_compaction_ratio'] * base_size, DB_CONFIG['log_compaction_min_size']):
+        compact_datafile(file_path)
+
+
+def compact_datafile(file_path):
+    '''
+    将日志文件中的数据合并到数据文件中，数据文件的写入为原子操作，合并完成后删除日志文件
+
+    Parameter
+    ---------
+    file_path: string
+        数据文件的路径(包含后缀)
+
+    Return
+    ------
+    result: boolean
+        若有日志被合并，返回True
+    '''
+    log_path = file_path[:-len(SUFFIX)] + LOG_SUFFIX
+    if not exists(log_path):
+        return False
+    json_data, _ = load_datafile(file_path)
+    dump_json_atomically(json_data, file_path)
+    remove(log_path)
+    logger.debug('[Operation=compact_datafile, Info=\"Compact log into {}.\"]'.format(file_path))
+    return True
+
+
 # -------------------------------------------------------------------------------------------------------------
 # 类
 
@@ -126,6 +296,7 @@ class DataWrapper(object):
     该类提供以下功能:
     init_from_pd: 从pandas对象对实例进行初始化
     init_from_files: 从文件对象对实例进行初始化
+    init_from_jsondata: 从JSON数据对实例进行初始化
     rearrange_symbol: 将本实例中的数据的代码顺序按照给定的顺序排列(仅支持面板数据)
     drop_before_date: 将给定日期前(包含该日期)的数据剔除
     update: 利用另一实例对该实例的数据进行更新
@@ -159,7 +330,10 @@ class DataWrapper(object):
             obj._data_category = DataFormatCategory.TIME_SERIES
         else:
             raise TypeError("Only pandas.DataFrame or pandas.Series is supported!")
-        obj._data = pd_data.sort_index(ascending=True)
+        if pd_data.index.is_monotonic_increasing:  # 已经排序的数据不需要再复制
+            obj._data = pd_data
+        else:
+            obj._data = pd_data.sort_index(ascending=True)
         return obj
 
     @classmethod
@@ -178,35 +352,46 @@ class DataWrapper(object):
         ------
         obj: DataWrapper
         '''
-        obj = cls()
+        json_datas = []
+        for fp in data_file_objs:
+            text = fp.read()
+            json_datas.append((json.loads(text), _has_null(text)))
+        return cls.init_from_jsondata(json_datas, meta_data)
+
+    @classmethod
+    def init_from_jsondata(cls, json_datas, meta_data):
+        '''
+        使用从数据文件中读取的JSON数据对实例进行初始化
 
-        def load_data(file_obj, symbols):
-            # 从数据文件中加载数据
-            # symbols非None时，data category必须为PANEL形式
-            tmp_data = json.load(file_obj)
-            if symbols is not None:  # PANEL数据
-                for t in tmp_data:
-                    tmp_data[t] = pd.Series(dict(zip(symbols, tmp_data[t])), index=symbols)
-                tmp_data = pd.DataFrame(tmp_data).T.fillna(NaS)
-            else:  # TIME SERIES数据
-                tmp_data = pd.Series(tmp_data)
-            tmp_data.index = pd.to_datetime(tmp_data.index)
-            return cls.init_from_pd(tmp_data)
+        Parameter
+        ---------
+        json_datas: iterable
+            元素为(json_data, has_null)，参见load_datafile
+        meta_data: dic
+            元数据字典
 
+        Return
+        ------
+        obj: DataWrapper
+        '''
         symbols = meta_data['symbols'] if meta_data['data category'] == DataFormatCategory.PANEL else None
-        data = [load_data(fp, symbols) for fp in data_file_objs]
-        # 依照数据开始时间顺序进行逆序排列，此处假设各个文件的数据重叠的范围很小(内部实现中，应该是没有重叠)
-        data = sorted(data, key=lambda x: x.start_time, reverse=True)
-
-        def reduce_op(x, y):
-            # 使用reduce对数据进行合成的函数
-            x.update(y)  # 将y的数据插入到x的start_time前
-            return x
-        if len(data) > 1:   # 至少有两个实例
-            out = reduce(reduce_op, data)
+        data = [load_jsondata(json_data, symbols, has_null) for json_data, has_null in json_datas]
+        data = [d if d.index.is_monotonic_increasing else d.sort_index() for d in data if len(d) > 0]
+        if not data:
+            raise ValueError('No data in the given files!')
+        # 按照数据开始时间顺序排列后一次性合成，若相邻的文件的数据有重叠(内部实现中，应该是没有重叠)，以开始时间较早的为准
+        data = sorted(data, key=lambda x: x.index[0])
+        if len(data) > 1:
+            last_end_time = data[0].index[-1]
+            for idx in range(1, len(data)):
+                if data[idx].index[0] <= last_end_time:
+                    data[idx] = data[idx].loc[data[idx].index > last_end_time]
+                if len(data[idx]) > 0:
+                    last_end_time = data[idx].index[-1]
+            data = pd.concat(data, axis=0, copy=False)
         else:
-            out = data[0]
-        return out
+            data = data[0]
+        return cls.init_from_pd(data)
 
     def drop_before_date(self, date):
         '''
@@ -342,6 +527,7 @@ class JSONEngine(DBEngine):
     insert: 类方法，依据给定的参数，向数据文件中插入数据
     remove_data: 类方法，将数据库中给定的数据删除
     move_to: 类方法，将给定的数据移动到其他给定的位置
+    compact: 类方法，将给定数据的所有追加日志合并到对应的数据文件中
 
     Parameter
     ---------
@@ -404,16 +590,10 @@ class JSONEngine(DBEngine):
             new_metadata['symbol length'] = len(data.symbol_index)
             new_metadata['symbols'] = data.symbol_index
         splited_data = data.split_data()
+        # 插入的数据都在已有数据之后，直接追加到对应的数据文件中
         for fn in sorted(splited_data.keys()):
             file_name = join(obj._params.absolute_path, fn + SUFFIX)
-            tmp_data = splited_data[fn]
-            if exists(file_name):   # 数据文件存在，则必然存在元数据文件
-                with open(file_name, 'r', encoding=ENCODING) as f:
-                    exist_data = DataWrapper.init_from_files([f], metadata)
-                    tmp_data.update(exist_data)
-            with open(file_name, 'w', encoding=ENCODING) as f:
-                tobe_dumped = tmp_data.to_jsonformat()
-                json.dump(tobe_dumped, f)
+            append_datafile(file_name, splited_data[fn].to_jsonformat())
         obj._update_metadata(new_metadata)
         return True
 
@@ -425,7 +605,8 @@ class JSONEngine(DBEngine):
         Parameter
         ---------
         params: database.db.ParamsParser
-            start_time属性必须为非空，若end_time属性为None，则视作查询时点数据(仅支持PANEL)，反之则为查询时间序列数据
+            start_time属性必须为非空，若end_time属性为None，则视作查询时点数据(仅支持PANEL)，反之则为查询时间序列数据；
+            若symbols属性不为None(仅支持PANEL)，则结果按照给定代码排列，不存在的代码对应的数据为NaS
 
         Return
         ------
@@ -438,18 +619,11 @@ class JSONEngine(DBEngine):
         metadata = obj._properties
         if metadata['data category'] == DataFormatCategory.TIME_SERIES and params.end_time is None: # 时间序列不能请求时点数据
             raise ValueError('Time series data cannot query PIT data!')
-        file_names = obj._parse_filenames()
-        opened_files = []
-        try:
-            for fn in obj._parse_filenames():
-                file_path = join(obj._params.absolute_path, fn + SUFFIX)
-                if not exists(file_path):
-                    continue
-                opened_files.append(open(file_path, 'r', encoding=ENCODING))
-            data = DataWrapper.init_from_files(opened_files, metadata)
-        finally:
-            for fobj in opened_files:
-                fobj.close()
+        json_datas = [load_datafile(join(obj._params.absolute_path, fn + SUFFIX)) for fn in obj._parse_filenames()]
+        json_datas = [d for d in json_datas if d is not None]
+        if not json_datas:    # 请求的时间区间内没有数据文件
+            return None
+        data = DataWrapper.init_from_jsondata(json_datas, metadata)
 
         pddata = data.data
         if params.end_time is None:
@@ -462,6 +636,11 @@ class JSONEngine(DBEngine):
             out = pddata.loc[mask]
             if len(out) == 0:
                 out = None
+        if out is not None and params.symbols is not None:
+            if params.end_time is None:
+                out = out.reindex(params.symbols).fillna(NaS)
+            else:
+                out = out.reindex(columns=params.symbols).fillna(NaS)
         return out
 
     @classmethod
@@ -499,6 +678,25 @@ class JSONEngine(DBEngine):
             return False
         return True
 
+    @classmethod
+    def compact(cls, params):
+        '''
+        将给定数据的所有追加日志合并到对应的数据文件中，日志在插入数据时会自动合并，该方法主要用于数据维护
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        out: list
+            被合并的数据文件名(不包含后缀)
+        '''
+        obj = cls(params)
+        file_names = sorted(fn[:-len(LOG_SUFFIX)] for fn in listdir(obj._params.absolute_path)
+                            if fn.endswith(LOG_SUFFIX))
+        return [fn for fn in file_names if compact_datafile(join(obj._params.absolute_path, fn + SUFFIX))]
+
     def _parse_filenames(self):
         '''
         将参数中给定的时间区间或者时间点解析为对应的文件名列表，仅用于请求数据的情况
@@ -524,8 +722,7 @@ class JSONEngine(DBEngine):
             格式如下，{'start time': st, 'end time': et, 'data category': dc, 'filled status': fs,
             'time length': tl, 'symbol length'(optional): sl, 'symbols'(optional): s}
         '''
-        with open(join(self._params.absolute_path, METADATA_FILENAME), 'w', encoding=ENCODING) as f:
-            json.dump(new_property, f)
+        dump_json_atomically(new_property, join(self._params.absolute_path, METADATA_FILENAME))
 
     @staticmethod
     def _trans_metadata(json_metadata):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/6
+
+JSON数据文件加载速度的对比，原实现逐行构造pandas.Series并通过reduce逐个文件合并，
+现实现一次性构造二维数组并通过一次concat合并，数据为10年 × 4000个代码的字符型面板数据
+"""
+import json
+from functools import reduce
+from glob import glob
+from os.path import join
+from tempfile import mkdtemp
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from database.jsonEngine.dbcore import JSONEngine, DataWrapper
+from database.jsonEngine.const import NaS, ENCODING, SUFFIX, METADATA_FILENAME
+from database.db import ParamsParser
+from database.const import DataClassification, DataValueCategory, DataFormatCategory
+
+db_path = mkdtemp()
+store_fmt = (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL)
+dates = pd.date_range('2008-01-01', periods=2500, freq='B')
+symbols = ['{:06d}'.format(i) for i in range(4000)]
+industries = np.array(['IND{:02d}'.format(i) for i in range(30)] + [NaS], dtype=object)
+sample_data = pd.DataFrame(np.random.choice(industries, (len(dates), len(symbols))),
+                           index=dates, columns=symbols)
+# 模拟新增代码: 前半段时间只有前3000个代码
+JSONEngine.insert(sample_data.iloc[:1250, :3000], ParamsParser.from_dict(db_path, {'rel_path': 'bench',
+                                                                                   'store_fmt': store_fmt}))
+JSONEngine.insert(sample_data.iloc[1250:], ParamsParser.from_dict(db_path, {'rel_path': 'bench',
+                                                                            'store_fmt': store_fmt}))
+# 将追加日志合并到数据文件中，保证两种实现读取的数据相同
+JSONEngine.compact(ParamsParser.from_dict(db_path, {'rel_path': 'bench', 'store_fmt': store_fmt}))
+expected = sample_data.copy()
+expected.iloc[:1250, 3000:] = NaS
+file_paths = sorted(fp for fp in glob(join(db_path, 'bench', '*' + SUFFIX)) if not fp.endswith(METADATA_FILENAME))
+with open(join(db_path, 'bench', METADATA_FILENAME), 'r', encoding=ENCODING) as f:
+    metadata = JSONEngine._trans_metadata(json.load(f))
+
+
+def legacy_load(file_paths, meta_data):
+    # 原实现
+    def load_data(file_obj, symbols):
+        tmp_data = json.load(file_obj)
+        for t in tmp_data:
+            tmp_data[t] = pd.Series(dict(zip(symbols, tmp_data[t])), index=symbols)
+        tmp_data = pd.DataFrame(tmp_data).T.fillna(NaS)
+        tmp_data.index = pd.to_datetime(tmp_data.index)
+        return DataWrapper.init_from_pd(tmp_data)
+
+    data = []
+    for fp in file_paths:
+        with open(fp, 'r', encoding=ENCODING) as f:
+            data.append(load_data(f, meta_data['symbols']))
+    data = sorted(data, key=lambda x: x.start_time, reverse=True)
+
+    def reduce_op(x, y):
+        x.update(y)
+        return x
+    return reduce(reduce_op, data)
+
+
+def current_load(file_paths, meta_data):
+    file_objs = [open(fp, 'r', encoding=ENCODING) for fp in file_paths]
+    try:
+        return DataWrapper.init_from_files(file_objs, meta_data)
+    finally:
+        for f in file_objs:
+            f.close()
+
+
+if __name__ == '__main__':
+    for name, func in [('legacy', legacy_load), ('current', current_load)]:
+        stime = time()
+        data = func(file_paths, metadata)
+        print('{n}: {t:.3f}s, result matches: {r}'.format(n=name, t=time() - stime,
+                                                        r=data.data.equals(expected)))
+    stime = time()
+    JSONEngine.query(ParamsParser.from_dict(db_path, {'rel_path': 'bench', 'store_fmt': store_fmt,
+                                                      'start_time': dates[0], 'end_time': dates[-1]}))
+    print('query: {:.3f}s'.format(time() - stime))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/12
+
+进程间的文件锁(建议锁)，用于多个进程同时读写同一数据库
+FileLock: 基于锁文件的共享/排他锁
+LockTimeoutError: 在给定时间内无法获取锁时引发的异常
+get_lock_stats: 获取当前进程中获取锁的等待时间统计
+reset_lock_stats: 清空等待时间统计
+
+Notes
+-----
+POSIX系统下使用fcntl.flock实现，锁与打开的文件描述相关联，因此同一进程中的不同线程之间同样互斥；
+Windows系统下使用msvcrt.locking实现，不支持共享锁，共享锁也按照排他锁处理；
+仅排他锁(写)会创建锁文件及其所在的文件夹，共享锁(读)以只读方式打开锁文件，锁文件不存在或者无法打开时
+(例如没有写入过的数据库或者只读的数据库)不加锁
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from os import makedirs, open as os_open, close as os_close, O_RDONLY, O_RDWR, O_CREAT
+from os.path import dirname, exists
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+from database.utils import set_db_logger
+
+# 获取当前日志句柄
+logger = logging.getLogger(set_db_logger())
+
+# 两次尝试获取锁之间的最长间隔(秒)
+_MAX_POLL_INTERVAL = 0.05
+
+# 获取锁的等待时间统计，格式为{lock_path: {'acquired': int, 'contended': int, 'timeouts': int,
+# 'total_wait': float, 'max_wait': float}}
+_LOCK_STATS = defaultdict(lambda: {'acquired': 0, 'contended': 0, 'timeouts': 0, 'total_wait': 0., 'max_wait': 0.})
+_STATS_LOCK = threading.Lock()
+
+
+class LockTimeoutError(TimeoutError):
+    '''
+    在给定时间内无法获取锁
+    '''
+    pass
+
+
+def _try_lock(fd, shared):
+    '''
+    尝试以非阻塞的方式对文件加锁
+
+    Parameter
+    ---------
+    fd: int
+        文件描述符
+    shared: boolean
+        是否为共享锁
+
+    Return
+    ------
+    result: boolean
+        是否成功加锁
+    '''
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    '''
+    释放文件锁
+
+    Parameter
+    ---------
+    fd: int
+        文件描述符
+    '''
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _record_wait(path, wait_time, contended, timeout):
+    '''
+    记录获取锁的等待时间
+
+    Parameter
+    ---------
+    path: string
+        锁文件路径
+    wait_time: float
+        等待时间(秒)
+    contended: boolean
+        第一次尝试时锁是否被其他持有者占用
+    timeout: boolean
+        是否等待超时
+    '''
+    with _STATS_LOCK:
+        stats = _LOCK_STATS[path]
+        if timeout:
+            stats['timeouts'] += 1
+        else:
+            stats['acquired'] += 1
+        if contended:
+            stats['contended'] += 1
+        stats['total_wait'] += wait_time
+        stats['max_wait'] = max(stats['max_wait'], wait_time)
+
+
+def get_lock_stats():
+    '''
+    获取当前进程中获取锁的等待时间统计
+
+    Return
+    ------
+    out: dict
+        格式为{lock_path: {'acquired': 成功获取的次数, 'contended': 需要等待的次数, 'timeouts': 超时次数,
+        'total_wait': 总等待时间(秒), 'max_wait': 最长等待时间(秒)}}
+    '''
+    with _STATS_LOCK:
+        return {k: dict(v) for k, v in _LOCK_STATS.items()}
+
+
+def reset_lock_stats():
+    '''
+    清空等待时间统计
+    '''
+    with _STATS_LOCK:
+        _LOCK_STATS.clear()
+
+
+class FileLock(object):
+    '''
+    基于锁文件的进程间共享/排他锁，获取排他锁时若锁文件不存在则自动创建，且使用后不会删除；
+    获取共享锁时不会创建锁文件，锁文件不存在或者无法打开时直接返回(不加锁)
+
+    使用方法如下:
+    >>> with FileLock(path).acquire(shared=True, timeout=10):
+    ...     data = read_data()
+
+    Parameter
+    ---------
+    path: string
+        锁文件路径
+    '''
+    def __init__(self, path):
+        self._path = path
+
+    def acquire(self, shared=False, timeout=None):
+        '''
+        获取锁，返回的对象为上下文管理器，退出时释放锁
+
+        Parameter
+        ---------
+        shared: boolean, default False
+            True表示共享锁(读)，False表示排他锁(写)
+        timeout: float, default None
+            最长等待时间(秒)，None表示一直等待
+
+        Return
+        ------
+        out: _HeldLock
+
+        Notes
+        -----
+        超时后引发LockTimeoutError；共享锁的锁文件不存在(尚未有写入者)或者没有权限打开(只读的数据库)时不加锁
+        '''
+        if shared:
+            try:
+                fd = os_open(self._path, O_RDONLY)
+            except OSError:
+                return _HeldLock(None)
+        else:
+            directory = dirname(self._path)
+            if not exists(directory):
+                makedirs(directory, exist_ok=True)
+            fd = os_open(self._path, O_RDWR | O_CREAT)
+        start = time.perf_counter()
+        interval = 0.001
+        contended = False
+        try:
+            while not _try_lock(fd, shared):
+                contended = True
+                wait_time = time.perf_counter() - start
+                if timeout is not None and wait_time >= timeout:
+                    _record_wait(self._path, wait_time, contended, True)
+                    raise LockTimeoutError('Acquiring lock timeout(path={p}, shared={s}, timeout={t})!'.
+                                           format(p=self._path, s=shared, t=timeout))
+                time.sleep(interval)
+                interval = min(interval * 2, _MAX_POLL_INTERVAL)
+        except BaseException:
+            os_close(fd)
+            raise
+        wait_time = time.perf_counter() - start
+        _record_wait(self._path, wait_time, contended, False)
+        if contended:
+            logger.debug('[Operation=FileLock.acquire, Info=\"Wait {w:.3f}s for lock(path={p}, shared={s}).\"]'.
+                         format(w=wait_time, p=self._path, s=shared))
+        return _HeldLock(fd)
+
+    @property
+    def path(self):
+        return self._path
+
+
+class _HeldLock(object):
+    '''
+    已经获取的锁，释放后关闭锁文件
+
+    Parameter
+    ---------
+    fd: int
+        锁文件的文件描述符，None表示未加锁
+    '''
+    def __init__(self, fd):
+        self._fd = fd
+
+    def release(self):
+        '''
+        释放锁，重复调用不会产生任何影响
+        '''
+        if self._fd is None:
+            return
+        try:
+            _unlock(self._fd)
+        finally:
+            os_close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/11
+
+列式存储引擎，用于存储数值型面板数据
+数据按照时间分区存储为Parquet或者Arrow IPC文件，请求时仅读取时间区间对应的分区以及所需代码对应的列，依赖pyarrow
+"""
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/11
+"""
+from os.path import dirname
+
+from database.utils import submodule_initialization, set_logger
+from database.const import DataFormatCategory, REL_PATH_SEP, ENCODING
+
+SUBMODULE_NAME = 'parquetdb'
+# 设置日志选项
+DB_CONFIG = submodule_initialization(SUBMODULE_NAME, dirname(__file__))
+
+LOGGER_NAME = set_logger(DB_CONFIG['log'])
+
+# 数据文件夹后缀，每个数据对应一个文件夹，其中包含元数据文件以及各个分区的数据文件
+SUFFIX = '.pqdb'
+
+# 各种文件格式对应的分区文件后缀
+FILE_SUFFIX = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# 元数据文件名称
+METADATA_FILENAME = 'metadata.json'
+
+# 分区文件中时间列的名称，其余的列名均为代码
+TIME_COLUMN = '__time__'
+
+# 元数据中时间的格式
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/11
+
+列式存储引擎核心实现
+
+每个数据对应一个文件夹(rel_path + SUFFIX)，包含以下文件:
+metadata.json: 元数据，包括文件格式、分区频率、数据类型、代码(按照插入的顺序)以及数据的起止时间
+分区文件: 文件名为分区名称(例如2018、2018Q1、201801)，包含时间列(TIME_COLUMN)以及该分区内出现过的代码对应的列
+
+pyarrow为可选依赖，未安装时仅在使用该引擎时引发ImportError
+"""
+import json
+import logging
+from os import makedirs, listdir, replace, remove, sep
+from os.path import join, exists, dirname
+from shutil import move, rmtree
+
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from database.utils import DBEngine, dump_json_atomically
+from database.parquetEngine.const import (LOGGER_NAME, DB_CONFIG, SUFFIX, FILE_SUFFIX, METADATA_FILENAME,
+                                          TIME_COLUMN, TIME_FORMAT, REL_PATH_SEP, ENCODING)
+
+# 获取当前日志句柄
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def _check_dependency():
+    '''
+    检查pyarrow是否已经安装
+    '''
+    if pa is None:
+        raise ImportError('pyarrow is required by ParquetEngine!')
+
+
+def date2partition(dates, frequency):
+    '''
+    将时间转化为对应的分区名称
+
+    Parameter
+    ---------
+    dates: pandas.DatetimeIndex or datetime like
+    frequency: string
+        分区频率，支持YEAR(例如2018)、QUARTER(例如2018Q1)和MONTH(例如201801)
+
+    Return
+    ------
+    out: pandas.Index or string
+        与输入的形式对应
+
+    Notes
+    -----
+    同一频率下分区名称的长度相同，因此分区名称的字符串顺序与时间顺序一致
+    '''
+    if not isinstance(dates, pd.DatetimeIndex):
+        return date2partition(pd.DatetimeIndex([dates]), frequency)[0]
+    if frequency == 'YEAR':
+        return dates.strftime('%Y')
+    elif frequency == 'QUARTER':
+        return dates.year.astype(str) + 'Q' + dates.quarter.astype(str)
+    elif frequency == 'MONTH':
+        return dates.strftime('%Y%m')
+    else:
+        raise NotImplementedError
+
+
+def read_partition(file_path, file_format, start_time=None, end_time=None, symbols=None):
+    '''
+    读取分区文件中给定时间区间和代码的数据，Parquet文件的时间过滤条件在读取时下推到行组，Arrow IPC文件通过
+    内存映射读取，仅复制所需的列
+
+    Parameter
+    ---------
+    file_path: string
+        分区文件路径
+    file_format: string
+        文件格式，parquet或者arrow
+    start_time: datetime like, default None
+        开始时间(包含)，None表示不限制
+    end_time: datetime like, default None
+        结束时间(包含)，None表示不限制
+    symbols: list, default None
+        需要读取的代码，分区中不存在的代码会被忽略，None表示读取所有代码
+
+    Return
+    ------
+    out: pandas.DataFrame
+        index为时间，columns为代码
+    '''
+    filters = []
+    if start_time is not None:
+        filters.append((TIME_COLUMN, '>=', pd.Timestamp(start_time)))
+    if end_time is not None:
+        filters.append((TIME_COLUMN, '<=', pd.Timestamp(end_time)))
+    if file_format == 'parquet':
+        columns = None
+        if symbols is not None:
+            names = set(pq.read_schema(file_path).names)
+            columns = [TIME_COLUMN] + [s for s in symbols if s in names]
+        table = pq.read_table(file_path, columns=columns, filters=filters or None)
+    elif file_format == 'arrow':
+        with pa.memory_map(file_path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        if symbols is not None:
+            names = set(table.column_names)
+            table = table.select([TIME_COLUMN] + [s for s in symbols if s in names])
+        if filters:
+            time_type = table.schema.field(TIME_COLUMN).type
+            compare = {'>=': pc.greater_equal, '<=': pc.less_equal}
+            mask = None
+            for _, op, value in filters:
+                cond = compare[op](table[TIME_COLUMN], pa.scalar(value, time_type))
+                mask = cond if mask is None else pc.and_(mask, cond)
+            table = table.filter(mask)
+    else:
+        raise NotImplementedError
+    out = table.to_pandas(use_threads=True).set_index(TIME_COLUMN)
+    out.index.name = None
+    return out
+
+
+def write_partition(file_path, data, file_format):
+    '''
+    将数据写入到分区文件中，先写入临时文件，完成后再替换原文件
+
+    Parameter
+    ---------
+    file_path: string
+        分区文件路径
+    data: pandas.DataFrame
+        index为时间，columns为代码
+    file_format: string
+        文件格式，parquet或者arrow
+    '''
+    df = data.copy()
+    df.insert(0, TIME_COLUMN, df.index.values)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = file_path + '.tmp'
+    try:
+        if file_format == 'parquet':
+            pq.write_table(table, tmp_path, compression=DB_CONFIG['compression'] or 'none',
+                           row_group_size=DB_CONFIG['row_group_size'])
+        elif file_format == 'arrow':
+            options = pa.ipc.IpcWriteOptions(compression=DB_CONFIG['compression'])
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                    writer.write_table(table)
+        else:
+            raise NotImplementedError
+        replace(tmp_path, file_path)
+    except Exception:
+        if exists(tmp_path):
+            remove(tmp_path)
+        raise
+
+
+class ParquetEngine(DBEngine):
+    '''
+    列式存储引擎，仅支持数值型面板数据
+    提供以下接口:
+    query: 类方法，依据给定的参数，从数据文件中查询相应的数据
+    insert: 类方法，依据给定的参数，向数据文件中插入数据
+    remove_data: 类方法，将数据库中给定的数据删除
+    move_to: 类方法，将给定的数据移动到其他给定的位置
+
+    Parameter
+    ---------
+    params: database.db.ParamsParser
+
+    Notes
+    -----
+    数据的存储格式(DataStorageCategory.COLUMNAR)或者配置文件中的columnar_data决定是否使用该引擎存储，
+    参见database.db.ParamsParser.get_engine
+    '''
+    concurrent_query = True
+
+    def __init__(self, params):
+        _check_dependency()
+        self._params = params
+        self._parse_path()
+
+    def _parse_path(self):
+        '''
+        将相对路径解析为数据文件夹的绝对路径
+        '''
+        params = self._params
+        rel_path = params.rel_path.replace(REL_PATH_SEP, sep) + SUFFIX
+        params.set_absolute_path(join(params.main_path, rel_path))
+
+    def _load_metadata(self):
+        '''
+        加载数据的元数据
+
+        Return
+        ------
+        metadata: dict or None
+            数据不存在时返回None
+        '''
+        try:
+            with open(join(self._params.absolute_path, METADATA_FILENAME), 'r', encoding=ENCODING) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _partition_path(self, metadata, partition):
+        '''
+        获取分区文件的路径
+
+        Parameter
+        ---------
+        metadata: dict
+        partition: string
+            分区名称
+
+        Return
+        ------
+        out: string
+        '''
+        return join(self._params.absolute_path, partition + FILE_SUFFIX[metadata['file_format']])
+
+    def _list_partitions(self, metadata, start_time, end_time):
+        '''
+        列出与给定时间区间有交集的分区
+
+        Parameter
+        ---------
+        metadata: dict
+        start_time: datetime like
+        end_time: datetime like
+
+        Return
+        ------
+        out: list
+            按照时间升序排列的分区名称
+        '''
+        suffix = FILE_SUFFIX[metadata['file_format']]
+        frequency = metadata['partition_frequency']
+        start_partition = date2partition(start_time, frequency)
+        end_partition = date2partition(end_time, frequency)
+        partitions = [fn[:-len(suffix)] for fn in listdir(self._params.absolute_path) if fn.endswith(suffix)]
+        return sorted(p for p in partitions if start_partition <= p <= end_partition)
+
+    @classmethod
+    def query(cls, params):
+        '''
+        从数据文件中查询给定的数据，仅读取与时间区间有交集的分区，以及给定代码对应的列
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+            start_time属性必须为非空，若end_time属性为None，则视作查询时点数据，反之则为查询时间区间的数据；
+            若symbols属性不为None，则结果按照给定代码排列，数据中不存在的代码对应的数据为NaN
+
+        Return
+        ------
+        out: pandas.DataFrame(PANEL) or pandas.Series(CROSS_SECTION) or None
+            没有请求到数据时返回None
+        '''
+        if params.start_time is None:
+            raise ValueError('start_time property cannot be None!')
+        obj = cls(params)
+        metadata = obj._load_metadata()
+        if metadata is None:
+            raise FileNotFoundError('Data({}) does not exist!'.format(params.rel_path))
+        end_time = params.start_time if params.end_time is None else params.end_time
+        partitions = obj._list_partitions(metadata, params.start_time, end_time)
+        datas = [read_partition(obj._partition_path(metadata, p), metadata['file_format'],
+                                params.start_time, end_time, params.symbols)
+                 for p in partitions]
+        datas = [d for d in datas if len(d) > 0]
+        if not datas:
+            return None
+        out = datas[0] if len(datas) == 1 else pd.concat(datas, axis=0, sort=False)
+        columns = metadata['symbols'] if params.symbols is None else params.symbols
+        out = out.reindex(columns=columns)
+        if params.end_time is None:
+            return out.iloc[0]
+        return out
+
+    @classmethod
+    def insert(cls, data, params):
+        '''
+        将给定的数据插入到数据文件中，数据中已经存在的时间(最新时间及之前)的数据会被忽略，
+        新增的代码按照升序排列在已有代码之后，仅重写新数据所在的分区
+
+        Parameter
+        ---------
+        data: pandas.DataFrame
+            index为时间，columns为代码
+        params: database.db.ParamsParser
+            dtype属性为数据的存储类型，None表示float64，仅在首次插入数据时有效
+
+        Return
+        ------
+        result: boolean
+        '''
+        if not isinstance(data, pd.DataFrame):
+            raise TypeError('pandas.DataFrame expected, while {} is provided!'.format(type(data)))
+        obj = cls(params)
+        metadata = obj._load_metadata()
+        if metadata is None:
+            metadata = {'file_format': DB_CONFIG['file_format'],
+                        'partition_frequency': DB_CONFIG['partition_frequency'],
+                        'dtype': np.dtype('float64' if params.dtype is None else params.dtype).str,
+                        'symbols': [], 'start_time': None, 'latest_data_time': None}
+        data = data.copy()
+        data.index = pd.to_datetime(data.index)
+        data = data.sort_index()
+        if metadata['latest_data_time'] is not None:
+            data = data.loc[data.index > pd.Timestamp(metadata['latest_data_time'])]
+        if len(data) == 0:
+            return False
+        data.columns = data.columns.astype(str)
+        data = data.astype(np.dtype(metadata['dtype']))
+        new_symbols = sorted(set(data.columns).difference(metadata['symbols']))
+        symbols = metadata['symbols'] + new_symbols
+        if not exists(obj._params.absolute_path):
+            makedirs(obj._params.absolute_path)
+        keys = date2partition(data.index, metadata['partition_frequency'])
+        for partition, part in data.groupby(keys, sort=True):
+            file_path = obj._partition_path(metadata, partition)
+            if exists(file_path):   # 新数据的时间均晚于已有数据，直接追加在分区末尾
+                old = read_partition(file_path, metadata['file_format'])
+                part = pd.concat([old, part], axis=0, sort=False)
+            part = part.reindex(columns=[s for s in symbols if s in part.columns])
+            write_partition(file_path, part, metadata['file_format'])
+        # 元数据最后写入，若写入过程中断，已经写入的分区数据在下次插入时会被覆盖
+        metadata['symbols'] = symbols
+        if metadata['start_time'] is None:
+            metadata['start_time'] = data.index[0].strftime(TIME_FORMAT)
+        metadata['latest_data_time'] = data.index[-1].strftime(TIME_FORMAT)
+        dump_json_atomically(metadata, join(obj._params.absolute_path, METADATA_FILENAME))
+        logger.debug('[Operation=ParquetEngine.insert, Info=\"Insert {n} rows into {p}(new symbols={s}).\"]'.
+                     format(n=len(data), p=obj._params.absolute_path, s=len(new_symbols)))
+        return True
+
+    @classmethod
+    def remove_data(cls, params):
+        '''
+        将给定的数据删除
+
+        Parameter
+        ---------
+        params: database.db.ParamsParser
+
+        Return
+        ------
+        result: boolean
+        '''
+        try:
+            obj = cls(params)
+            rmtree(obj._params.absolute_path)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        return True
+
+    @classmethod
+    def move_to(cls, src_params, dest_params):
+        '''
+        将给定的数据移动到其他给定的位置
+
+        Parameter
+        ---------
+        src_params: database.db.ParamsParser
+            原数据文件相关设定参数
+        dest_params: database.db.ParamsParser
+            目标数据文件相关设定参数
+        '''
+        dest_obj = cls(dest_params)
+        if exists(dest_obj._params.absolute_path):
+            raise ValueError('Cannot move to an existing position!')
+        src_obj = cls(src_params)
+        try:
+            if not exists(dirname(dest_obj._params.absolute_path)):
+                makedirs(dirname(dest_obj._params.absolute_path))
+            move(src_obj._params.absolute_path, dest_obj._params.absolute_path)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        return True
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/11
+
+列式存储引擎插入和请求测试，分别测试Parquet和Arrow IPC两种文件格式，运行需要安装pyarrow
+"""
+import os
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from database.db import Database, ParamsParser
+from database.hdf5Engine.dbcore import HDF5Engine
+from database.parquetEngine.dbcore import ParquetEngine
+from database.const import DataClassification, DataFormatCategory, DataValueCategory, DataStorageCategory
+from database.parquetEngine.const import DB_CONFIG
+
+fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL, DataStorageCategory.COLUMNAR)
+dates = pd.date_range('2015-01-01', periods=800, freq='B')
+sample_data = pd.DataFrame(np.random.rand(len(dates), 50), index=dates,
+                           columns=['{:06d}'.format(i) for i in range(50)])
+# 新增的代码追加在已有代码之后
+new_data = pd.DataFrame(np.random.rand(20, 51), columns=list(sample_data.columns) + ['000050'],
+                        index=pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=20, freq='B'))
+expected_all = pd.concat([sample_data, new_data], axis=0, sort=False)
+
+db_path = mkdtemp()
+db = Database(db_path)
+for file_format in ['parquet', 'arrow']:
+    DB_CONFIG['file_format'] = file_format
+    DB_CONFIG['compression'] = None if file_format == 'arrow' else 'zstd'
+    rel_path = 'columnar.' + file_format
+    print(db.insert(sample_data, rel_path, fmt), db.insert(new_data, rel_path, fmt))
+    # 已经存在的数据被忽略
+    print(not db.insert(sample_data.iloc[-10:], rel_path, fmt))
+
+    data = db.query(rel_path, fmt, '2016-03-01', '2017-02-01')
+    print(data.equals(expected_all.loc['2016-03-01': '2017-02-01']))
+    data = db.query(rel_path, fmt, dates[0], new_data.index[-1])
+    print(data.equals(expected_all))
+    data = db.query(rel_path, fmt, '2016-03-01')
+    print(data.equals(expected_all.loc['2016-03-01']))
+    symbols = ['000050', '000003', 'not_exist']
+    data = db.query(rel_path, fmt, '2017-01-01', new_data.index[-1], symbols=symbols)
+    print(data.equals(expected_all.loc['2017-01-01':].reindex(columns=symbols)))
+    print(db.query(rel_path, fmt, '2010-01-01', '2011-01-01') is None)
+
+# 通过配置文件指定列式存储
+three_level_fmt = fmt[:3]
+print(db.insert(sample_data, 'configured.legacy', three_level_fmt, 'float64'))    # 配置之前以HDF5格式存储的数据
+DB_CONFIG['columnar_data'] = ['configured']
+print(db.insert(sample_data, 'configured.data', three_level_fmt))
+print(db.query('configured.data', three_level_fmt, '2016-03-01', '2016-06-01').equals(sample_data.loc['2016-03-01': '2016-06-01']))
+# 已经以HDF5格式存储的数据仍然使用HDF5Engine
+print(np.all(np.isclose(db.query('configured.legacy', three_level_fmt, '2016-03-01', '2016-06-01'),
+                        sample_data.loc['2016-03-01': '2016-06-01'])))
+print(db.insert(new_data, 'configured.legacy', three_level_fmt) and
+      os.path.exists(os.path.join(db_path, 'configured', 'legacy.h5')) and
+      not os.path.exists(os.path.join(db_path, 'configured', 'legacy.pqdb')))
+print(ParamsParser.from_dict(db_path, {'rel_path': 'configured.legacy', 'store_fmt': three_level_fmt}).get_engine()
+      is HDF5Engine)
+print(ParamsParser.from_dict(db_path, {'rel_path': 'configured.data', 'store_fmt': three_level_fmt}).get_engine()
+      is ParquetEngine)
+
+print(db.move_to('columnar.arrow', 'moved.arrow', fmt), db.remove_data('columnar.parquet', fmt))
+print(sorted(db.list_alldata()) == ['configured.data', 'configured.legacy', 'moved.arrow'])
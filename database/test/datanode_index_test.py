@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/8
+
+数据树索引测试，比较索引查找结果与遍历数据树的结果
+"""
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from database.db import Database
+from database.const import DataClassification, DataFormatCategory, DataValueCategory
+
+fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES)
+sample_data = pd.Series(np.random.rand(10), index=pd.date_range('2018-01-01', periods=10))
+
+
+def walk_leaves(node):
+    # 遍历数据树获取所有叶子节点的相对路径
+    if node.is_leaf:
+        return [node.rel_path[1:]]
+    return sum((walk_leaves(c) for c in node.children), [])
+
+
+db_path = mkdtemp()
+db = Database(db_path)
+for rel_path in ['quote.close', 'quote.open', 'quote.adj.close', 'factor.value.pe', 'factor.close']:
+    db.insert(sample_data, rel_path, fmt, 'float64')
+print(sorted(db.list_alldata()) == sorted(walk_leaves(db._data_tree_root)))
+print(sorted(d['rel_path'] for d in db.find_data('close')) == ['factor.close', 'quote.adj.close', 'quote.close'])
+print(sorted(db.find_collection('quote')['quote'], key=lambda x: x['rel_path'])[0]['rel_path'] == 'quote.adj.close')
+
+version = db.metadata_version
+db.move_to('quote.adj.close', 'adj.close', fmt)
+db.remove_data('factor.value.pe', fmt)
+print(db.metadata_version > version)
+print(sorted(db.list_alldata()) == sorted(walk_leaves(db._data_tree_root)) ==
+      ['adj.close', 'factor.close', 'quote.close', 'quote.open'])
+print(db.find_collection('value') == {}, db.find_collection('adj') == {'adj': [{'rel_path': 'adj.close', 'store_fmt': db.find_data('close')[0]['store_fmt']}]})
+
+# 重新加载元数据后索引与原索引一致
+del db
+db = Database(db_path)
+print(sorted(db.list_alldata()) == ['adj.close', 'factor.close', 'quote.close', 'quote.open'])
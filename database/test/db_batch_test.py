@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/9
+
+数据树批量修改和日志重放测试
+"""
+from tempfile import mkdtemp
+from os.path import exists
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.db import Database
+from database.const import DataClassification, DataFormatCategory, DataValueCategory
+
+fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.TIME_SERIES)
+sample_data = pd.Series(np.random.rand(10), index=pd.date_range('2018-01-01', periods=10))
+
+db_path = mkdtemp()
+db = Database(db_path)
+with db.batch():
+    for i in range(20):
+        db.insert(sample_data, 'batch.data{}'.format(i), fmt, 'float64')
+    # batch期间变更仅写入日志
+    print(not exists(db._get_metadata_filename()), exists(db._get_journal_filename()))
+print(exists(db._get_metadata_filename()), not exists(db._get_journal_filename()))
+with open(db._get_metadata_filename(), 'r') as f:
+    print(len(json.load(f)['children'][0]['children']) == 20)
+
+# 日志重放: 未写入元数据文件的变更(包括写入中断的记录)在重新加载后恢复
+db.insert(sample_data, 'journal.data0', fmt, 'float64')
+db.move_to('batch.data0', 'journal.data1', fmt)
+db.remove_data('batch.data1', fmt)
+with open(db._get_journal_filename(), 'a') as f:
+    f.write('{"op": "remove", "rel_p')
+expected = sorted(db.list_alldata())
+db = Database(db_path)
+print(sorted(db.list_alldata()) == expected)
+# 日志中的变更已经写入元数据文件后，再次重放不会改变数据树
+db._dump_meta()
+with open(db._get_journal_filename(), 'w') as f:
+    f.write(json.dumps({'op': 'move', 'rel_path': 'batch.data0', 'dest_rel_path': 'journal.data1'}) + '\n')
+    f.write(json.dumps({'op': 'remove', 'rel_path': 'batch.data1'}) + '\n')
+db = Database(db_path)
+print(sorted(db.list_alldata()) == expected)
+
+# 性能比较
+db = Database(mkdtemp())
+start_time = time.time()
+for i in range(200):
+    db.insert(sample_data, 'perf.single.data{}'.format(i), fmt, 'float64')
+single_time = time.time() - start_time
+start_time = time.time()
+with db.batch():
+    for i in range(200):
+        db.insert(sample_data, 'perf.batch.data{}'.format(i), fmt, 'float64')
+batch_time = time.time() - start_time
+print('single: {:.3f}s, batch: {:.3f}s'.format(single_time, batch_time))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/12
+
+多进程同时读写同一数据库测试，检查数据树中包含所有进程插入的数据，且同一数据的并发写入不会损坏数据
+"""
+from os.path import join, exists, dirname
+from tempfile import mkdtemp
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from database.db import Database
+from database.lock import FileLock, LockTimeoutError, get_lock_stats
+from database.const import DataClassification, DataFormatCategory, DataValueCategory
+
+fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+dates = pd.date_range('2017-01-01', periods=200, freq='B')
+db_path = mkdtemp()
+
+
+def worker(worker_id):
+    db = Database(db_path)
+    with db.batch():
+        for i in range(10):
+            data = pd.DataFrame(np.full((len(dates), 5), worker_id, dtype='float64'), index=dates,
+                                columns=list('abcde'))
+            db.insert(data, 'worker{}.data{}'.format(worker_id, i), fmt, 'float64')
+            # 所有进程同时写入同一数据，早于已有数据的行会被忽略
+            shared = pd.DataFrame(np.ones((1, 5)), index=dates[i * 4 + worker_id: i * 4 + worker_id + 1],
+                                  columns=list('abcde'))
+            db.insert(shared, 'shared.data', fmt, 'float64')
+            db.query('shared.data', fmt, dates[0], dates[-1])
+    return get_lock_stats()
+
+
+if __name__ == '__main__':
+    with Pool(4) as pool:
+        stats = pool.map(worker, range(4))
+    db = Database(db_path)
+    print(sorted(db.list_alldata()) == sorted(['shared.data'] + ['worker{}.data{}'.format(w, i)
+                                                               for w in range(4) for i in range(10)]))
+    print(np.all(db.query('worker3.data9', fmt, dates[0], dates[-1]) == 3))
+    shared = db.query('shared.data', fmt, dates[0], dates[-1])
+    print(shared.index.is_monotonic_increasing and np.all(shared == 1))
+    print('lock waits: {}'.format(sum(s['contended'] for st in stats for s in st.values())))
+
+    # 超时
+    lock = FileLock(db._get_lock('shared.data').path)
+    with lock.acquire():
+        try:
+            with lock.acquire(shared=True, timeout=0.1):
+                print(False)
+        except LockTimeoutError:
+            print(True)
+
+    # 共享锁不会创建锁文件，锁文件不存在时不加锁
+    lock_path = join(mkdtemp(), '#locks', 'missing.data.lock')
+    with FileLock(lock_path).acquire(shared=True):
+        print(not exists(dirname(lock_path)))
+    with FileLock(lock_path).acquire():
+        print(exists(lock_path))
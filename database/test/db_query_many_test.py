@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/6
+
+批量请求测试，比较query_many与逐个调用query的结果
+"""
+from tempfile import mkdtemp
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from database.db import Database
+from database.const import DataClassification, DataFormatCategory, DataValueCategory
+
+db = Database(mkdtemp())
+num_fmt = (DataClassification.STRUCTURED, DataValueCategory.NUMERIC, DataFormatCategory.PANEL)
+char_fmt = (DataClassification.STRUCTURED, DataValueCategory.CHAR, DataFormatCategory.PANEL)
+dates = pd.date_range('2010-01-01', periods=2000, freq='B')
+symbols = ['{:06d}'.format(i) for i in range(500)]
+num_paths = ['factor.f{}'.format(i) for i in range(40)]
+for rel_path in num_paths:
+    db.insert(pd.DataFrame(np.random.rand(len(dates), len(symbols)), index=dates, columns=symbols),
+              rel_path, num_fmt, 'float64')
+char_data = pd.DataFrame(np.random.choice(['A', 'B', 'C'], (len(dates), len(symbols))),
+                         index=dates, columns=symbols)
+db.insert(char_data, 'char_test', char_fmt)
+
+requests = [(p, num_fmt) for p in num_paths] + [('char_test', char_fmt)]
+start_time, end_time = dates[100], dates[1500]
+
+t = time()
+single_result = {p: db.query(p, fmt, start_time, end_time) for p, fmt in requests}
+print('query: {:.3f}s'.format(time() - t))
+t = time()
+many_result = db.query_many(requests, start_time, end_time)
+print('query_many: {:.3f}s'.format(time() - t))
+print(list(many_result.keys()) == [p for p, _ in requests])
+print(all(many_result[p].equals(single_result[p]) for p in single_result))
+
+# 合成数据
+stacked = db.query_many([(p, num_fmt) for p in num_paths[:3]], start_time, end_time, stack=True)
+print(stacked.shape == (3 * 1401, len(symbols)), stacked.loc[(start_time, num_paths[1])].equals(
+    single_result[num_paths[1]].loc[start_time].rename((start_time, num_paths[1]))))
+cs = db.query_many([(p, num_fmt) for p in num_paths[:3]], start_time, stack=True)
+print(list(cs.index) == num_paths[:3], cs.loc[num_paths[2]].equals(single_result[num_paths[2]].loc[start_time].rename(num_paths[2])))
@@ -7,12 +7,13 @@ Created on Thu Jan 11 16:21:55 2018
 数据库模块一些辅助工具
 """
 import logging
-from os import sep
+import json
+from os import sep, replace, fsync
 from sys import stdout
 import abc
 
 import qrtutils
-from database.const import CONFIG_PATH, MODULE_NAME, MODULE_PATH
+from database.const import CONFIG_PATH, MODULE_NAME, MODULE_PATH, ENCODING
 from qrtconst import REL_PATH_HEADER
 
 def submodule_initialization(db_name, path, submod_depth=1):
@@ -104,6 +105,26 @@ def set_db_logger():
         logger_config['log_path'] = qrtutils.relpath2abs(MODULE_PATH, path)
     return set_logger(logger_config)
 
+def dump_json_atomically(obj, path, encoding=ENCODING):
+    '''
+    将对象以JSON格式写入到文件中，先写入临时文件，完成后再替换目标文件，避免写入过程中断导致文件损坏
+
+    Parameter
+    ---------
+    obj: object
+        可以被json序列化的对象
+    path: string
+        目标文件路径
+    encoding: string, default ENCODING
+        文件编码
+    '''
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding=encoding) as f:
+        json.dump(obj, f)
+        f.flush()
+        fsync(f.fileno())
+    replace(tmp_path, path)
+
 class DBEngine(object, metaclass=abc.ABCMeta):
     '''
     数据引擎虚基类
@@ -112,7 +133,12 @@ class DBEngine(object, metaclass=abc.ABCMeta):
     insert: 类方法，依据给定的参数，向数据文件中插入数据
     remove_data: 类方法，将数据库中给定的数据删除
     move_to: 类方法，将给定的数据移动到其他给定的位置
+
+    类属性concurrent_query表示是否可以在多个线程中同时调用query，database.db.Database.query_many
+    仅对该属性为True的引擎并发请求数据，其他引擎的请求在调用线程中依次执行
     '''
+    concurrent_query = False
+
     @classmethod
     @abc.abstractmethod
     def query(cls, *args, **kwargs):
@@ -7,5 +7,5 @@ Github: https://github.com/SAmmer0
 Created: 2018/3/23
 """
 
-from datautils.datacache.cachecore import DataView
+from datautils.datacache.cachecore import DataView, MemoryBudget, GLOBAL_BUDGET, set_memory_limit
 from datautils.datacollection.collections import DataGetterCollection
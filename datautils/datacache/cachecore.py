@@ -7,10 +7,14 @@ Github: https://github.com/SAmmer0
 Created: 2018/3/22
 """
 import logging
+import threading
+import weakref
+from collections import OrderedDict
 
 from pandas import to_datetime, concat
 
-from datautils.datacache.const import CacheStatus, LOGGER_NAME
+from datautils.datacache.const import CacheStatus, LOGGER_NAME, DEFAULT_MEMORY_LIMIT
+from datautils.datacache.ringstore import RingStore
 from tdtools import trans_date
 
 # --------------------------------------------------------------------------------------------------
@@ -19,6 +23,139 @@ logger = logging.getLogger(LOGGER_NAME)
 
 # --------------------------------------------------------------------------------------------------
 # 类
+class MemoryBudget(object):
+    '''
+    多个DataView共享的内存预算，所有注册的缓存占用的内存超过上限时，按照最近最少使用(LRU)的顺序回收内存：
+    先将缓存裁剪到其最近一次请求的时间区间(即释放预加载的数据)，仍然超过上限时再清空缓存
+
+    Parameter
+    ---------
+    limit: int, default None
+        内存上限(字节)，None表示不限制
+
+    Notes
+    -----
+    正在请求数据的缓存不会被清空，至多被裁剪到本次请求的时间区间
+    '''
+    def __init__(self, limit=None):
+        self._limit = limit
+        self._views = OrderedDict()    # {id(view): weakref}，按照最近使用的时间排列，最早使用的在前
+        self._lock = threading.RLock()
+
+    def register(self, view):
+        '''
+        注册缓存
+
+        Parameter
+        ---------
+        view: DataView
+        '''
+        key = id(view)
+        with self._lock:
+            self._views[key] = weakref.ref(view, lambda _: self._discard(key))
+
+    def unregister(self, view):
+        '''
+        取消注册缓存
+
+        Parameter
+        ---------
+        view: DataView
+        '''
+        self._discard(id(view))
+
+    def _discard(self, key):
+        with self._lock:
+            self._views.pop(key, None)
+
+    def touch(self, view):
+        '''
+        将缓存标记为最近使用
+
+        Parameter
+        ---------
+        view: DataView
+        '''
+        with self._lock:
+            if id(view) in self._views:
+                self._views.move_to_end(id(view))
+
+    def _alive_views(self):
+        return [v for v in (ref() for ref in list(self._views.values())) if v is not None]
+
+    @property
+    def nbytes(self):
+        '''
+        所有注册的缓存占用的内存(字节)
+        '''
+        with self._lock:
+            return sum(v.nbytes for v in self._alive_views())
+
+    def enforce(self, current=None):
+        '''
+        检查内存是否超过上限，若超过则回收内存
+
+        Parameter
+        ---------
+        current: DataView, default None
+            正在请求数据的缓存
+        '''
+        if self._limit is None:
+            return
+        with self._lock:
+            if current is not None:
+                self.touch(current)
+            views = self._alive_views()
+            total = sum(v.nbytes for v in views)
+            for view in views:    # 第一轮：裁剪到最近一次请求的时间区间
+                if total <= self._limit:
+                    return
+                total -= view.trim()
+            for view in views:    # 第二轮：清空除当前缓存外的其他缓存
+                if total <= self._limit:
+                    return
+                if view is not current:
+                    total -= view.clear()
+            if total > self._limit:
+                logger.warning('[Operation=MemoryBudget.enforce, Info=\"Memory used by cache({u}) exceeds limit({l}).\"]'.
+                               format(u=total, l=self._limit))
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @limit.setter
+    def limit(self, value):
+        self._limit = value
+        self.enforce()
+
+    def stats(self):
+        '''
+        获取所有注册的缓存的统计数据
+
+        Return
+        ------
+        out: list
+            元素为DataView.stats，按照最近使用的时间排列，最早使用的在前
+        '''
+        with self._lock:
+            return [v.stats for v in self._alive_views()]
+
+# 默认情况下所有DataView共享的内存预算
+GLOBAL_BUDGET = MemoryBudget(DEFAULT_MEMORY_LIMIT)
+
+def set_memory_limit(limit):
+    '''
+    设置所有DataView共享的内存上限
+
+    Parameter
+    ---------
+    limit: int
+        内存上限(字节)，None表示不限制
+    '''
+    GLOBAL_BUDGET.limit = limit
+
+
 class DataView(object):
     '''
     数据缓存类(仅限于日频数据)，对数据获取函数进行包装，统一获取数据的接口
@@ -31,25 +168,41 @@ class DataView(object):
     calendar: tdtools.tradingcalendar.TradingCalendar
         交易日历对象
     update_method: string
-        更新的方法，目前支持[overlap(完全覆盖), stepbystep(逐步加载)]，overlap会请求更多数据，对于读写比较慢
-        的数据不友好，stepbystep是在缓存数据的基础上增量加载
+        更新的方法，目前支持[overlap(完全覆盖), stepbystep(逐步加载), sliding(滑动窗口)]，overlap会请求更多数据，
+        对于读写比较慢的数据不友好，stepbystep是在缓存数据的基础上增量加载；sliding适用于按照时间顺序向前请求数据
+        (例如回测)，仅保留最近一次请求之前lookback个交易日的数据，并以preload_num个交易日为单位向后预加载，
+        数据保存在环形存储中，向过去请求数据时会重新加载
     preload_num: int
         必须为正数，指预加载数据的数量。
         当请求的数据超出当前缓存时，需要加载新的数据，为避免频繁加载，可以预先加载超过请求的数据，该参数表示的为
         超过的交易日的数量
+    budget: MemoryBudget, default None
+        缓存使用的内存预算，默认为所有DataView共享的GLOBAL_BUDGET
+    name: string, default None
+        缓存名称，仅用于统计数据
+    lookback: int, default None
+        仅在update_method为sliding时有效，保留的历史数据的交易日数量，None表示与preload_num相同
     '''
-    def __init__(self, func, calendar, update_method='stepbystep', preload_num=100):
+    def __init__(self, func, calendar, update_method='stepbystep', preload_num=100, budget=None, name=None,
+                 lookback=None):
         self._func = func
         self._calendar = calendar
-        if update_method not in ['overlap', 'stepbystep']:
-            raise ValueError('Unsupported \"update_method\"! Valids are [overlap, stepbystep], '+
+        if update_method not in ['overlap', 'stepbystep', 'sliding']:
+            raise ValueError('Unsupported \"update_method\"! Valids are [overlap, stepbystep, sliding], '+
                              'you provide {}'.format(update_method))
         self._update_method = update_method
         self._offset = preload_num
-        self._data_cache = None    # 数据缓存
+        self._lookback = preload_num if lookback is None else lookback
+        self._data_cache = None    # 数据缓存，sliding模式下为RingStore
         self._extendable = [True, True]    # 数据两端是否可以继续扩展，因为本地数据量的限制会导致有些日期的数据无法获取
         self._cache_start = None    # 缓存数据的开始时间
         self._cache_end = None    # 缓存数据的结束时间
+        self._window = None    # 最近一次请求的时间区间，格式为(start_time, end_time)
+        self._nbytes = 0    # 缓存数据占用的内存
+        self._stats = {'hits': 0, 'misses': 0, 'trims': 0, 'evictions': 0}
+        self.name = name
+        self._budget = GLOBAL_BUDGET if budget is None else budget
+        self._budget.register(self)
 
     def _check_data(self, query_start, query_end=None):
         '''
@@ -225,6 +378,168 @@ class DataView(object):
         else:
             self._extendable = [True, True]
 
+    def _load(self, update_direction, left_date, right_date):
+        '''
+        缓存数据不足时加载数据，并更新统计数据和内存预算
+
+        Parameter
+        ---------
+        update_direction: CacheStatus
+            _check_data的结果
+        left_date: datetime
+            左目标日期
+        right_date: datetime
+            右目标日期
+        '''
+        if update_direction == CacheStatus.ENOUGH:
+            self._stats['hits'] += 1
+            self._budget.touch(self)
+            return
+        self._stats['misses'] += 1
+        self._update_cache(update_direction, left_date=left_date, right_date=right_date)
+        self._nbytes = self._calc_nbytes()
+        self._budget.enforce(self)
+
+    def _calc_nbytes(self):
+        '''
+        计算缓存数据占用的内存(字节)
+        '''
+        if self._data_cache is None:
+            return 0
+        if self._update_method == 'sliding':
+            return self._data_cache.nbytes
+        usage = self._data_cache.memory_usage(index=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+
+    def trim(self):
+        '''
+        将缓存数据裁剪到最近一次请求的时间区间
+
+        Return
+        ------
+        freed: int
+            释放的内存(字节)
+        '''
+        if self._data_cache is None or self._window is None:
+            return 0
+        start_time, end_time = self._window
+        if self._update_method == 'sliding':
+            return self._trim_ring(start_time, end_time)
+        if start_time <= self._cache_start and end_time >= self._cache_end:
+            return 0
+        mask = (self._data_cache.index >= start_time) & (self._data_cache.index <= end_time)
+        if not mask.any():
+            return self.clear()
+        self._data_cache = self._data_cache.loc[mask].copy()
+        # 裁剪后两端的数据均可以重新加载
+        if self._data_cache.index[0] > self._cache_start:
+            self._extendable[0] = True
+        if self._data_cache.index[-1] < self._cache_end:
+            self._extendable[1] = True
+        self._cache_start = self._data_cache.index[0]
+        self._cache_end = self._data_cache.index[-1]
+        old_nbytes = self._nbytes
+        self._nbytes = self._calc_nbytes()
+        self._stats['trims'] += 1
+        return old_nbytes - self._nbytes
+
+    def _trim_ring(self, start_time, end_time):
+        '''
+        将环形存储裁剪到给定的时间区间，并释放多余的容量
+
+        Return
+        ------
+        freed: int
+            释放的内存(字节)
+        '''
+        ring = self._data_cache
+        old_nbytes = self._nbytes
+        if ring.end is not None and ring.end > end_time:
+            self._extendable[1] = True
+        ring.drop_before(start_time)
+        ring.drop_after(end_time)
+        if len(ring) == 0:
+            return self.clear()
+        ring.shrink()
+        self._cache_start = ring.start
+        self._cache_end = ring.end
+        self._nbytes = self._calc_nbytes()
+        if self._nbytes < old_nbytes:
+            self._stats['trims'] += 1
+        return old_nbytes - self._nbytes
+
+    def _slide(self, start_time, end_time):
+        '''
+        滑动窗口模式下加载数据: 请求的数据晚于缓存时，从缓存末尾向后加载至end_time之后preload_num个交易日，
+        并丢弃早于end_time之前lookback个交易日(以及start_time)的数据；请求的数据早于缓存或者与缓存之间
+        没有需要保留的数据时，重新加载
+
+        Parameter
+        ---------
+        start_time: datetime
+            请求的开始时间
+        end_time: datetime
+            请求的结束时间
+        '''
+        ring = self._data_cache
+        keep_from = min(start_time, self._calendar.shift_tradingdays(end_time, -max(self._lookback, 1)))
+        if ring is None or len(ring) == 0 or start_time < ring.start or keep_from > ring.end:
+            ring = self._data_cache = RingStore(self._lookback + self._offset + 2)
+            self._extendable = [True, True]
+            fetch_start = start_time
+        elif end_time > ring.end and self._extendable[1]:
+            fetch_start = ring.end
+        else:
+            self._stats['hits'] += 1
+            self._budget.touch(self)
+            return
+        self._stats['misses'] += 1
+        target = self._calendar.shift_tradingdays(end_time, self._offset) if self._offset > 0 else end_time
+        data = self._func(fetch_start, target).sort_index(ascending=True)
+        if len(ring) > 0:
+            data = data.loc[data.index > ring.end]
+            ring.drop_before(keep_from)    # 先丢弃过期的数据，避免扩容
+        ring.append(data)
+        self._extendable[1] = len(ring) > 0 and ring.end >= target
+        self._cache_start = ring.start
+        self._cache_end = ring.end
+        self._nbytes = self._calc_nbytes()
+        self._budget.enforce(self)
+
+    def clear(self):
+        '''
+        清空缓存数据
+
+        Return
+        ------
+        freed: int
+            释放的内存(字节)
+        '''
+        if self._data_cache is None:
+            return 0
+        freed = self._nbytes
+        self._data_cache = None
+        self._cache_start = None
+        self._cache_end = None
+        self._extendable = [True, True]
+        self._nbytes = 0
+        self._stats['evictions'] += 1
+        return freed
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    @property
+    def stats(self):
+        '''
+        缓存的统计数据，格式为{'name': 缓存名称, 'hits': 命中次数, 'misses': 未命中次数, 'trims': 被裁剪的次数,
+        'evictions': 被清空的次数, 'nbytes': 占用的内存(字节), 'start_time': 缓存开始时间, 'end_time': 缓存结束时间}
+        '''
+        out = dict(self._stats)
+        out.update(name=self.name, nbytes=self._nbytes, start_time=self._cache_start, end_time=self._cache_end)
+        return out
+
     def get_csdata(self, date):
         '''
         获取横截面数据
@@ -243,9 +558,12 @@ class DataView(object):
         if not self._calendar.is_tradingday(date):
             raise KeyError('Parameter \"date\" must be a trading day!')
         date = to_datetime(to_datetime(date).strftime('%Y-%m-%d'))
+        self._window = (date, date)
+        if self._update_method == 'sliding':
+            self._slide(date, date)
+            return self._data_cache.row(date)
         update_direction = self._check_data(date)
-        if update_direction != CacheStatus.ENOUGH:
-            self._update_cache(update_direction, date, date)
+        self._load(update_direction, date, date)
         return self._data_cache.loc[date]
 
     def get_tsdata(self, start_time, end_time):
@@ -266,8 +584,11 @@ class DataView(object):
         start_time, end_time = trans_date(start_time, end_time)
         if start_time >= end_time:
             raise ValueError('Improper time parameter order!')
+        self._window = (start_time, end_time)
+        if self._update_method == 'sliding':
+            self._slide(start_time, end_time)
+            return self._data_cache.slice(start_time, end_time)
         update_direction = self._check_data(start_time, end_time)
-        if update_direction != CacheStatus.ENOUGH:
-            self._update_cache(update_direction, left_date=start_time, right_date=end_time)
+        self._load(update_direction, start_time, end_time)
         mask = (self._data_cache.index <= end_time) & (self._data_cache.index >= start_time)
         return self._data_cache.loc[mask]
@@ -18,6 +18,9 @@ class CacheStatus(enum.Enum):
     BOTH = enum.auto()
     ENOUGH = enum.auto()
 
+# 所有DataView共享的默认内存上限(字节)，None表示不限制
+DEFAULT_MEMORY_LIMIT = None
+
 # 日志记录配置
 LOG_CONFIG = {
         "log_to_file": True,
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/18
+
+环形存储，用于滑动窗口缓存
+"""
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------------------------
+# 类
+class RingStore(object):
+    '''
+    环形存储，按照时间顺序保存面板数据(pandas.DataFrame)或者时间序列数据(pandas.Series)，
+    在尾部追加数据以及从头部丢弃数据时均不移动已有的数据，仅在容量不足、出现新的列或者数据类型改变时重新分配；
+    整数和布尔类型的数据以float64存储(缺失的列以NaN填充)
+
+    Parameter
+    ---------
+    capacity: int
+        初始容量(行数)
+    '''
+    def __init__(self, capacity):
+        self._capacity = max(int(capacity), 1)
+        self._values = None    # 二维数组，shape为(capacity, 列数)
+        self._times = np.empty(self._capacity, dtype='datetime64[ns]')
+        self._columns = None
+        self._is_series = False
+        self._name = None    # pandas.Series的名称
+        self._head = 0    # 最早的数据所在的位置
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _physical(self, i):
+        return (self._head + i) % self._capacity
+
+    def _logical_slice(self, array, i0, i1):
+        '''
+        按照逻辑顺序获取[i0, i1)的数据，返回的结果为复制的数据
+        '''
+        p0 = self._physical(i0)
+        n = i1 - i0
+        if p0 + n <= self._capacity:
+            return array[p0: p0 + n].copy()
+        return np.concatenate((array[p0:], array[: p0 + n - self._capacity]))
+
+    def _search(self, date, side='left'):
+        '''
+        二分查找给定时间在逻辑顺序中的位置，含义与numpy.searchsorted相同
+        '''
+        date = np.datetime64(pd.Timestamp(date), 'ns')
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self._times[self._physical(mid)]
+            if t < date or (side == 'right' and t == date):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _reallocate(self, capacity, columns, dtype):
+        '''
+        重新分配存储，并将已有数据按照逻辑顺序复制到新存储的头部
+        '''
+        fill = np.nan if dtype.kind in 'fc' else None
+        values = np.full((capacity, len(columns)), fill, dtype=dtype)
+        times = np.empty(capacity, dtype='datetime64[ns]')
+        if self._size > 0:
+            indexer = columns.get_indexer(self._columns)
+            values[: self._size, indexer] = self._logical_slice(self._values, 0, self._size)
+            times[: self._size] = self._logical_slice(self._times, 0, self._size)
+        self._values = values
+        self._times = times
+        self._columns = columns
+        self._capacity = capacity
+        self._head = 0
+
+    def append(self, data):
+        '''
+        在尾部追加数据
+
+        Parameter
+        ---------
+        data: pandas.DataFrame or pandas.Series
+            index为时间，要求按照时间升序排列，且均晚于已有数据
+        '''
+        if len(data) == 0:
+            return
+        if self._size > 0 and data.index[0] <= self.end:
+            raise ValueError('Appended data must be later than the existing data!')
+        if isinstance(data, pd.Series):
+            self._is_series = True
+            self._name = data.name
+            data = data.to_frame(name=0)
+        dtype = data.values.dtype
+        if dtype.kind in 'iub':    # 整数和布尔类型无法表示缺失值，转换为浮点数
+            dtype = np.result_type(dtype, np.float64)
+        if self._values is None:
+            self._reallocate(max(self._capacity, len(data)), data.columns, dtype)
+        else:
+            columns = self._columns
+            new_columns = data.columns.difference(columns)
+            if len(new_columns) > 0:    # 新的列，原有数据在新列中为NaN
+                columns = columns.append(new_columns)
+            dtype = np.result_type(self._values.dtype, dtype)
+            capacity = self._capacity
+            if self._size + len(data) > capacity:
+                capacity = max(capacity * 2, self._size + len(data))
+            if len(new_columns) > 0 or dtype != self._values.dtype or capacity != self._capacity:
+                self._reallocate(capacity, columns, dtype)
+            data = data.reindex(columns=self._columns)
+        values = data.values
+        times = data.index.values.astype('datetime64[ns]')
+        tail = self._physical(self._size)
+        n = len(data)
+        first = min(n, self._capacity - tail)
+        self._values[tail: tail + first] = values[:first]
+        self._times[tail: tail + first] = times[:first]
+        if first < n:    # 回绕到存储的头部
+            self._values[: n - first] = values[first:]
+            self._times[: n - first] = times[first:]
+        self._size += n
+
+    def drop_before(self, date):
+        '''
+        丢弃早于给定时间的数据
+
+        Parameter
+        ---------
+        date: datetime like
+        '''
+        n = self._search(date, 'left')
+        self._head = self._physical(n)
+        self._size -= n
+        if self._size == 0:
+            self._head = 0
+
+    def drop_after(self, date):
+        '''
+        丢弃晚于给定时间的数据
+
+        Parameter
+        ---------
+        date: datetime like
+        '''
+        self._size = self._search(date, 'right')
+        if self._size == 0:
+            self._head = 0
+
+    def shrink(self):
+        '''
+        将容量缩减到当前数据的行数，释放多余的内存
+        '''
+        if self._values is not None and self._capacity > max(self._size, 1):
+            self._reallocate(max(self._size, 1), self._columns, self._values.dtype)
+
+    def slice(self, start_time, end_time):
+        '''
+        获取时间区间内的数据(包含边界)
+
+        Parameter
+        ---------
+        start_time: datetime like
+        end_time: datetime like
+
+        Return
+        ------
+        out: pandas.DataFrame or pandas.Series
+            与追加的数据类型相同，数据为复制的结果
+        '''
+        i0 = self._search(start_time, 'left')
+        i1 = max(self._search(end_time, 'right'), i0)
+        index = pd.DatetimeIndex(self._logical_slice(self._times, i0, i1))
+        if self._values is None:
+            values = np.empty((0, 0))
+        else:
+            values = self._logical_slice(self._values, i0, i1)
+        if self._is_series:
+            return pd.Series(values[:, 0], index=index, name=self._name)
+        return pd.DataFrame(values, index=index, columns=self._columns)
+
+    def row(self, date):
+        '''
+        获取给定时间的横截面数据
+
+        Parameter
+        ---------
+        date: datetime like
+
+        Return
+        ------
+        out: pandas.Series or data
+            面板数据返回pandas.Series，时间序列数据返回具体的值；没有该时间的数据时引发KeyError
+        '''
+        i = self._search(date, 'left')
+        if i >= self._size or self._times[self._physical(i)] != np.datetime64(pd.Timestamp(date), 'ns'):
+            raise KeyError(date)
+        values = self._values[self._physical(i)]
+        if self._is_series:
+            return values[0]
+        return pd.Series(values.copy(), index=self._columns, name=pd.Timestamp(date))
+
+    @property
+    def start(self):
+        return pd.Timestamp(self._times[self._head]) if self._size > 0 else None
+
+    @property
+    def end(self):
+        return pd.Timestamp(self._times[self._physical(self._size - 1)]) if self._size > 0 else None
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def nbytes(self):
+        '''
+        已分配的存储占用的内存(字节)
+        '''
+        values_nbytes = 0 if self._values is None else self._values.nbytes
+        return values_nbytes + self._times.nbytes
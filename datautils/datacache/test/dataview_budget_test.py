@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/17
+"""
+import numpy as np
+import pandas as pd
+
+from datautils.datacache.cachecore import DataView, MemoryBudget
+
+class BDayCalendar(object):
+    # 以工作日作为交易日
+    def __init__(self):
+        self._days = pd.bdate_range('2010-01-01', '2020-12-31')
+
+    def is_tradingday(self, date):
+        return pd.Timestamp(date) in self._days
+
+    def latest_tradingday(self, date, direction):
+        pos = self._days.searchsorted(pd.Timestamp(date))
+        if direction == 'FUTURE' or self._days[pos] == pd.Timestamp(date):
+            return self._days[pos]
+        return self._days[pos - 1]
+
+    def shift_tradingdays(self, date, offset):
+        pos = self._days.searchsorted(pd.Timestamp(date))
+        if offset > 0:
+            return self._days[pos + offset - 1]
+        return self._days[pos + offset]
+
+calendar = BDayCalendar()
+all_data = pd.DataFrame(np.random.rand(len(calendar._days), 100), index=calendar._days)
+calls = []
+def get_data(start_time, end_time):
+    calls.append((start_time, end_time))
+    return all_data.loc[start_time: end_time]
+
+row_bytes = 100 * 8 + 8
+budget = MemoryBudget(limit=row_bytes * 300)
+dv1 = DataView(get_data, calendar, preload_num=100, budget=budget, name='dv1')
+dv2 = DataView(get_data, calendar, preload_num=100, budget=budget, name='dv2')
+
+# --------------------------------------------------------------------------------------------------
+# 命中与未命中
+print(dv1.get_csdata('2015-06-01').equals(all_data.loc['2015-06-01']))
+print(dv1.get_tsdata('2015-06-02', '2015-06-10').equals(all_data.loc['2015-06-02': '2015-06-10']))
+print(dv1.stats['hits'] == 1 and dv1.stats['misses'] == 1)
+print(dv1.nbytes == 200 * row_bytes)
+
+# --------------------------------------------------------------------------------------------------
+# 超过预算时先裁剪最近最少使用的缓存
+print(dv2.get_csdata('2016-06-01').equals(all_data.loc['2016-06-01']))
+print(budget.nbytes <= budget.limit)
+print(dv1.stats['trims'] == 1 and dv1.stats['start_time'] == pd.Timestamp('2015-06-02') and
+      dv1.stats['end_time'] == pd.Timestamp('2015-06-10'))
+print(dv2.stats['trims'] == 0 and dv2.nbytes == 200 * row_bytes)
+
+# 裁剪后的缓存可以重新加载两端的数据
+print(dv1.get_tsdata('2015-05-01', '2015-06-30').equals(all_data.loc['2015-05-01': '2015-06-30']))
+print(budget.nbytes <= budget.limit)
+
+# --------------------------------------------------------------------------------------------------
+# 单个缓存超过预算时清空其他缓存
+dv2.get_tsdata('2016-01-01', '2016-12-31')
+print(dv1.stats['evictions'] == 1 and dv1.nbytes == 0)
+print(dv2.get_tsdata('2016-01-01', '2016-12-31').equals(all_data.loc['2016-01-01': '2016-12-31']))
+print(dv1.get_csdata('2015-06-01').equals(all_data.loc['2015-06-01']))
+print([s['name'] for s in budget.stats()] == ['dv2', 'dv1'])
+
+# 被回收的缓存不再计入预算
+del dv1
+print(len(budget.stats()) == 1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/18
+"""
+import numpy as np
+import pandas as pd
+
+from datautils.datacache.cachecore import DataView, MemoryBudget
+from datautils.datacache.ringstore import RingStore
+
+class BDayCalendar(object):
+    # 以工作日作为交易日
+    def __init__(self):
+        self._days = pd.bdate_range('2010-01-01', '2020-12-31')
+
+    def is_tradingday(self, date):
+        return pd.Timestamp(date) in self._days
+
+    def latest_tradingday(self, date, direction):
+        pos = self._days.searchsorted(pd.Timestamp(date))
+        if direction == 'FUTURE' or self._days[pos] == pd.Timestamp(date):
+            return self._days[pos]
+        return self._days[pos - 1]
+
+    def shift_tradingdays(self, date, offset):
+        pos = self._days.searchsorted(pd.Timestamp(date))
+        if offset > 0:
+            return self._days[pos + offset - 1]
+        return self._days[pos + offset]
+
+# --------------------------------------------------------------------------------------------------
+# 环形存储
+dates = pd.bdate_range('2018-01-01', periods=20)
+panel = pd.DataFrame(np.arange(60.).reshape(20, 3), index=dates, columns=['a', 'b', 'c'])
+ring = RingStore(8)
+ring.append(panel.iloc[:6])
+ring.drop_before(dates[4])
+ring.append(panel.iloc[6:10])    # 回绕到存储的头部
+print(ring.capacity == 8 and len(ring) == 6)
+print(ring.slice(dates[4], dates[9]).equals(panel.iloc[4:10]))
+print(ring.row(dates[7]).equals(panel.iloc[7].rename(dates[7])))
+# 新的列以及扩容
+wider = panel.iloc[10:20].assign(d=1.)
+ring.append(wider)
+print(ring.capacity == 16 and list(ring.slice(dates[0], dates[19]).columns) == ['a', 'b', 'c', 'd'])
+print(ring.slice(dates[4], dates[9])['d'].isnull().all())
+print(ring.slice(dates[10], dates[19]).equals(wider))
+ring.drop_after(dates[12])
+ring.shrink()
+print(ring.capacity == 9 and ring.end == dates[12])
+try:
+    ring.row(dates[2])
+    print(False)
+except KeyError:
+    print(True)
+# 时间序列
+ts_ring = RingStore(4)
+ts_ring.append(panel['a'])
+print(ts_ring.slice(dates[0], dates[19]).equals(panel['a']) and ts_ring.row(dates[3]) == panel['a'].iloc[3])
+# 整数数据转换为浮点数，缺失的列为NaN
+int_panel = pd.DataFrame(np.arange(60).reshape(20, 3), index=dates, columns=['a', 'b', 'c'])
+int_ring = RingStore(5)
+int_ring.append(int_panel.iloc[:10])
+int_ring.append(int_panel.iloc[10:20, :2])
+out = int_ring.slice(dates[0], dates[19])
+print(out.dtypes.eq(np.float64).all() and out.iloc[:, :2].equals(int_panel.iloc[:, :2].astype(np.float64)))
+print(out['c'].iloc[:10].equals(int_panel['c'].iloc[:10].astype(np.float64)) and out['c'].iloc[10:].isnull().all())
+int_ts_ring = RingStore(5)
+int_ts_ring.append(int_panel['a'])
+print(int_ts_ring.slice(dates[0], dates[19]).equals(int_panel['a'].astype(np.float64)))
+
+# --------------------------------------------------------------------------------------------------
+# 滑动窗口
+calendar = BDayCalendar()
+all_data = pd.DataFrame(np.random.rand(len(calendar._days), 50), index=calendar._days)
+calls = []
+def get_data(start_time, end_time):
+    calls.append((start_time, end_time))
+    return all_data.loc[start_time: end_time]
+
+dv = DataView(get_data, calendar, update_method='sliding', preload_num=20, lookback=10, budget=MemoryBudget())
+backtest_days = pd.bdate_range('2015-01-01', '2016-12-31')
+print(all(dv.get_csdata(d).equals(all_data.loc[d]) for d in backtest_days))
+print(len(calls) == int(np.ceil(len(backtest_days) / 20.)))
+print(dv.stats['misses'] == len(calls) and dv.stats['hits'] == len(backtest_days) - len(calls))
+# 内存有界
+print(len(dv._data_cache) <= 10 + 20 + 1 and dv._data_cache.capacity == 10 + 20 + 2)
+# 回看窗口内的时间序列请求不需要重新加载
+n_calls = len(calls)
+print(dv.get_tsdata(calendar.shift_tradingdays(backtest_days[-1], -10), backtest_days[-1]).equals(
+    all_data.loc[calendar.shift_tradingdays(backtest_days[-1], -10): backtest_days[-1]]))
+print(len(calls) == n_calls)
+# 向过去请求时重新加载
+print(dv.get_tsdata('2015-03-02', '2015-03-31').equals(all_data.loc['2015-03-02': '2015-03-31']))
+print(len(calls) == n_calls + 1 and dv.stats['start_time'] == pd.Timestamp('2015-03-02'))
+
+# 整数面板数据
+int_data = pd.DataFrame(np.arange(len(calendar._days) * 5).reshape(len(calendar._days), 5), index=calendar._days)
+int_dv = DataView(lambda st, et: int_data.loc[st: et], calendar, update_method='sliding', preload_num=20, lookback=10,
+                  budget=MemoryBudget())
+print(all(int_dv.get_csdata(d).equals(int_data.loc[d].astype(np.float64)) for d in backtest_days[:60]))
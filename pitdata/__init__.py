@@ -11,7 +11,7 @@ Point in time data manager
 from pitdata.utils import DataDescription
 from pitdata.tools import (PITDataCache, pitcache_getter, delete_computing_file,
                            move_computing_file, data_simu_calculation, delete_db_data,
-                           list_branch)
+                           list_branch, profile_report)
 from pitdata.query import query, query_group, list_data, show_all_data
 from pitdata.const import DataType
 from pitdata.updater.operator import update_all
@@ -75,6 +75,11 @@ UPDATING_LOGGER =  set_updating_logger(CONFIG, LOGGER_NAME)
 
 # 元数据文件名
 METADATA_FILENAME = '#update_time_metadata.json'
+# 计算数据时使用的数据定义时间(DataDescription.update_time)的元数据文件名
+DEFINITION_METADATA_FILENAME = '#definition_time_metadata.json'
+
+# 数据更新性能记录文件名(JSON行格式)，与数据更新日志位于同一文件夹
+PROFILE_FILENAME = 'data_updating_profile.jsonl'
 
 # 更新的隔断时间(24小时制的小时时间)。即若当天时间早于该时间，以上个交易日为最新的时间
 UPDATE_TIME_THRESHOLD = 18
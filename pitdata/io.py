@@ -6,7 +6,9 @@ Email: howardleeh@gmail.com
 Github: https://github.com/SAmmer0
 Created: 2018/4/17
 """
-from os.path import split as op_split
+from glob import glob, escape as glob_escape
+from os import sep, walk, stat
+from os.path import split as op_split, join, isdir
 
 import pandas as pd
 
@@ -18,6 +20,13 @@ from database.const import REL_PATH_SEP
 # 加载数据库实例，一次性加载避免过多的元数据初始化
 db = Database(CONFIG['db_path'])
 
+# 存储格式(前三级分类)到数据类型的映射
+_STORE_FMT_MAP = {DT_MAP[k]['store_fmt']: k for k in DT_MAP}
+# get_db_dictionary的结果缓存，version为生成缓存时数据库的数据树版本
+_DB_DICTIONARY_CACHE = {'version': None, 'data': None}
+# 数据名称解析结果缓存，格式为{data_name: (rel_path, datatype)}，version为生成缓存时数据库的数据树版本
+_NAME_CACHE = {'version': None, 'data': {}}
+
 # --------------------------------------------------------------------------------------------------
 # IO功能函数
 def insert_data(data, rel_path, datatype):
@@ -42,7 +51,10 @@ def insert_data(data, rel_path, datatype):
         raise ValueError('Improper parameter combination(data: {datat}, datatype: {dt})!'.
                          format(datat=type(data), dt=datatype.name))
     insert_param = DT_MAP[datatype]
+    version = db.metadata_version
     result = db.insert(data, rel_path, store_fmt=insert_param['store_fmt'], dtype=insert_param['dtype'])
+    if db.metadata_version != version:  # 插入了新的数据
+        invalidate_name_cache()
     return result
 
 
@@ -72,6 +84,34 @@ def query_data(rel_path, datatype, start_time, end_time=None):
     return out
 
 
+def query_data_group(requests, start_time, end_time=None, stack=False):
+    '''
+    从数据库中同时请求多个数据，参见database.Database.query_many
+
+    Parameter
+    ---------
+    requests: iterable
+        元素为(rel_path, datatype)
+    start_time: datetime like
+        数据开始时间
+    end_time: datetime like, default None
+        数据结束时间。该参数为None表示请求横截面数据，仅当所有的datatype均为面板数据时，该参数才可能为None
+    stack: boolean, default False
+        是否将结果合成为一个pandas.DataFrame
+
+    Return
+    ------
+    out: dict, pandas.DataFrame or None
+        stack为False时，返回{rel_path: data}；stack为True时，返回合成后的数据，参见database.Database.query_many
+    '''
+    requests = list(requests)
+    if end_time is None and any(dt.name.startswith('TS_') for _, dt in requests):
+        raise ValueError('Time series cannot query cross-section data!')
+    out = db.query_many([(rel_path, DT_MAP[dt]['store_fmt']) for rel_path, dt in requests],
+                        start_time, end_time, stack=stack)
+    return out
+
+
 def delete_data(rel_path, datatype):
     '''
     删除给定路径的数据
@@ -89,6 +129,8 @@ def delete_data(rel_path, datatype):
     '''
     delete_param = DT_MAP[datatype]
     result = db.remove_data(rel_path, delete_param['store_fmt'])
+    if result:
+        invalidate_name_cache()
     return result
 
 def move_data(src_path, dest_path, datatype):
@@ -114,25 +156,99 @@ def move_data(src_path, dest_path, datatype):
     '''
     move_param = DT_MAP[datatype]
     result = db.move_to(src_path, dest_path, move_param['store_fmt'])
+    if result:
+        invalidate_name_cache()
     return result
 
+def get_data_nbytes(rel_path):
+    '''
+    获取数据在数据库中占用的磁盘空间，包括以数据名称命名的数据文件(各数据引擎的后缀)以及数据文件夹
+
+    Parameter
+    ---------
+    rel_path: string
+        数据的相对路径
+
+    Return
+    ------
+    nbytes: int
+        字节数，数据不存在时为0
+    '''
+    base_path = join(CONFIG['db_path'], rel_path.replace(REL_PATH_SEP, sep))
+    file_paths = glob(glob_escape(base_path) + '.*')
+    if isdir(base_path):
+        for dir_path, _, file_names in walk(base_path):
+            file_paths.extend(join(dir_path, fn) for fn in file_names)
+    nbytes = 0
+    for path in file_paths:
+        try:
+            if not isdir(path):
+                nbytes += stat(path).st_size
+        except FileNotFoundError:   # 其他进程删除了文件
+            continue
+    return nbytes
+
 def get_db_dictionary():
     '''
-    以字典的形式返回当前数据库中包含的所有数据
+    以字典的形式返回当前数据库中包含的所有数据，结果会被缓存，在数据库的数据树发生变化(插入新数据、删除或者移动数据)
+    后才会重新生成
 
     Return
     ------
     out: dict
-        格式为{data_name: {'rel_path': rel_path, 'datatype': datatype}}
-    '''
-    db_name = op_split(CONFIG['db_path'])[1]
-    all_data_node = db.find_collection(db_name)['']
-    reverse_map = {DT_MAP[k]['store_fmt']: k for k in DT_MAP}
-    out = {d['rel_path'].split(REL_PATH_SEP)[-1]:
-           {'rel_path': d['rel_path'], 'datatype': reverse_map[d['store_fmt'].data]}
-           for d in all_data_node}
+        格式为{data_name: {'rel_path': rel_path, 'datatype': datatype}}，该字典为缓存对象，不能修改
+    '''
+    version = db.metadata_version
+    if _DB_DICTIONARY_CACHE['version'] != version:
+        db_name = op_split(CONFIG['db_path'])[1]
+        all_data_node = db.find_collection(db_name)['']
+        _DB_DICTIONARY_CACHE['data'] = {d['rel_path'].split(REL_PATH_SEP)[-1]:
+                                        {'rel_path': d['rel_path'], 'datatype': _STORE_FMT_MAP[d['store_fmt'].data[:3]]}
+                                        for d in all_data_node}
+        _DB_DICTIONARY_CACHE['version'] = version
+    return _DB_DICTIONARY_CACHE['data']
+
+def resolve_name(data_name):
+    '''
+    将数据名称解析为相对路径和数据类型，解析结果会被缓存，缓存在数据树发生变化后失效
+
+    Parameter
+    ---------
+    data_name: string
+        数据名称
+
+    Return
+    ------
+    out: tuple
+        (rel_path, datatype)
+    '''
+    version = db.metadata_version
+    if _NAME_CACHE['version'] != version:   # 数据树在pitdata之外被修改
+        invalidate_name_cache()
+        _NAME_CACHE['version'] = version
+    cache = _NAME_CACHE['data']
+    out = cache.get(data_name, None)
+    if out is None:
+        # 直接通过数据树的索引查找，仅在名称对应多个数据时才使用完整的数据字典确定结果
+        matched = db.find_data(data_name)
+        if len(matched) == 1:
+            dmsg = {'rel_path': matched[0]['rel_path'], 'datatype': _STORE_FMT_MAP[matched[0]['store_fmt'].data[:3]]}
+        else:
+            dmsg = get_db_dictionary().get(data_name, None)
+        if dmsg is None:
+            raise ValueError('Unrecognizable data name(name={})!'.format(data_name))
+        out = cache[data_name] = (dmsg['rel_path'], dmsg['datatype'])
     return out
 
+def invalidate_name_cache():
+    '''
+    清空数据名称解析和数据字典的缓存，在插入新数据、删除或者移动数据后调用
+    '''
+    _NAME_CACHE['data'] = {}
+    _NAME_CACHE['version'] = None
+    _DB_DICTIONARY_CACHE['data'] = None
+    _DB_DICTIONARY_CACHE['version'] = None
+
 def show_db_structure():
     '''
     打印数据库的结构
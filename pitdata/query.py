@@ -11,10 +11,11 @@ Created: 2018/4/18
 import logging
 import re
 import pdb
+from collections import OrderedDict
 
 import pandas as pd
 
-from pitdata.io import query_data, get_db_dictionary, show_db_structure
+from pitdata.io import query_data, query_data_group, get_db_dictionary, show_db_structure, resolve_name
 from pitdata.const import LOGGER_NAME
 
 # --------------------------------------------------------------------------------------------------
@@ -42,10 +43,8 @@ def query(data_name, start_time, end_time=None):
     out: pandas.DataFrame, pandas.Series or None
         None表示没有所请求的数据
     '''
-    dmsg = get_db_dictionary().get(data_name, None)
-    if dmsg is None:
-        raise ValueError('Unrecognizable data name(name={})!'.format(data_name))
-    out = query_data(dmsg['rel_path'], dmsg['datatype'], start_time, end_time)
+    rel_path, datatype = resolve_name(data_name)
+    out = query_data(rel_path, datatype, start_time, end_time)
     return out
 
 def query_group(name_group, start_time, end_time=None):
@@ -72,8 +71,12 @@ def query_group(name_group, start_time, end_time=None):
     if len(name_group) <= 1:
         logger.warning('[Operation=query_group, '+
                        'Info=\"Parameter name_group has a length of {}, the result will be uncertain!\"]'.format(len(name_group)))
-    datas = [query(d, start_time, end_time) for d in name_group]
-    if any([x is None for x in datas]):
+    requests = [resolve_name(d) for d in name_group]
+    # 数据库同时并发请求所有数据(重复的数据仅请求一次)，结果再按照name_group的顺序合成
+    unique_requests = list(OrderedDict.fromkeys(requests))
+    datas = query_data_group(unique_requests, start_time, end_time)
+    datas = [datas[rel_path] for rel_path, _ in requests]
+    if any(d is None for d in datas):
         return None
     data_shapes = [d.shape for d in datas]
     if not all(ldf == data_shapes[0] for ldf in data_shapes):
@@ -82,11 +85,12 @@ def query_group(name_group, start_time, end_time=None):
         out = pd.concat(datas, axis=1)
         out.columns = name_group
         return out.T
-    else:
-        for d_name, d in zip(name_group, datas):
-            d.index = pd.MultiIndex.from_product([d.index, [d_name]])
-        out = pd.concat(datas, axis=0).sort_index(level=[0, 1])
-        return out
+    stacked = []
+    for d_name, d in zip(name_group, datas):
+        d = d.copy()
+        d.index = pd.MultiIndex.from_product([d.index, [d_name]])
+        stacked.append(d)
+    return pd.concat(stacked, axis=0).sort_index(level=[0, 1])
 
 def list_data(pattern=None, match_method='simple'):
     '''
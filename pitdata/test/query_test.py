@@ -31,3 +31,9 @@ tmp5 = query_group(['universe', 'close'], '2018-01-01')
 print(tmp5)
 tmp6 = query_group(['universe', 'close'], '2018-01-02')
 print(tmp6.head())
+
+# query_group with repeated names
+tmp7 = query_group(['universe', 'close', 'universe'], '2018-01-02')
+print(list(tmp7.index) == ['universe', 'close', 'universe'])
+tmp8 = query_group(['close', 'close'], '2018-01-01', '2018-03-01')
+print(len(tmp8) == 2 * len(query('close', '2018-01-01', '2018-03-01')))
@@ -13,15 +13,18 @@ from os import sep, makedirs, listdir, remove
 import logging
 from shutil import move, rmtree
 
-from datautils import DataView
+import pandas as pd
+
+from datautils import DataView, set_memory_limit
 from tdtools import get_calendar, timeit_wrapper
 from database.const import REL_PATH_SEP
 from pitdata.query import query
 from pitdata.io import get_db_dictionary, move_data, delete_data
-from pitdata.const import CONFIG, LOGGER_NAME, METADATA_FILENAME
-from pitdata.updater.operator import dump_metadata, load_metadata
+from pitdata.const import CONFIG, LOGGER_NAME, METADATA_FILENAME, PROFILE_FILENAME
+from pitdata.updater.operator import modify_metadata
 from pitdata.updater.loader import load_all, find_data_description
 from pitdata.updater.order import DependencyTree
+from pitdata.updater.profiler import load_profile, summarize_profile, find_critical_path
 
 # --------------------------------------------------------------------------------------------------
 # 预处理
@@ -35,11 +38,15 @@ class PITDataCache(object):
     工厂类，用于生成和获取数据缓存
     数据缓存的唯一标志是：数据名称+数据的预加载数量
 
+    所有缓存共享datautils中的全局内存预算(上限由配置中的cache_memory_limit设置)，超过上限时按照最近最少使用的顺序
+    裁剪或者清空缓存数据
+
     Example
     -------
     >>> from pitdata.tools import pitcache_getter
     >>> beta_cache = pitcache_getter('BETA', 100)    # pitcache_getter(data_name, preload_num)
     >>> data = beta_cache.get_csdata('2018-04-19')
+    >>> pitcache_getter.stats()    # 各个缓存的命中次数、占用内存等统计数据
     '''
     def __init__(self):
         self.__cache = {} # 修改为类变量，避免多个不同的实例共享__cache数据
@@ -67,10 +74,24 @@ class PITDataCache(object):
             return self.__cache[cache_name]
         else:
             func = lambda st, et: query(name, st, et)
-            cache = DataView(func, get_calendar('stock.sse'), preload_num=preload_num)
+            cache = DataView(func, get_calendar('stock.sse'), preload_num=preload_num, name=cache_name)
             self.__cache[cache_name] = cache
             return cache
 
+    def stats(self):
+        '''
+        获取所有缓存的统计数据
+
+        Return
+        ------
+        out: pandas.DataFrame
+            index为缓存名称，columns为[hits, misses, trims, evictions, nbytes, start_time, end_time]
+        '''
+        columns = ['hits', 'misses', 'trims', 'evictions', 'nbytes', 'start_time', 'end_time']
+        return pd.DataFrame({n: c.stats for n, c in self.__cache.items()}, index=columns).T
+
+if CONFIG.get('cache_memory_limit') is not None:    # 配置中的单位为MB
+    set_memory_limit(int(CONFIG['cache_memory_limit'] * 1024 * 1024))
 pitcache_getter = PITDataCache()    # 此处并未将类设计成单例模式，考虑到可以由很多独立的缓存，但提供一个常用的缓存
 
 # --------------------------------------------------------------------------------------------------
@@ -163,11 +184,10 @@ def move_computing_file(name, dest):
         logger.info('[Operation=move_computing_file, Info=\"Moving data from {s} to {d}.\"]'.format(s=source_relpath, d=dest))
         delete_empty_folder(dirname(source_abspath))
         if dest_name != name:    # 新数据的名称与原数据不同，需要修改数据库中元数据文件
-            metadata = load_metadata(METADATA_FILENAME)
-            mdata = metadata[name]
-            del metadata[name]
-            metadata[dest_name] = mdata
-            dump_metadata(metadata, METADATA_FILENAME)
+            def rename(metadata):
+                metadata[dest_name] = metadata.pop(name)
+
+            modify_metadata(METADATA_FILENAME, rename)
     except Exception as e:
         logger.exception(e)
         return False
@@ -207,9 +227,7 @@ def delete_computing_file(name, delete_branch=True):
         delete_data(data_relpath, all_data[name]['datatype'])
         logger.info('[Operation=delete_computing_file, Info=\"Delete data(path={}) successfully.\"]'.format(data_relpath))
         delete_empty_folder(dirname(data_abspath))
-        metadata = load_metadata(METADATA_FILENAME)
-        del metadata[name]
-        dump_metadata(metadata, METADATA_FILENAME)
+        modify_metadata(METADATA_FILENAME, lambda metadata: metadata.pop(name))
     except Exception as e:
         logger.exception(e)
         return False
@@ -245,9 +263,7 @@ def delete_db_data(name, delete_branch=True):
     try:
         delete_data(data_path, all_data[name]['datatype'])
         logger.info('[Operation=delete_db_data, Info=\"Delete data(path={}) successfully.\"]'.format(data_path))
-        metadata = load_metadata(METADATA_FILENAME)
-        del metadata[name]
-        dump_metadata(metadata, METADATA_FILENAME)
+        modify_metadata(METADATA_FILENAME, lambda metadata: metadata.pop(name))
     except Exception as e:
         logger.exception(e)
         return False
@@ -299,3 +315,36 @@ def list_branch(name):
     '''
     tree = DependencyTree(load_all())
     return sorted(tree.get_branch(name))
+
+def profile_report(run_id=None, top=10, show=True):
+    '''
+    根据数据更新的性能记录生成报告，包括耗时最长的数据以及依赖图中的关键路径(决定并发更新总耗时下限的依赖链)
+
+    Parameter
+    ---------
+    run_id: string, default None
+        更新批次的标识(即性能记录中的run_id)，None表示最后一次更新
+    top: int, default 10
+        列举耗时最长的数据的数量
+    show: boolean, default True
+        是否打印报告
+
+    Return
+    ------
+    out: dict
+        格式为{'run_id': run_id, 'summary': 按照数据汇总的性能记录(pandas.DataFrame，按照耗时降序排列),
+        'critical_path': 关键路径上的数据名称列表, 'critical_path_seconds': 关键路径的总耗时}
+    '''
+    records = load_profile(join(CONFIG['db_path'], PROFILE_FILENAME), run_id)
+    summary = summarize_profile(records)
+    dependency = {r['data_name']: r['dependency'] for r in records}
+    path, seconds = find_critical_path(summary['total_seconds'].to_dict(), dependency)
+    out = {'run_id': records[-1]['run_id'] if records else run_id, 'summary': summary,
+           'critical_path': path, 'critical_path_seconds': seconds}
+    if show:
+        print('Run: {}'.format(out['run_id']))
+        print('Total time: {:.2f}s, critical path time: {:.2f}s'.format(summary['total_seconds'].sum(), seconds))
+        print('Critical path: {}'.format(' -> '.join(path)))
+        print('Slowest {} data:'.format(top))
+        print(summary.head(top).to_string())
+    return out
@@ -7,7 +7,8 @@ Github: https://github.com/SAmmer0
 Created: 2018/4/18
 """
 import importlib
-from os import sep, listdir
+import threading
+from os import sep, listdir, stat
 from os.path import isfile as op_isfile
 from os.path import join as op_join
 from collections import deque
@@ -15,11 +16,33 @@ from collections import deque
 from pitdata.const import CONFIG
 from database.const import REL_PATH_SEP
 
+# --------------------------------------------------------------------------------------------------
+# 计算文件缓存，格式为{file_path: ((st_mtime_ns, st_size), dd)}，文件修改时间或者大小变化后重新加载
+_FILE_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
 # --------------------------------------------------------------------------------------------------
 # 功能函数
 
 
-def file2object(file_path):
+def _file_signature(file_path):
+    '''
+    获取文件的签名，用于判断计算文件是否被修改
+
+    Parameter
+    ---------
+    file_path: string
+
+    Return
+    ------
+    out: tuple
+        (st_mtime_ns, st_size)
+    '''
+    st = stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def file2object(file_path, use_cache=True):
     '''
     读取计算文件，将其转化为数据描述类的对象
 
@@ -27,6 +50,8 @@ def file2object(file_path):
     ---------
     file_path: string
         计算文件所在的路径
+    use_cache: boolean, default True
+        若计算文件在上次加载后未被修改，则直接返回上次加载的对象
 
     Return
     ------
@@ -35,8 +60,14 @@ def file2object(file_path):
     Notes
     -----
     计算文件必须要包含一个名为dd的DataDescription对象，所有数据描述对象的名称与其
-    计算文件名称一致
+    计算文件名称一致；缓存仅检查计算文件本身，计算文件导入的其他模块被修改时需要调用clear_cache
     '''
+    signature = _file_signature(file_path)
+    if use_cache:
+        with _CACHE_LOCK:
+            cached = _FILE_CACHE.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
     module_name = file_path.split(sep)[-1].split('.')[0]
     spec = importlib.util.spec_from_file_location(module_name, file_path)
     module = importlib.util.module_from_spec(spec)
@@ -44,17 +75,27 @@ def file2object(file_path):
     obj = getattr(module, 'dd')
     file_name = file_path.split(sep)[-1].split('.')[0]
     obj.set_name(file_name)    # 自动设置数据名称为文件名
+    with _CACHE_LOCK:
+        _FILE_CACHE[file_path] = (signature, obj)
     return obj
 
 
-def load_all():
+def clear_cache():
     '''
-    加载所有计算文件，返回计算文件字典，并检查是否有重复名称的文件，如有则报错
+    清空计算文件缓存，下次加载时重新执行所有计算文件
+    '''
+    with _CACHE_LOCK:
+        _FILE_CACHE.clear()
+
+
+def load_manifest():
+    '''
+    扫描计算文件所在的文件夹，获取所有数据名称对应的计算文件，不执行计算文件，并检查是否有重复名称的文件，如有则报错
 
     Return
     ------
     out: dict
-        数据字典，格式为{name: {'data_description': dd, 'rel_path': rel_path}}
+        格式为{name: {'file_path': abs_path, 'rel_path': rel_path}}
     '''
     root_path = CONFIG['data_description_file_path']
     queue = deque()
@@ -63,12 +104,11 @@ def load_all():
     while len(queue) > 0:
         abs_path, rel_path = queue.pop()
         if op_isfile(abs_path) and abs_path.endswith('.py'):   # 必须是Python可执行文件
-            obj = file2object(abs_path)
-            if obj.name in out:
+            name = abs_path.split(sep)[-1].split('.')[0]
+            if name in out:
                 raise IndexError('Duplicate data name!(duplication={n}, relative_path={rp})'.
-                                 format(n=obj.name, rp=rel_path[1:]))
-            out[obj.name] = {'data_description': obj,
-                             'rel_path': rel_path[1:]}
+                                 format(n=name, rp=rel_path[1:]))
+            out[name] = {'file_path': abs_path, 'rel_path': rel_path[1:]}
         else:
             if abs_path.endswith('__pycache__') or op_isfile(abs_path):    # 忽略Python缓存文件夹以及非Python脚本文件
                 continue
@@ -81,9 +121,32 @@ def load_all():
     return out
 
 
+def load_all():
+    '''
+    加载所有计算文件，返回计算文件字典，并检查是否有重复名称的文件，如有则报错
+
+    Return
+    ------
+    out: dict
+        数据字典，格式为{name: {'data_description': dd, 'rel_path': rel_path}}
+
+    Notes
+    -----
+    仅重新执行新增或者被修改的计算文件，其他计算文件使用缓存的对象
+    '''
+    manifest = load_manifest()
+    out = {name: {'data_description': file2object(msg['file_path']), 'rel_path': msg['rel_path']}
+           for name, msg in manifest.items()}
+    valid_files = set(msg['file_path'] for msg in manifest.values())
+    with _CACHE_LOCK:    # 剔除已经被删除的计算文件
+        for file_path in [f for f in _FILE_CACHE if f not in valid_files]:
+            del _FILE_CACHE[file_path]
+    return out
+
+
 def find_data_description(name):
     '''
-    查找给定名称的数据对应的数据描述对象及相对路径
+    查找给定名称的数据对应的数据描述对象及相对路径，仅执行该数据的计算文件
 
     Parameter
     ---------
@@ -95,6 +158,5 @@ def find_data_description(name):
     dd: pitdata.utils.DataDescription
     rel_path: string
     '''
-    data_dictionary_cache = load_all()
-    res = data_dictionary_cache[name]
-    return res['data_description'], res['rel_path']
+    res = load_manifest()[name]
+    return file2object(res['file_path']), res['rel_path']
@@ -11,13 +11,20 @@ import json
 from collections import deque
 import datetime as dt
 import logging
+import time
 from sys import stdout
 
-from pitdata.const import CONFIG, METADATA_FILENAME, UPDATE_TIME_THRESHOLD, LOGGER_NAME, UPDATING_LOGGER
+from pitdata.const import (CONFIG, METADATA_FILENAME, DEFINITION_METADATA_FILENAME, PROFILE_FILENAME,
+                           UPDATE_TIME_THRESHOLD, LOGGER_NAME, UPDATING_LOGGER)
 from pitdata.updater.loader import load_all
-from pitdata.updater.order import DependencyTree
-from pitdata.io import insert_data
+from pitdata.updater.planner import plan_update
+from pitdata.updater.profiler import MemorySampler, get_data_size, write_profile
+from pitdata.updater.scheduler import DAGScheduler, NodeStatus, ChunkedTask
+from pitdata.io import insert_data, delete_data, get_data_nbytes, db
 from qrtconst import ENCODING
+from database.db import LOCK_FOLDER
+from database.lock import FileLock
+from database.utils import dump_json_atomically
 from tdtools import trans_date, get_calendar
 
 # --------------------------------------------------------------------------------------------------
@@ -26,6 +33,9 @@ from tdtools import trans_date, get_calendar
 logger = logging.getLogger(LOGGER_NAME)
 updating_logger = logging.getLogger(UPDATING_LOGGER)
 
+# 当前更新的数据字典，供工作线程(或者fork方式创建的工作进程)计算数据使用
+_UPDATING_DATA = {}
+
 # --------------------------------------------------------------------------------------------------
 # 功能函数
 def load_metadata(filename):
@@ -53,23 +63,52 @@ def load_metadata(filename):
         metadata[d] = trans_date(v)
     return metadata
 
-def dump_metadata(metadata, filename):
+def modify_metadata(filename, func):
     '''
-    将元数据导入到文件中
+    持有元数据文件的排他锁，重新加载文件中的元数据，使用func修改后写回文件，加载、修改和写入之间
+    其他进程无法提交元数据
 
     Parameter
     ---------
-    metadata: dict
-        元数据
     filename: string
         元数据名称
+    func: function
+        格式为func(metadata)，直接修改传入的元数据字典(例如删除或者重命名其中的数据)
+
+    Return
+    ------
+    metadata: dict
+        修改后的元数据
     '''
     dbpath = CONFIG['db_path']
     file_path = join(dbpath, filename)
-    tobe_dumped = {d: metadata[d].strftime('%Y-%m-%d')
-                   for d in metadata}
-    with open(file_path, 'w', encoding=ENCODING) as f:
-        json.dump(tobe_dumped, f)
+    with FileLock(join(dbpath, LOCK_FOLDER, filename + '.lock')).acquire():
+        metadata = load_metadata(filename)
+        func(metadata)
+        tobe_dumped = {d: metadata[d].strftime('%Y-%m-%d')
+                       for d in metadata}
+        dump_json_atomically(tobe_dumped, file_path, ENCODING)
+    return metadata
+
+def dump_metadata(metadata, filename):
+    '''
+    将元数据导入到文件中，写入时持有元数据文件的排他锁，并与文件中(其他进程写入)的元数据合并，
+    同一数据取较晚的更新时间；删除或者重命名元数据中的数据需要使用modify_metadata，否则被删除的数据
+    会被重新合并回来
+
+    Parameter
+    ---------
+    metadata(inout): dict
+        元数据，合并后的结果会写回该字典
+    filename: string
+        元数据名称
+    '''
+    def merge(file_metadata):
+        for d, update_time in metadata.items():
+            if d not in file_metadata or file_metadata[d] < update_time:
+                file_metadata[d] = update_time
+
+    metadata.update(modify_metadata(filename, merge))
 
 
 def update_single_data(data_msg, start_time, end_time, ut_meta):
@@ -160,26 +199,170 @@ def get_endtime():
         now = now - dt.timedelta(1)    # 若当天还未到给定时间，往前推一个自然日，再计算交易日
     return get_calendar('stock.sse').latest_tradingday(now, 'PAST')
 
-def update_all(show_progress=True):
+def _calculate(data_name, start_time, end_time):
+    '''
+    在工作线程(或者进程)中计算数据
+
+    Parameter
+    ---------
+    data_name: string
+        数据名称
+    start_time: datetime
+        更新的起始时间
+    end_time: datetime
+        更新的终止时间
+
+    Return
+    ------
+    end_time: datetime
+        与参数相同，用于在提交计算结果时更新元数据
+    data: pandas.DataFrame or pandas.Series
+    stats: dict
+        计算的性能记录，格式为{'calc_seconds': 计算耗时, 'peak_rss': 计算期间所在进程的内存峰值,
+        'rss_delta': 内存峰值相对计算开始时的增量}，内存为进程级数据，参见pitdata.updater.profiler
+
+    Notes
+    -----
+    以spawn方式创建的工作进程中不存在当前更新的数据字典，此时会重新加载所有数据描述
+    '''
+    global _UPDATING_DATA
+    if data_name not in _UPDATING_DATA:
+        _UPDATING_DATA = load_all()
+    start = time.perf_counter()
+    with MemorySampler() as sampler:
+        data = _UPDATING_DATA[data_name]['data_description'].calc_method(start_time, end_time)
+    return end_time, data, {'calc_seconds': time.perf_counter() - start, 'peak_rss': sampler.peak,
+                            'rss_delta': sampler.delta}
+
+def make_update_plan(end_time=None, calendar=None):
+    '''
+    根据当前的计算文件和元数据生成增量更新计划
+
+    Parameter
+    ---------
+    end_time: datetime like, default None
+        更新的终止时间，None表示使用get_endtime的结果
+    calendar: tdtools.TradingCalendar, default None
+        用于估计计算成本的交易日历，默认为stock.sse
+
+    Return
+    ------
+    plan: pitdata.updater.planner.UpdatePlan
+    data_dict: dict
+        load_all函数返回的数据字典
+    '''
+    if end_time is None:
+        end_time = get_endtime()
+    data_dict = load_all()
+    plan = plan_update(data_dict, load_metadata(METADATA_FILENAME), load_metadata(DEFINITION_METADATA_FILENAME),
+                       trans_date(end_time), trans_date(CONFIG['data_start_date']), calendar,
+                       CONFIG.get('backfill_freq', None))
+    return plan, data_dict
+
+def update_all(show_progress=True, max_workers=None, executor=None, timeout=None, dry_run=False):
     '''
-    更新所有数据，直至所有数据更新完成或者达到最大循环次数
+    增量更新数据，仅计算更新计划(参见make_update_plan)中的数据，相互之间没有依赖关系的数据并发计算，
+    数据的写入和元数据更新均在主线程中完成；较长的更新区间按照配置中的backfill_freq分段计算，每个分段计算完成后
+    立即写入数据库并记录更新时间，中断后再次更新时从最后一个完成的分段继续
 
     Parameter
     ---------
     show_progress: boolean, default True
         是否显示更新进程
+    max_workers: int, default None
+        并发计算的数量，None表示使用配置中的update_workers
+    executor: string, default None
+        并发方式，thread或者process，None表示使用配置中的update_executor
+    timeout: float, default None
+        单个数据计算的最长时间(秒)，None表示使用配置中的update_timeout
+    dry_run: boolean, default False
+        仅打印更新计划，不计算任何数据
 
     Return
     ------
-    result: boolean
+    result: boolean or pitdata.updater.planner.UpdatePlan
+        dry_run为True时返回更新计划
+
+    Notes
+    -----
+    数据计算失败或者超时时，所有直接或者间接依赖该数据的数据在本次更新中都会被忽略，下次更新时仅重新计算
+    这些数据；需要重新计算的数据(定义发生变化)在开始计算前全部删除；数据之间存在循环依赖时，
+    引发DependencyCycleError，不会更新任何数据
     '''
-    data_dict = load_all()
+    global _UPDATING_DATA
+    if max_workers is None:
+        max_workers = CONFIG.get('update_workers', 1)
+    if executor is None:
+        executor = CONFIG.get('update_executor', 'thread')
+    if timeout is None:
+        timeout = CONFIG.get('update_timeout', None)
+    plan, data_dict = make_update_plan()
+    if dry_run:
+        print(plan)
+        return plan
     ut_meta = load_metadata(METADATA_FILENAME)
-    update_order = [d.name for d in DependencyTree(data_dict).generate_dependency_order()]
-    end_time = get_endtime()
-    default_start_time = trans_date(CONFIG['data_start_date'])
+    def_meta = load_metadata(DEFINITION_METADATA_FILENAME)
     update_result = True
+    run_id = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')    # 本次更新的标识
+    profile_path = join(CONFIG['db_path'], PROFILE_FILENAME) if CONFIG.get('update_profile', True) else None
+
+    def prepare(data_name):
+        item = plan[data_name]
+        parallel = not data_dict[data_name]['data_description'].path_dependent
+        return NodeStatus.PENDING, ChunkedTask([(data_name, st, et) for st, et in item.chunks], parallel)
+
+    def commit(data_name, result):
+        chunk_end_time, data, stats = result
+        dd = data_dict[data_name]['data_description']
+        start_time = ut_meta.get(data_name, plan[data_name].start_time)
+        rel_path = data_dict[data_name]['rel_path']
+        if profile_path is not None:    # 写入的字节数为写入前后数据文件大小的变化
+            nbytes = get_data_nbytes(rel_path)
+        insert_start = time.perf_counter()
+        if data is None or len(data) == 0:    # 分段中没有数据(例如早于数据源的起始时间)，直接推进检查点
+            result = True
+        else:
+            result = insert_data(data, rel_path, dd.datatype)
+        if profile_path is not None:
+            insert_seconds = time.perf_counter() - insert_start
+            rows, columns = get_data_size(data)
+            stats.update(run_id=run_id, data_name=data_name, dependency=list(dd.dependency or ()),
+                         start_time=start_time.strftime('%Y-%m-%d'), end_time=chunk_end_time.strftime('%Y-%m-%d'),
+                         insert_seconds=insert_seconds, rows=rows, columns=columns,
+                         bytes=get_data_nbytes(rel_path) - nbytes, result=result)
+            write_profile(stats, profile_path)
+        updating_logger.info('[data_name={dn}, start_time={st:%Y-%m-%d}, end_time={et:%Y-%m-%d}, result={res}]'.
+                             format(dn=data_name, st=start_time, et=chunk_end_time, res=result))
+        if result:    # 更新成功之后，写入元数据(分段计算时即为检查点)
+            ut_meta[data_name] = chunk_end_time
+            dump_metadata(ut_meta, METADATA_FILENAME)
+            if def_meta.get(data_name) != trans_date(dd.update_time):
+                def_meta[data_name] = trans_date(dd.update_time)
+                dump_metadata(def_meta, DEFINITION_METADATA_FILENAME)
+        return result
+
+    def delete_rebuilt_data():
+        # 删除所有需要重新计算的数据，中断后再次更新时这些数据均作为新数据从头计算
+        rebuilt = [item for item in plan if item.rebuild]
+        for item in rebuilt:
+            d_msg = data_dict[item.name]
+            delete_data(d_msg['rel_path'], d_msg['data_description'].datatype)
+            ut_meta.pop(item.name, None)
+            updating_logger.info('[data_name={dn}, description=\"Data is deleted to be rebuilt({r})\"]'.
+                                 format(dn=item.name, r=item.reason))
+        if rebuilt:
+            def remove_rebuilt(metadata):
+                for item in rebuilt:
+                    metadata.pop(item.name, None)
+
+            ut_meta.update(modify_metadata(METADATA_FILENAME, remove_rebuilt))
+
+    # 不在计划中的依赖项均已是最新，不影响调度
+    graph = {n: [d for d in (data_dict[n]['data_description'].dependency or ()) if d in plan]
+             for n in plan.items}
+    scheduler = DAGScheduler(graph, max_workers, executor, timeout)
     stdout_handler = None    # stdout处理函数占位
+    _UPDATING_DATA = data_dict
     try:
         if show_progress:    # 添加终端打印日志处理函数
             stdout_handler = logging.StreamHandler(stdout)
@@ -187,29 +370,26 @@ def update_all(show_progress=True):
             stdout_handler.setFormatter(formater)
             updating_logger.addHandler(stdout_handler)
 
-        for data_name in update_order:
-            d_msg = data_dict[data_name]
-            if is_test_data(d_msg):  # 不更新处于测试中的数据
-                updating_logger.info('[data_name={dn}, description=\"Testing data will not be updated, ignored\"'.
-                                     format(dn=data_name))
-                continue
-            if not is_dependency_updated(d_msg, ut_meta, end_time):    # 依赖项还未更新，则直接忽视(本次不进行更新)
-                updating_logger.info('[data_name={dn}, description=\"Dependency has not been updated, ignored\"]'.
-                                     format(dn=data_name))
-                continue
-            start_time = ut_meta.get(data_name, default_start_time)
-            if start_time >= end_time:
-                updating_logger.info('[data_name={dn}, description=\"Data has been updated, ignored\"]'.
+        updating_logger.info('[description=\"{n} data to be updated, estimated cost is {c} trading days\"]'.
+                             format(n=len(plan), c=plan.total_cost))
+        for data_name, reason in plan.blocked.items():
+            updating_logger.info('[data_name={dn}, description=\"Data will not be updated({r}), ignored\"]'.
+                                 format(dn=data_name, r=reason))
+        # 更新过程中数据树的变更仅追加到日志中，全部更新完成后一次性写入数据库元数据文件
+        with db.batch():
+            delete_rebuilt_data()
+            status = scheduler.run(prepare, _calculate, commit)
+        for data_name, st in status.items():
+            if st in (NodeStatus.FAILED, NodeStatus.TIMEOUT):
+                updating_logger.info('[data_name={dn}, description=\"Updating failed({st})\"]'.
+                                     format(dn=data_name, st=st.name))
+                update_result = False
+            elif st == NodeStatus.SKIPPED:
+                updating_logger.info('[data_name={dn}, description=\"Dependency failed, ignored\"]'.
                                      format(dn=data_name))
-                continue
-            result = update_single_data(d_msg, start_time, end_time, ut_meta)
-            updating_logger.info('[data_name={dn}, start_time={st:%Y-%m-%d}, end_time={et:%Y-%m-%d}, result={res}]'.
-                                 format(dn=data_name, st=start_time, et=end_time, res=result))
-            if result:    # 更新成功之后，写入元数据
-                dump_metadata(ut_meta, METADATA_FILENAME)
-            else:
                 update_result = False
     finally:
+        _UPDATING_DATA = {}
         if stdout_handler is not None:
             updating_logger.removeHandler(stdout_handler)
     return update_result
@@ -7,6 +7,15 @@ Github: https://github.com/SAmmer0
 Created: 2018/4/18
 """
 from collections import deque
+import heapq
+
+
+class DependencyCycleError(ValueError):
+    '''
+    数据之间存在循环依赖
+    '''
+    pass
+
 
 class DependencyNode(object):
     '''
@@ -52,23 +61,28 @@ class DependencyNode(object):
         Return
         ------
         out: list
-            元素为节点对象
+            元素为节点对象，按照广度优先的顺序排列
         '''
-        queue = deque()
-        queue.append(self)
+        queue = deque(self._children)
+        seen = set()
         out = []
-        while len(queue) > 0:
-            node = queue.pop()
-            for child in node._children:
-                if child not in out:
-                    out.append(child)
-                queue.append(child)
+        while queue:
+            node = queue.popleft()
+            if node.name in seen:
+                continue
+            seen.add(node.name)
+            out.append(node)
+            queue.extend(node._children)
         return out
 
     @property
     def parents(self):
         return self._parents
 
+    @property
+    def children(self):
+        return self._children
+
     def __str__(self):
         return '<DependencyNode: {}>'.format(self.name)
 
@@ -103,29 +117,67 @@ class DependencyTree(object):
             if dep is not None:
                 for dp in dep:
                     self._dep_tree[d].add_parent(self._dep_tree[dp])
+        # 反向邻接表，格式为{name: (child_name, ...)}，依赖树构建完成后不再变化
+        self._children = {n: tuple(c.name for c in node.children) for n, node in self._dep_tree.items()}
+        self._branch_cache = {}
 
     def generate_dependency_order(self):
         '''
-        根据数据之间的依赖关系生成数据的顺序，最终顺序保证任何一个节点的位置一定在其依赖的节点之后，
-        无依赖关系的情况下按照节点的名称排序
+        根据数据之间的依赖关系生成数据的顺序(Kahn算法)，最终顺序保证任何一个节点的位置一定在其依赖的节点之后，
+        同时可以开始的节点按照名称排序
 
         Return
         ------
         order: list
             元素为DependencyNode
+
+        Notes
+        -----
+        若数据之间存在循环依赖，则引发DependencyCycleError，错误信息中包含依赖环的路径
         '''
-        dep_data = sorted(self._dep_tree.values(), key=lambda x: x.name)
+        in_degree = {n: len(set(p.name for p in node.parents)) for n, node in self._dep_tree.items()}
+        heap = [n for n, c in in_degree.items() if c == 0]
+        heapq.heapify(heap)
         order = []
-        def add_node(node, container):
-            # 先递归添加该节点的依赖节点，再添加该节点
-            if node not in container:
-                for p in node.parents:
-                    add_node(p, container)
-                container.append(node)
-        for node in dep_data:
-            add_node(node, order)
+        while heap:
+            name = heapq.heappop(heap)
+            order.append(self._dep_tree[name])
+            for child in set(self._children[name]):
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    heapq.heappush(heap, child)
+        if len(order) < len(self._dep_tree):
+            cycle = self._find_cycle([n for n, c in in_degree.items() if c > 0])
+            raise DependencyCycleError('Cyclic dependency detected: {}!'.format(' -> '.join(cycle)))
         return order
 
+    def _find_cycle(self, candidates):
+        '''
+        在给定的节点中查找一个依赖环
+
+        Parameter
+        ---------
+        candidates: list
+            拓扑排序后仍有依赖项未完成的节点名称，这些节点一定位于依赖环上或者依赖于某个环
+
+        Return
+        ------
+        cycle: list
+            依赖环的路径，首尾为同一节点，且每个节点依赖于其前一个节点
+        '''
+        candidates = set(candidates)
+        # 在剩余节点中沿依赖项回溯，由于每个剩余节点都至少有一个剩余的依赖项，回溯一定会遇到重复节点
+        node = min(candidates)
+        path = []
+        position = {}
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = min(p.name for p in self._dep_tree[node].parents if p.name in candidates)
+        cycle = path[position[node]:] + [node]
+        cycle.reverse()
+        return cycle
+
     def get_branch(self, name):
         '''
         获取所有对给定节点具有(直接或者间接)依赖的数据的名称(包括该节点)
@@ -138,8 +190,19 @@ class DependencyTree(object):
         Return
         ------
         out: list
+            按照广度优先的顺序排列，最后一个元素为该节点
         '''
-        out = self._dep_tree[name].get_descendant()
-        out = [d.name for d in out]
-        out.append(name)
-        return out
+        if name not in self._branch_cache:
+            queue = deque(self._children[name])
+            seen = set()
+            out = []
+            while queue:
+                child = queue.popleft()
+                if child in seen:
+                    continue
+                seen.add(child)
+                out.append(child)
+                queue.extend(self._children[child])
+            out.append(name)
+            self._branch_cache[name] = tuple(out)
+        return list(self._branch_cache[name])
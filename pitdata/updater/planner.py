@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/15
+
+增量更新计划，根据更新时间元数据和数据定义时间计算需要更新的最小数据集合
+"""
+from collections import OrderedDict
+
+from pitdata.updater.order import DependencyTree
+from tdtools import trans_date, get_calendar
+
+# --------------------------------------------------------------------------------------------------
+# 常量
+# 数据需要更新的原因
+REASON_NEW = 'new'    # 数据库中没有该数据
+REASON_OUTDATED = 'outdated'    # 数据未更新到最新时间
+REASON_REDEFINED = 'redefined'    # 数据定义(DataDescription.update_time)晚于计算数据时使用的定义，需要重新计算
+REASON_UPSTREAM_REDEFINED = 'upstream_redefined'    # 依赖项需要重新计算
+REBUILD_REASONS = (REASON_REDEFINED, REASON_UPSTREAM_REDEFINED)
+
+# --------------------------------------------------------------------------------------------------
+# 类
+class PlanItem(object):
+    '''
+    单个数据的更新计划
+
+    Parameter
+    ---------
+    name: string
+        数据名称
+    reason: string
+        需要更新的原因
+    start_time: datetime
+        更新的起始时间
+    end_time: datetime
+        更新的终止时间
+    cost: int
+        估计的计算成本，即需要计算的交易日数量
+    chunks: list, default None
+        分段计算的时间区间，元素为(start_time, end_time)，None表示不分段
+    '''
+    def __init__(self, name, reason, start_time, end_time, cost, chunks=None):
+        self.name = name
+        self.reason = reason
+        self.start_time = start_time
+        self.end_time = end_time
+        self.cost = cost
+        if chunks is None:
+            chunks = [(start_time, end_time)]
+        self.chunks = chunks
+
+    @property
+    def rebuild(self):
+        '''
+        是否需要删除已有数据后重新计算
+        '''
+        return self.reason in REBUILD_REASONS
+
+    def __str__(self):
+        return '{n:<30} {r:<20} {st:%Y-%m-%d} -> {et:%Y-%m-%d} {c:>6} {k:>3} chunk(s)'.format(
+            n=self.name, r=self.reason, st=self.start_time, et=self.end_time, c=self.cost, k=len(self.chunks))
+
+    def __repr__(self):
+        return 'PlanItem({n!r}, {r!r}, {st!r}, {et!r}, {c!r})'.format(
+            n=self.name, r=self.reason, st=self.start_time, et=self.end_time, c=self.cost)
+
+
+class UpdatePlan(object):
+    '''
+    更新计划，包含所有需要更新的数据(按照依赖顺序排列)以及无法更新的数据
+
+    Parameter
+    ---------
+    end_time: datetime
+        本次更新的终止时间
+    '''
+    def __init__(self, end_time):
+        self.end_time = end_time
+        self._items = OrderedDict()
+        self._blocked = OrderedDict()
+
+    def add(self, item):
+        '''
+        添加需要更新的数据
+
+        Parameter
+        ---------
+        item: PlanItem
+        '''
+        self._items[item.name] = item
+
+    def block(self, name, reason):
+        '''
+        添加本次无法更新的数据
+
+        Parameter
+        ---------
+        name: string
+            数据名称
+        reason: string
+            无法更新的原因
+        '''
+        self._blocked[name] = reason
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def blocked(self):
+        return self._blocked
+
+    @property
+    def total_cost(self):
+        return sum(item.cost for item in self._items.values())
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, name):
+        return self._items[name]
+
+    def __str__(self):
+        lines = ['Update plan(end_time={et:%Y-%m-%d}, data={n}, estimated cost={c} trading days)'.
+                 format(et=self.end_time, n=len(self), c=self.total_cost)]
+        lines.extend(str(item) for item in self)
+        for name, reason in self._blocked.items():
+            lines.append('{n:<30} blocked: {r}'.format(n=name, r=reason))
+        return '\n'.join(lines)
+
+# --------------------------------------------------------------------------------------------------
+# 功能函数
+def split_chunks(start_time, end_time, freq, calendar):
+    '''
+    按照交易日历的周期将时间区间切分为多个分段，每个分段的终止时间为周期的最后一个交易日，
+    下一个分段的起始时间与上一个分段的终止时间相同(与增量更新时起始时间的处理方式一致)
+
+    Parameter
+    ---------
+    start_time: datetime
+        起始时间
+    end_time: datetime
+        终止时间
+    freq: string or tdtools.Frequency
+        分段的周期，[WEEKLY, MONTHLY, YEARLY]，None表示不分段
+    calendar: tdtools.TradingCalendar
+        交易日历
+
+    Return
+    ------
+    chunks: list
+        元素为(start_time, end_time)
+    '''
+    if freq is None:
+        return [(start_time, end_time)]
+    boundaries = [t for t in calendar.get_cycle_targets(start_time, end_time, freq, 'LAST')
+                  if start_time < t < end_time]
+    boundaries.append(end_time)
+    chunks = []
+    for t in boundaries:
+        chunks.append((start_time, t))
+        start_time = t
+    return chunks
+
+def plan_update(data_dict, ut_meta, def_meta, end_time, default_start_time, calendar=None, chunk_freq=None):
+    '''
+    计算需要更新的数据集合，已经是最新的数据不会出现在计划中
+
+    数据需要更新的情况包括:
+    1. 数据库中没有该数据，或者数据未更新到end_time
+    2. 数据定义的时间(DataDescription.update_time)晚于计算该数据时记录的定义时间，此时需要删除已有数据并重新计算，
+       所有直接或者间接依赖该数据的数据也都需要重新计算
+
+    Parameter
+    ---------
+    data_dict: dict
+        load_all函数返回的数据字典，格式为{name: {'data_description': dd, 'rel_path': rel_path}}
+    ut_meta: dict
+        更新时间元数据，格式为{name: update_time}
+    def_meta: dict
+        计算数据时使用的数据定义的时间，格式为{name: definition_time}，没有记录的数据视为使用当前定义计算
+    end_time: datetime
+        更新的终止时间
+    default_start_time: datetime
+        数据库中没有的数据或者需要重新计算的数据的起始时间
+    calendar: tdtools.TradingCalendar, default None
+        用于估计计算成本和分段的交易日历，默认为stock.sse
+    chunk_freq: string, default None
+        分段计算的周期，参见split_chunks，None表示不分段
+
+    Return
+    ------
+    plan: UpdatePlan
+
+    Notes
+    -----
+    处于测试中的数据以及依赖这些数据的数据被标记为无法更新(UpdatePlan.blocked)
+    '''
+    if calendar is None:
+        calendar = get_calendar('stock.sse')
+    plan = UpdatePlan(end_time)
+    for node in DependencyTree(data_dict).generate_dependency_order():
+        name = node.name
+        dd = data_dict[name]['data_description']
+        dependency = dd.dependency or ()
+        if dd.in_test:
+            plan.block(name, 'testing data')
+            continue
+        blocked = [d for d in dependency if d in plan.blocked]
+        if blocked:
+            plan.block(name, 'dependency({}) blocked'.format(', '.join(blocked)))
+            continue
+        if name not in ut_meta:
+            reason = REASON_NEW
+        elif def_meta.get(name) is not None and trans_date(dd.update_time) > def_meta[name]:
+            reason = REASON_REDEFINED
+        elif any(d in plan and plan[d].rebuild for d in dependency):
+            reason = REASON_UPSTREAM_REDEFINED
+        elif ut_meta[name] < end_time:
+            reason = REASON_OUTDATED
+        else:
+            continue
+        if reason == REASON_OUTDATED:
+            start_time = ut_meta[name]
+            cost = calendar.count(start_time, end_time, 'right')
+        else:
+            start_time = default_start_time
+            cost = calendar.count(start_time, end_time)
+        plan.add(PlanItem(name, reason, start_time, end_time, cost,
+                          split_chunks(start_time, end_time, chunk_freq, calendar)))
+    return plan
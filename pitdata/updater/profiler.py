@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/16
+
+数据更新性能记录，每次提交计算结果时以JSON行的形式记录计算和写入的耗时、数据规模、写入的字节数以及计算期间的内存
+
+Notes
+-----
+内存为计算期间在后台线程中采样得到的进程级数据(peak_rss为进程常驻内存的峰值，rss_delta为峰值相对计算开始时的增量)，
+使用线程执行更新(update_executor为"thread")且同时运行多个计算时，其他计算占用的内存也会计入，仅在使用进程执行或者
+单个工作线程时能够准确反映单个数据的内存占用
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from os.path import exists
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import pandas as pd
+
+from pitdata.updater.order import DependencyTree
+from qrtconst import ENCODING
+
+# --------------------------------------------------------------------------------------------------
+# 预处理
+_WRITE_LOCK = threading.Lock()
+
+# --------------------------------------------------------------------------------------------------
+# 功能函数
+def get_current_rss():
+    '''
+    获取当前进程的常驻内存(RSS)，优先使用psutil，否则读取/proc/self/statm(Linux)
+
+    Return
+    ------
+    out: int
+        常驻内存(字节)，无法获取时返回None
+    '''
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemorySampler(object):
+    '''
+    在后台线程中定时采样当前进程的常驻内存，记录一段代码运行期间的内存峰值以及相对开始时的增量
+
+    使用方法如下:
+    >>> with MemorySampler() as sampler:
+    ...     data = calc_method(start_time, end_time)
+    >>> sampler.peak, sampler.delta
+
+    Parameter
+    ---------
+    interval: float, default 0.05
+        采样间隔(秒)
+    '''
+    def __init__(self, interval=0.05):
+        self._interval = interval
+        self._start = None
+        self._peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = get_current_rss()
+        if rss is not None and rss > self._peak:
+            self._peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def __enter__(self):
+        self._start = self._peak = get_current_rss()
+        if self._start is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    @property
+    def peak(self):
+        '''
+        运行期间的内存峰值(字节)，无法获取时为None
+        '''
+        return self._peak
+
+    @property
+    def delta(self):
+        '''
+        内存峰值相对开始时的增量(字节)，无法获取时为None
+        '''
+        if self._start is None:
+            return None
+        return self._peak - self._start
+
+
+def get_data_size(data):
+    '''
+    获取数据的行数和列数
+
+    Parameter
+    ---------
+    data: pandas.DataFrame or pandas.Series
+
+    Return
+    ------
+    rows: int
+    columns: int
+    '''
+    if isinstance(data, pd.DataFrame):
+        return data.shape[0], data.shape[1]
+    if isinstance(data, pd.Series):
+        return len(data), 1
+    return 0, 0
+
+def write_profile(record, file_path):
+    '''
+    将一条性能记录追加到文件中
+
+    Parameter
+    ---------
+    record: dict
+        性能记录，需要能够被转换为JSON
+    file_path: string
+        记录文件的路径
+    '''
+    line = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    with _WRITE_LOCK:
+        with open(file_path, 'a', encoding=ENCODING) as f:
+            f.write(line + '\n')
+
+def load_profile(file_path, run_id=None):
+    '''
+    加载性能记录，忽略无法解析的行
+
+    Parameter
+    ---------
+    file_path: string
+        记录文件的路径
+    run_id: string, default None
+        更新批次的标识，None表示最后一次更新
+
+    Return
+    ------
+    records: list
+        元素为dict
+    '''
+    if not exists(file_path):
+        return []
+    records = []
+    with open(file_path, 'r', encoding=ENCODING) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    if not records:
+        return records
+    if run_id is None:
+        run_id = records[-1]['run_id']
+    return [r for r in records if r['run_id'] == run_id]
+
+def summarize_profile(records):
+    '''
+    将分段的性能记录按照数据汇总
+
+    Parameter
+    ---------
+    records: list
+        load_profile的结果
+
+    Return
+    ------
+    out: pandas.DataFrame
+        index为数据名称，columns为[calc_seconds, insert_seconds, total_seconds, rows, columns, bytes,
+        peak_rss, rss_delta, chunks]，按照total_seconds降序排列，bytes为写入数据库的字节数
+    '''
+    columns = ['calc_seconds', 'insert_seconds', 'total_seconds', 'rows', 'columns', 'bytes', 'peak_rss',
+               'rss_delta', 'chunks']
+    if not records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(records)
+    for col in ('bytes', 'peak_rss', 'rss_delta'):    # 早期或者无法获取内存时的记录
+        if col not in df:
+            df[col] = None
+    df['total_seconds'] = df['calc_seconds'] + df['insert_seconds']
+    df['chunks'] = 1
+    out = df.groupby('data_name').agg({'calc_seconds': 'sum', 'insert_seconds': 'sum', 'total_seconds': 'sum',
+                                       'rows': 'sum', 'columns': 'max', 'bytes': 'sum', 'peak_rss': 'max',
+                                       'rss_delta': 'max', 'chunks': 'sum'})
+    return out.loc[:, columns].sort_values('total_seconds', ascending=False)
+
+def find_critical_path(durations, dependency):
+    '''
+    计算依赖图中的关键路径，即耗时总和最长的依赖链
+
+    Parameter
+    ---------
+    durations: dict
+        格式为{name: seconds}，不在其中的节点耗时视为0
+    dependency: dict
+        格式为{name: parents}，parents为依赖项名称的可迭代对象(或者None)
+
+    Return
+    ------
+    path: list
+        关键路径上的节点名称，按照依赖顺序排列
+    seconds: float
+        关键路径的总耗时
+    '''
+    nodes = set(dependency).union(durations)
+    dep = {n: [p for p in (dependency.get(n) or ()) if p in nodes] for n in nodes}
+    finish = OrderedDict()    # {name: (最早完成时间, 关键前驱)}
+    for node in DependencyTree(dep, lambda x: x).generate_dependency_order():
+        parents = dep[node.name]
+        prev = max(parents, key=lambda p: finish[p][0]) if parents else None
+        start = finish[prev][0] if prev is not None else 0.
+        finish[node.name] = (start + durations.get(node.name, 0.), prev)
+    if not finish:
+        return [], 0.
+    name = max(finish, key=lambda n: finish[n][0])
+    seconds = finish[name][0]
+    path = []
+    while name is not None:
+        path.append(name)
+        name = finish[name][1]
+    path.reverse()
+    return path, seconds
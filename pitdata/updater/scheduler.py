@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/13
+
+依赖图调度器，在线程池或者进程池中并发执行没有依赖关系的节点
+"""
+import enum
+import logging
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from pitdata.const import LOGGER_NAME
+
+# --------------------------------------------------------------------------------------------------
+# 预处理
+logger = logging.getLogger(LOGGER_NAME)
+
+# --------------------------------------------------------------------------------------------------
+# 常量
+class NodeStatus(enum.Enum):
+    PENDING = enum.auto()    # 等待依赖项完成
+    RUNNING = enum.auto()    # 正在计算
+    SUCCEEDED = enum.auto()    # 计算完成(或者无需计算)
+    FAILED = enum.auto()    # 计算或者提交失败
+    TIMEOUT = enum.auto()    # 计算超时
+    SKIPPED = enum.auto()    # 被忽略(包括依赖项失败或者被忽略)
+
+EXECUTOR_MAP = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+# --------------------------------------------------------------------------------------------------
+# 类
+class ChunkedTask(object):
+    '''
+    由多个分段组成的节点计算任务，由prepare返回，所有分段的结果按照分段顺序依次调用commit
+
+    Parameter
+    ---------
+    chunks: list
+        元素为各个分段调用calculate的参数(tuple)
+    parallel: boolean, default False
+        分段之间是否可以并发计算，False表示上一个分段提交之后才开始计算下一个分段
+    '''
+    def __init__(self, chunks, parallel=False):
+        if not chunks:
+            raise ValueError('At least one chunk is required!')
+        self.chunks = list(chunks)
+        self.parallel = parallel
+
+
+class _TaskState(object):
+    '''
+    正在计算的节点的分段状态
+
+    Parameter
+    ---------
+    task: ChunkedTask
+    '''
+    def __init__(self, task):
+        self.task = task
+        self.next_submit = 0    # 下一个需要提交计算的分段
+        self.next_commit = 0    # 下一个需要调用commit的分段
+        self.running = 0    # 正在计算的分段数量
+        self.results = {}    # 已经完成计算但尚未调用commit的分段结果
+
+    def can_submit(self, max_workers):
+        '''
+        是否可以提交下一个分段，并发计算时已完成但未提交的分段数量不超过max_workers，避免占用过多内存
+        '''
+        if self.next_submit >= len(self.task.chunks):
+            return False
+        if self.task.parallel:
+            return self.next_submit < self.next_commit + max_workers
+        return self.running == 0 and not self.results
+
+    @property
+    def finished(self):
+        return self.next_commit == len(self.task.chunks)
+
+
+class DAGScheduler(object):
+    '''
+    依赖图调度器，节点的所有依赖项(图中的母节点)都成功完成后，该节点才会被执行，没有依赖关系的节点在线程池
+    或者进程池中并发计算；节点失败、超时或者被忽略时，其所有的后代节点都会被忽略
+
+    每个节点的执行分为三步:
+    prepare(name): 在主线程中调用，返回(status, args)，status为NodeStatus.PENDING时表示需要计算，
+        NodeStatus.SUCCEEDED表示无需计算(例如数据已经是最新)，NodeStatus.SKIPPED表示忽略该节点；
+        args为calculate的参数(tuple)，或者ChunkedTask表示分段计算
+    calculate(*args): 在工作线程(或者进程)中调用，返回计算结果
+    commit(name, result): 在主线程中调用，处理计算结果，返回是否成功；分段计算时每个分段调用一次
+
+    Parameter
+    ---------
+    graph: dict
+        格式为{name: parents}，parents为依赖项名称的可迭代对象(或者None)，不在graph中的依赖项不影响调度，
+        需要由prepare自行判断
+    max_workers: int, default 1
+        最大并发数量
+    executor: string, default 'thread'
+        并发方式，thread表示线程池，process表示进程池(calculate及其参数、结果必须能够被pickle)
+    timeout: float, default None
+        单次calculate的最长时间(秒)，分段计算时对每个分段分别计时，None表示不限制
+
+    Notes
+    -----
+    超时的节点会被标记为NodeStatus.TIMEOUT，其计算结果会被丢弃，但已经开始的计算无法被中断，
+    会继续在原有的线程池(或者进程池)中运行直至计算结束，后续节点在新的线程池中计算
+    '''
+    def __init__(self, graph, max_workers=1, executor='thread', timeout=None):
+        if executor not in EXECUTOR_MAP:
+            raise ValueError('Unsupported executor({}), valids are {}!'.format(executor, list(EXECUTOR_MAP)))
+        if max_workers < 1:
+            raise ValueError('Parameter "max_workers" must be positive!')
+        self._parents = {n: tuple(p for p in (parents or ()) if p in graph) for n, parents in graph.items()}
+        self._children = {n: [] for n in graph}
+        for n in sorted(graph):
+            for p in self._parents[n]:
+                self._children[p].append(n)
+        self._max_workers = max_workers
+        self._executor = executor
+        self._timeout = timeout
+        self._status = None
+
+    def run(self, prepare, calculate, commit):
+        '''
+        执行所有节点
+
+        Parameter
+        ---------
+        prepare: function(name)->(NodeStatus, tuple or ChunkedTask)
+        calculate: function(*args)->object
+        commit: function(name, result)->boolean
+
+        Return
+        ------
+        status: dict
+            格式为{name: NodeStatus}
+        '''
+        self._status = {n: NodeStatus.PENDING for n in self._parents}
+        remaining = {n: len(p) for n, p in self._parents.items()}
+        ready = deque(sorted(n for n, c in remaining.items() if c == 0))
+        tasks = OrderedDict()    # {name: _TaskState}，按照开始计算的顺序排列
+        running = {}    # {future: (name, chunk_index, deadline)}
+        pool = EXECUTOR_MAP[self._executor](max_workers=self._max_workers)
+        retired = []    # 仍有被放弃的计算在运行而不再使用的线程池(或进程池)
+
+        def submit(name, state):
+            while len(running) < self._max_workers and state.can_submit(self._max_workers):
+                idx = state.next_submit
+                deadline = None if self._timeout is None else time.monotonic() + self._timeout
+                running[pool.submit(calculate, *state.task.chunks[idx])] = (name, idx, deadline)
+                state.next_submit += 1
+                state.running += 1
+
+        def close(name, status):
+            # 结束节点，放弃该节点所有正在计算的分段，返回是否有无法取消的计算
+            tasks.pop(name, None)
+            stuck = False
+            for future in [f for f, v in running.items() if v[0] == name]:
+                del running[future]
+                stuck = not future.cancel() or stuck
+            ready.extend(self._finish(name, status, remaining))
+            return stuck
+
+        try:
+            while ready or running or tasks:
+                for name, state in list(tasks.items()):    # 优先计算已经开始的节点的后续分段，尽早释放内存
+                    submit(name, state)
+                while ready and len(running) < self._max_workers:
+                    name = ready.popleft()
+                    try:
+                        status, args = prepare(name)
+                    except Exception as e:
+                        logger.exception(e)
+                        status = NodeStatus.FAILED
+                    if status == NodeStatus.PENDING:
+                        state = _TaskState(args if isinstance(args, ChunkedTask) else ChunkedTask([args]))
+                        tasks[name] = state
+                        self._status[name] = NodeStatus.RUNNING
+                        submit(name, state)
+                    else:
+                        ready.extend(self._finish(name, status, remaining))
+                if not running:
+                    continue
+                deadlines = [d for _, _, d in running.values() if d is not None]
+                wait_time = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                done, _ = wait(list(running), timeout=wait_time, return_when=FIRST_COMPLETED)
+                stuck = False
+                for future in done:
+                    if future not in running:    # 同一节点的其他分段失败，结果已被放弃
+                        continue
+                    name, idx, _ = running.pop(future)
+                    state = tasks[name]
+                    state.running -= 1
+                    result = True
+                    try:
+                        state.results[idx] = future.result()
+                        while result and state.next_commit in state.results:
+                            result = commit(name, state.results.pop(state.next_commit))
+                            state.next_commit += 1
+                    except Exception as e:
+                        logger.exception(e)
+                        result = False
+                    if not result:
+                        stuck = close(name, NodeStatus.FAILED) or stuck
+                    elif state.finished:
+                        close(name, NodeStatus.SUCCEEDED)
+                now = time.monotonic()
+                for future, (name, _, deadline) in list(running.items()):
+                    if future in running and deadline is not None and deadline <= now:
+                        logger.warning('[Operation=DAGScheduler.run, Info=\"Calculating {n} timeout({t}s)!\"]'.
+                                       format(n=name, t=self._timeout))
+                        stuck = close(name, NodeStatus.TIMEOUT) or stuck
+                if stuck:
+                    # 被放弃的计算仍然占用工作线程，后续计算提交到新的线程池中，避免排队等待导致超时
+                    retired.append(pool)
+                    pool = EXECUTOR_MAP[self._executor](max_workers=self._max_workers)
+        finally:
+            for p in retired + [pool]:
+                p.shutdown(wait=False)
+        return dict(self._status)
+
+    def _finish(self, name, status, remaining):
+        '''
+        设置节点的最终状态，成功时返回所有依赖项均已完成的子节点，否则将所有后代节点设置为忽略
+
+        Parameter
+        ---------
+        name: string
+            节点名称
+        status: NodeStatus
+            节点的最终状态
+        remaining(inout): dict
+            各个节点尚未完成的依赖项数量
+
+        Return
+        ------
+        out: list
+            可以开始执行的子节点
+        '''
+        self._status[name] = status
+        if status == NodeStatus.SUCCEEDED:
+            out = []
+            for child in self._children[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    out.append(child)
+            return out
+        queue = deque(self._children[name])
+        while queue:
+            child = queue.popleft()
+            if self._status[child] == NodeStatus.PENDING:
+                self._status[child] = NodeStatus.SKIPPED
+                logger.info('[Operation=DAGScheduler._finish, Info=\"Skip {c} because {n} is {s}.\"]'.
+                            format(c=child, n=name, s=status.name))
+                queue.extend(self._children[child])
+        return []
+
+    @property
+    def status(self):
+        return self._status
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/15
+
+分段回填测试，数据源的起始时间晚于data_start_date时，早期的分段没有数据，检查这些分段不会导致更新失败
+"""
+import datetime as dt
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+
+from pitdata.const import CONFIG, DataType
+CONFIG['db_path'] = mkdtemp()
+CONFIG['data_start_date'] = '2018-01-01'
+CONFIG['backfill_freq'] = 'MONTHLY'
+CONFIG['update_profile'] = False
+from pitdata.utils import DataDescription
+from pitdata.updater import operator, planner
+
+
+class DailyCalendar(object):
+    # 以自然日作为交易日
+    def count(self, start_time, end_time, include_type='both'):
+        days = len(pd.date_range(start_time, end_time))
+        if include_type in ('left', 'right'):
+            days -= 1
+        return days
+
+    def get_cycle_targets(self, start_time, end_time, freq, target):
+        # 每个月的最后一天
+        return [d for d in pd.date_range(start_time, end_time, freq='M')]
+
+
+source_start = dt.datetime(2018, 3, 10)    # 数据源的起始时间
+calls = []
+
+
+def late_calc(start_time, end_time):
+    calls.append((start_time, end_time))
+    index = pd.date_range(max(start_time, source_start), end_time)
+    return pd.DataFrame(np.ones((len(index), 3)), index=index, columns=list('abc'))
+
+
+def child_calc(start_time, end_time):
+    index = pd.date_range(start_time, end_time)
+    return pd.DataFrame(np.full((len(index), 3), 2.), index=index, columns=list('abc'))
+
+
+def load_all():
+    out = {}
+    for name, calc, dep in [('late', late_calc, None), ('child', child_calc, ['late'])]:
+        dd = DataDescription(calc, '2018-01-01', DataType.PANEL_NUMERIC, dep)
+        dd.set_name(name)
+        out[name] = {'data_description': dd, 'rel_path': 'test.' + name}
+    return out
+
+
+planner.get_calendar = lambda name: DailyCalendar()
+operator.load_all = load_all
+operator.get_endtime = lambda: dt.datetime(2018, 4, 15)
+
+# 前两个分段没有数据，更新成功且元数据更新到终止时间
+print(operator.update_all(show_progress=False))
+print(len(calls) == 4)
+ut_meta = operator.load_metadata(operator.METADATA_FILENAME)
+print(ut_meta['late'] == dt.datetime(2018, 4, 15) and ut_meta['child'] == dt.datetime(2018, 4, 15))
+
+# 再次更新时不会重新计算
+print(operator.update_all(show_progress=False) and len(calls) == 4)
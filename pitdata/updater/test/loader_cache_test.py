@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/14
+"""
+import tempfile
+import time
+from os import makedirs, remove
+from os.path import join
+
+from pitdata.const import CONFIG
+from pitdata.updater import loader
+
+CALC_FILE = '''
+from pitdata.utils import DataDescription
+from pitdata.const import DataType
+{record}
+dd = DataDescription(lambda s, e: None, '2018-05-14', DataType.PANEL_NUMERIC, {dep})
+'''
+
+root = tempfile.mkdtemp()
+makedirs(join(root, 'group'))
+# 每执行一次计算文件，在对应的记录文件中追加一行
+def write_calc_file(path, dep=None):
+    record = 'open(r"{}.record", "a").write("1")'.format(path)
+    with open(path, 'w') as f:
+        f.write(CALC_FILE.format(record=record, dep=dep))
+
+def exec_count(path):
+    with open(path + '.record') as f:
+        return len(f.read())
+
+file_a = join(root, 'data_a.py')
+file_b = join(root, 'group', 'data_b.py')
+write_calc_file(file_a)
+write_calc_file(file_b, ['data_a'])
+CONFIG['data_description_file_path'] = root
+
+# --------------------------------------------------------------------------------------------------
+# 清单与缓存
+manifest = loader.load_manifest()
+print(manifest['data_b']['rel_path'] == 'group.data_b')
+res = loader.load_all()
+print(res['data_b']['data_description'].dependency == ('data_a', ))
+res = loader.load_all()
+print(exec_count(file_a) == 1 and exec_count(file_b) == 1)
+dd, rel_path = loader.find_data_description('data_a')
+print(dd.name == 'data_a' and rel_path == 'data_a' and exec_count(file_a) == 1)
+
+# 仅重新执行被修改的文件
+time.sleep(0.01)
+write_calc_file(file_b)
+res = loader.load_all()
+print(res['data_b']['data_description'].dependency is None)
+print(exec_count(file_a) == 1 and exec_count(file_b) == 2)
+
+# 清空缓存后重新执行
+loader.clear_cache()
+loader.find_data_description('data_b')
+print(exec_count(file_a) == 1 and exec_count(file_b) == 3)
+
+# 删除计算文件
+remove(file_a)
+print('data_a' not in loader.load_all())
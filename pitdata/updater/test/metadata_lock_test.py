@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/12
+
+多进程同时提交和删除更新时间元数据测试，检查删除数据时不会覆盖其他进程提交的元数据
+"""
+import datetime as dt
+from tempfile import mkdtemp
+from multiprocessing import Pool
+
+from pitdata.const import CONFIG
+from pitdata.updater.operator import load_metadata, dump_metadata, modify_metadata
+
+db_path = mkdtemp()
+filename = 'test_metadata.json'
+
+
+def committer(worker_id):
+    CONFIG['db_path'] = db_path
+    for i in range(20):
+        dump_metadata({'worker{}.data{}'.format(worker_id, i): dt.datetime(2018, 1, 1 + i)}, filename)
+
+
+def remover(_):
+    CONFIG['db_path'] = db_path
+    for i in range(20):
+        modify_metadata(filename, lambda metadata: metadata.pop('tobe_deleted{}'.format(i), None))
+
+
+def run(func_id):
+    return [committer, remover][func_id % 2](func_id // 2)
+
+
+if __name__ == '__main__':
+    CONFIG['db_path'] = db_path
+    dump_metadata({'tobe_deleted{}'.format(i): dt.datetime(2018, 1, 1) for i in range(20)}, filename)
+    with Pool(4) as pool:
+        pool.map(run, range(4))
+    metadata = load_metadata(filename)
+    print(sorted(metadata) == sorted('worker{}.data{}'.format(w, i) for w in range(2) for i in range(20)))
+    print(metadata['worker1.data19'] == dt.datetime(2018, 1, 20))
+
+    # 合并时保留较晚的更新时间
+    ut_meta = {'worker0.data0': dt.datetime(2017, 1, 1)}
+    dump_metadata(ut_meta, filename)
+    print(ut_meta['worker0.data0'] == dt.datetime(2018, 1, 1) and len(ut_meta) == 40)
+
+    # 重命名
+    def rename(metadata):
+        metadata['renamed'] = metadata.pop('worker0.data0')
+    modify_metadata(filename, rename)
+    metadata = load_metadata(filename)
+    print('worker0.data0' not in metadata and metadata['renamed'] == dt.datetime(2018, 1, 1))
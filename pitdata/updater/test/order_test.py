@@ -31,3 +31,23 @@ tree3 = DependencyTree(case3, lambda x: x)
 print(tree3.generate_dependency_order())
 print(tree3.get_branch('good3'))
 print(tree3.get_branch('good2'))
+
+# --------------------------------------------------------------------------------------------------
+# case4: 循环依赖
+from pitdata.updater.order import DependencyCycleError
+case4 = {'good1': ['good3'], 'good2': ['good1'], 'good3': ['good2'], 'good4': ['good1'], 'good5': None}
+tree4 = DependencyTree(case4, lambda x: x)
+try:
+    tree4.generate_dependency_order()
+    print(False)
+except DependencyCycleError as e:
+    print(e)
+print(tree4.get_branch('good5'))
+
+# --------------------------------------------------------------------------------------------------
+# case5: 长依赖链
+case5 = {'node{:05d}'.format(i): ['node{:05d}'.format(i - 1)] if i > 0 else None for i in range(5000)}
+tree5 = DependencyTree(case5, lambda x: x)
+order5 = [n.name for n in tree5.generate_dependency_order()]
+print(order5 == sorted(case5))
+print(len(tree5.get_branch('node00000')) == 5000)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/15
+"""
+import datetime as dt
+
+import pandas as pd
+
+from pitdata.utils import DataDescription
+from pitdata.const import DataType
+from pitdata.updater.planner import (plan_update, split_chunks, REASON_NEW, REASON_OUTDATED, REASON_REDEFINED,
+                                     REASON_UPSTREAM_REDEFINED)
+
+class DailyCalendar(object):
+    # 以自然日作为交易日
+    def count(self, start_time, end_time, include_type='both'):
+        days = len(pd.date_range(start_time, end_time))
+        if include_type in ('left', 'right'):
+            days -= 1
+        return days
+
+    def get_cycle_targets(self, start_time, end_time, freq, target):
+        # 每个月的最后一天
+        return [d for d in pd.date_range(start_time, end_time, freq='M')]
+
+def make_data_dict(spec):
+    out = {}
+    for name, (dep, update_time, in_test) in spec.items():
+        dd = DataDescription(None, update_time, DataType.PANEL_NUMERIC, dep, in_test=in_test)
+        dd.set_name(name)
+        out[name] = {'data_description': dd, 'rel_path': 'test.' + name}
+    return out
+
+# 依赖关系: a -> b -> c; a -> d; t(测试数据) -> u; e, f无依赖
+spec = {'a': (None, '2018-01-01', False), 'b': (['a'], '2018-05-01', False), 'c': (['b'], '2018-01-01', False),
+        'd': (['a'], '2018-01-01', False), 'e': (None, '2018-01-01', False), 'f': (None, '2018-01-01', False),
+        't': (None, '2018-01-01', True), 'u': (['t'], '2018-01-01', False)}
+data_dict = make_data_dict(spec)
+end_time = dt.datetime(2018, 5, 10)
+start_time = dt.datetime(2018, 1, 1)
+ut_meta = {'a': end_time, 'b': end_time, 'c': end_time, 'd': dt.datetime(2018, 5, 8), 'e': end_time}
+def_meta = {'a': dt.datetime(2018, 1, 1), 'b': dt.datetime(2018, 1, 1)}
+plan = plan_update(data_dict, ut_meta, def_meta, end_time, start_time, DailyCalendar())
+print(plan)
+print(list(plan.items) == ['b', 'c', 'd', 'f'])
+print(plan['b'].reason == REASON_REDEFINED and plan['c'].reason == REASON_UPSTREAM_REDEFINED)
+print(plan['c'].start_time == start_time and plan['c'].rebuild)
+print(plan['d'].reason == REASON_OUTDATED and plan['d'].start_time == dt.datetime(2018, 5, 8) and plan['d'].cost == 2)
+print(plan['f'].reason == REASON_NEW and not plan['f'].rebuild)
+print('a' not in plan and 'e' not in plan)
+print(list(plan.blocked) == ['t', 'u'])
+
+# 全部更新之后计划为空
+ut_meta = {n: end_time for n in spec}
+def_meta = {n: dt.datetime(2018, 5, 1) for n in spec}
+plan = plan_update(data_dict, ut_meta, def_meta, end_time, start_time, DailyCalendar())
+print(len(plan) == 0 and plan.total_cost == 0)
+
+# 分段
+chunks = split_chunks(dt.datetime(2018, 1, 15), dt.datetime(2018, 3, 10), 'MONTHLY', DailyCalendar())
+print(chunks == [(dt.datetime(2018, 1, 15), dt.datetime(2018, 1, 31)), (dt.datetime(2018, 1, 31), dt.datetime(2018, 2, 28)),
+                 (dt.datetime(2018, 2, 28), dt.datetime(2018, 3, 10))])
+print(split_chunks(dt.datetime(2018, 1, 15), dt.datetime(2018, 1, 31), 'MONTHLY', DailyCalendar()) ==
+      [(dt.datetime(2018, 1, 15), dt.datetime(2018, 1, 31))])
+plan = plan_update(data_dict, {}, {}, end_time, start_time, DailyCalendar(), 'MONTHLY')
+print(len(plan['a'].chunks) == 5 and plan['a'].chunks[-1][1] == end_time)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/16
+"""
+import tempfile
+import time
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from pitdata.updater.profiler import (MemorySampler, get_current_rss, get_data_size, write_profile, load_profile,
+                                      summarize_profile, find_critical_path)
+
+# --------------------------------------------------------------------------------------------------
+# 数据规模与内存峰值
+df = pd.DataFrame(np.zeros((10, 4)), index=pd.date_range('2018-01-01', periods=10))
+print(get_data_size(df) == (10, 4))
+print(get_data_size(df.iloc[:, 0]) == (10, 1))
+print(get_current_rss() is None or get_current_rss() > 0)
+# 计算期间的内存增量
+with MemorySampler(0.01) as sampler:
+    big = np.ones(2 ** 24)    # 128MB
+    big.sum()
+    time.sleep(0.05)
+    del big
+print(sampler.delta is None or (sampler.delta >= 100 * 2 ** 20 and sampler.peak >= get_current_rss()))
+
+# --------------------------------------------------------------------------------------------------
+# 记录与汇总
+file_path = join(tempfile.mkdtemp(), 'profile.jsonl')
+dependency = {'a': [], 'b': ['a'], 'c': ['a'], 'd': ['b', 'c'], 'e': []}
+calc_seconds = {'a': 1., 'b': 5., 'c': 2., 'd': 1., 'e': 6.}
+for run_id in ['run1', 'run2']:
+    for name, seconds in calc_seconds.items():
+        for _ in range(2):    # 每个数据分两段计算
+            write_profile({'run_id': run_id, 'data_name': name, 'dependency': dependency[name],
+                           'calc_seconds': seconds / 2, 'insert_seconds': 0., 'rows': 5, 'columns': 4,
+                           'bytes': 160, 'peak_rss': 100, 'rss_delta': 10, 'result': True}, file_path)
+with open(file_path, 'a') as f:
+    f.write('{broken line\n')
+records = load_profile(file_path)
+print(len(records) == 10 and all(r['run_id'] == 'run2' for r in records))
+print(len(load_profile(file_path, 'run1')) == 10)
+summary = summarize_profile(records)
+print(list(summary.index) == ['e', 'b', 'c', 'a', 'd'])
+print(summary.loc['b', 'total_seconds'] == 5. and summary.loc['b', 'chunks'] == 2 and summary.loc['b', 'rows'] == 10)
+print(summary.loc['b', 'bytes'] == 320 and summary.loc['b', 'rss_delta'] == 10)
+
+# --------------------------------------------------------------------------------------------------
+# 关键路径
+path, seconds = find_critical_path(summary['total_seconds'].to_dict(), dependency)
+print(path == ['a', 'b', 'd'] and seconds == 7.)
+print(find_critical_path({}, {}) == ([], 0.))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding:utf-8
+"""
+Author:  Hao Li
+Email: howardleeh@gmail.com
+Github: https://github.com/SAmmer0
+Created: 2018/5/13
+"""
+import time
+import threading
+
+from pitdata.updater.scheduler import DAGScheduler, NodeStatus, ChunkedTask
+
+# --------------------------------------------------------------------------------------------------
+# 依赖关系: a, b -> c -> e; a -> d; f(计算失败) -> g -> h; i(超时) -> j
+graph = {'a': None, 'b': None, 'c': ['a', 'b'], 'd': ['a'], 'e': ['c'],
+         'f': None, 'g': ['f'], 'h': ['g'], 'i': None, 'j': ['i'], 'k': None}
+committed = []
+calc_threads = set()
+
+def prepare(name):
+    if name == 'k':
+        return NodeStatus.SUCCEEDED, None
+    return NodeStatus.PENDING, (name,)
+
+def calculate(name):
+    calc_threads.add(threading.current_thread().name)
+    if name == 'f':
+        raise ValueError('Calculation error')
+    time.sleep(1 if name == 'i' else 0.2)
+    return name.upper()
+
+def commit(name, result):
+    committed.append((name, result))
+    return True
+
+# --------------------------------------------------------------------------------------------------
+# 并发计算
+start = time.time()
+status = DAGScheduler(graph, max_workers=4, timeout=0.5).run(prepare, calculate, commit)
+elapsed = time.time() - start
+print(elapsed < 1)
+print(status['e'] == NodeStatus.SUCCEEDED and status['d'] == NodeStatus.SUCCEEDED)
+print(status['f'] == NodeStatus.FAILED)
+print(status['g'] == NodeStatus.SKIPPED and status['h'] == NodeStatus.SKIPPED)
+print(status['i'] == NodeStatus.TIMEOUT and status['j'] == NodeStatus.SKIPPED)
+print(status['k'] == NodeStatus.SUCCEEDED)
+# 依赖项一定先于被依赖项提交
+order = [n for n, _ in committed]
+print(order.index('c') > max(order.index('a'), order.index('b')) and order.index('e') > order.index('c'))
+print(all(n.upper() == r for n, r in committed))
+print(len(calc_threads) > 1)
+
+# --------------------------------------------------------------------------------------------------
+# 串行计算与并发计算结果一致
+committed = []
+status_serial = DAGScheduler(graph, max_workers=1, timeout=0.5).run(prepare, calculate, commit)
+print(status_serial == status)
+
+# --------------------------------------------------------------------------------------------------
+# 分段计算: p(并发分段) -> q(顺序分段，第3段失败) -> r
+chunk_graph = {'p': None, 'q': ['p'], 'r': ['q']}
+committed = []
+active = []
+max_active = []
+lock = threading.Lock()
+
+def chunk_prepare(name):
+    return NodeStatus.PENDING, ChunkedTask([(name, i) for i in range(6)], parallel=(name == 'p'))
+
+def chunk_calculate(name, i):
+    with lock:
+        active.append(name)
+        max_active.append(active.count(name))
+    time.sleep(0.05 * (6 - i))    # 靠前的分段计算更慢
+    with lock:
+        active.remove(name)
+    if name == 'q' and i == 2:
+        raise ValueError('Calculation error')
+    return name, i
+
+def chunk_commit(name, result):
+    committed.append(result)
+    return True
+
+status = DAGScheduler(chunk_graph, max_workers=3).run(chunk_prepare, chunk_calculate, chunk_commit)
+print(status == {'p': NodeStatus.SUCCEEDED, 'q': NodeStatus.FAILED, 'r': NodeStatus.SKIPPED})
+print(committed == [('p', i) for i in range(6)] + [('q', 0), ('q', 1)])
+print(max(max_active) == 3)
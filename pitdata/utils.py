@@ -29,8 +29,11 @@ class DataDescription(object):
         数据相关描述
     in_test: boolean, False
         当前数据是否处于测试状态，默认表示未处于该状态
+    path_dependent: boolean, default True
+        计算结果是否依赖于计算的起始时间(例如需要从起始时间开始累积计算)，False表示将时间区间切分后分别计算
+        的结果与整体计算的结果一致，此时回填历史数据时各个分段可以并发计算
     '''
-    def __init__(self, calc_method, update_time, datatype, dep=None, desc='', in_test=False):
+    def __init__(self, calc_method, update_time, datatype, dep=None, desc='', in_test=False, path_dependent=True):
         self.name = ''
         self.calc_method = calc_method
         self.update_time = update_time
@@ -43,6 +46,7 @@ class DataDescription(object):
         self.datatype = datatype
         self.description = desc
         self.in_test = in_test
+        self.path_dependent = path_dependent
 
     def set_name(self, name):
         '''